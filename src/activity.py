@@ -0,0 +1,75 @@
+import math
+from typing import List
+
+import numpy as np
+
+from spatial import GridIndex
+
+
+class ActivityTracker:
+  """
+  Tracks which sheep are quiescent so Simulation.update can skip their social-force work.
+
+  After every full update of a sheep its social force (attraction + alignment + repulsion)
+  is compared with the one of its previous full update. A sheep goes to sleep when that
+  change is below `tolerance` and it has neither repulsion hits nor the dog within d_dog;
+  a sleeping sheep keeps moving with its cached social forces (inertia, dog repulsion and
+  noise are still applied every tick) and is fully re-evaluated every `interval` ticks
+  (staggered over the flock) or as soon as it is woken:
+
+    - a dog comes within d_dog plus the distance it can cover in one tick, or
+    - an awake neighbour is within `wake_radius`.
+
+  The wake-up test runs on a GridIndex, so the bookkeeping is O(N) per tick and the
+  expensive social update is only paid for awake sheep. The same index (positions at the
+  start of the tick) gives the awake sheep their repulsion candidates through nearby().
+  """
+
+  def __init__(self, num_sheep: int, tolerance: float, interval: int = 10, wake_radius: float = 4.0):
+    self.tolerance = tolerance
+    self.interval = max(1, interval)
+    self.wake_radius = wake_radius
+
+    self.quiet = np.zeros(num_sheep, dtype=bool)
+    self.force = np.full((num_sheep, 2), np.nan)
+    self.awake: List[bool] = [True] * num_sheep
+    self.tick = 0
+    self.index: GridIndex | None = None
+
+  @property
+  def num_awake(self) -> int:
+    return sum(self.awake)
+
+  def begin_tick(self, sim, dt: float) -> None:
+    n = len(sim.sheep)
+    refresh = (np.arange(n) + self.tick) % self.interval == 0
+    asleep = self.quiet & ~refresh
+    self.tick += 1
+
+    positions = np.array([(s.x, s.y) for s in sim.sheep], dtype=np.float64).reshape(-1, 2)
+    index = self.index = GridIndex(positions, cell_size=self.wake_radius)
+    if asleep.any():
+      # woken by a dog (one tick of dog motion of margin)
+      dog_range = sim.cfg.d_dog + sim.cfg.v_dog * dt
+      for dog in sim.shepherds:
+        asleep[index.query_radius((dog.x, dog.y), dog_range)] = False
+
+      # woken by an awake neighbour
+      i, j, _ = index.pairs_within(self.wake_radius)
+      woken = i[asleep[i] & ~asleep[j]]
+      asleep[woken] = False
+
+    self.awake = (~asleep).tolist()
+
+  def nearby(self, i: int, radius: float) -> np.ndarray:
+    """Indices of the sheep within `radius` of sheep i's position at the start of the tick (i included)."""
+    return self.index.query_radius(tuple(self.index.positions[i]), radius)
+
+  def record(self, i: int, sheep, rep_hits: int) -> None:
+    """Called after a full social update of sheep i."""
+    fx = sheep.att_x + sheep.ali_x + sheep.rep_x
+    fy = sheep.att_y + sheep.ali_y + sheep.rep_y
+    old_x, old_y = self.force[i]
+    change = math.hypot(fx - old_x, fy - old_y)  # nan on the first update -> stays awake
+    self.quiet[i] = rep_hits == 0 and sheep.dog_x == 0.0 and sheep.dog_y == 0.0 and change < self.tolerance
+    self.force[i] = (fx, fy)
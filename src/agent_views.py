@@ -0,0 +1,160 @@
+from typing import List, Optional, Tuple
+
+from agents import Agent, AgentUtils
+
+
+class AgentView:
+  """
+  Agent facade over one row of the array engine's FlockArrays, so SimulationState.sheep / .dogs,
+  the visualizer and analysis scripts keep using the object API (s.x, s.heading,
+  s.viewing_angle_to(o), ...) without copying the arrays. Views hold no agent state of their
+  own: they are created once per simulation and every read goes to the shared arrays.
+  """
+  __slots__ = ("_arrays", "_i")
+  POS = "pos"
+  VEL = "vel"
+
+  def __init__(self, arrays, i: int):
+    self._arrays = arrays
+    self._i = i
+
+  def _get(self, field: str, k: int) -> float:
+    return getattr(self._arrays, field).item(self._i, k)
+
+  def _set(self, field: str, k: int, value: float) -> None:
+    getattr(self._arrays, field)[self._i, k] = value
+
+  @property
+  def x(self) -> float:
+    return self._get(self.POS, 0)
+
+  @x.setter
+  def x(self, value: float):
+    self._set(self.POS, 0, value)
+
+  @property
+  def y(self) -> float:
+    return self._get(self.POS, 1)
+
+  @y.setter
+  def y(self, value: float):
+    self._set(self.POS, 1, value)
+
+  @property
+  def vx(self) -> float:
+    return self._get(self.VEL, 0)
+
+  @property
+  def vy(self) -> float:
+    return self._get(self.VEL, 1)
+
+  @property
+  def speed_const(self) -> float:
+    return 1.0
+
+  @property
+  def speed(self) -> float:
+    return AgentUtils.speed(self.vx, self.vy)
+
+  @property
+  def heading(self) -> float:
+    return AgentUtils.heading(self.vx, self.vy)
+
+  @property
+  def direction(self) -> Tuple[float, float]:
+    return AgentUtils.direction(self.vx, self.vy)
+
+  viewing_angle_to = Agent.viewing_angle_to
+  alignment_with = Agent.alignment_with
+
+
+class SheepView(AgentView):
+  """Sheep row of FlockArrays; exposes the force components under the agents.Sheep names."""
+  __slots__ = ()
+
+  def _pair(self, field: str) -> Tuple[float, float]:
+    row = getattr(self._arrays, field)[self._i]
+    return (row.item(0), row.item(1))
+
+  @property
+  def social_attraction(self) -> Tuple[float, float]:
+    return self._pair("att")
+
+  @property
+  def social_alignment(self) -> Tuple[float, float]:
+    return self._pair("ali")
+
+  @property
+  def social_repulsion(self) -> Tuple[float, float]:
+    return self._pair("rep")
+
+  @property
+  def dog_repulsion(self) -> Tuple[float, float]:
+    return self._pair("dog_rep")
+
+  @property
+  def noise(self) -> Tuple[float, float]:
+    return self._pair("noise")
+
+  @property
+  def att_x(self) -> float:
+    return self._get("att", 0)
+
+  @property
+  def att_y(self) -> float:
+    return self._get("att", 1)
+
+  @property
+  def ali_x(self) -> float:
+    return self._get("ali", 0)
+
+  @property
+  def ali_y(self) -> float:
+    return self._get("ali", 1)
+
+  @property
+  def rep_x(self) -> float:
+    return self._get("rep", 0)
+
+  @property
+  def rep_y(self) -> float:
+    return self._get("rep", 1)
+
+  @property
+  def dog_x(self) -> float:
+    return self._get("dog_rep", 0)
+
+  @property
+  def dog_y(self) -> float:
+    return self._get("dog_rep", 1)
+
+  @property
+  def noise_x(self) -> float:
+    return self._get("noise", 0)
+
+  @property
+  def noise_y(self) -> float:
+    return self._get("noise", 1)
+
+
+class DogView(AgentView):
+  """Dog row of FlockArrays; `mode` is read from the engine's list of dog decisions."""
+  __slots__ = ("_modes",)
+  POS = "dog_pos"
+  VEL = "dog_vel"
+
+  def __init__(self, arrays, i: int, modes: List[Optional[str]]):
+    super().__init__(arrays, i)
+    self._modes = modes
+
+  @property
+  def mode(self) -> Optional[str]:
+    return self._modes[self._i]
+
+
+def sheep_views(arrays) -> List[SheepView]:
+  return [SheepView(arrays, i) for i in range(len(arrays.pos))]
+
+
+def dog_views(arrays, modes: List[Optional[str]]) -> List[DogView]:
+  return [DogView(arrays, i, modes) for i in range(len(arrays.dog_pos))]
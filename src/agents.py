@@ -4,6 +4,10 @@ from typing import List, Tuple
 
 
 class Agent:
+  # fixed attribute layout: no per-instance __dict__
+  __slots__ = ("x", "y", "vx", "vy", "speed_const",
+               "_kin_vx", "_kin_vy", "_speed", "_direction", "_heading")
+
   def __init__(self, x: float, y: float):
     self.x = x
     self.y = y
@@ -11,18 +15,39 @@ class Agent:
     self.vy = 0.0
     # params
     self.speed_const = 1.0
+    # derived kinematics, valid while (vx, vy) == (_kin_vx, _kin_vy)
+    self._kin_vx = None
+    self._kin_vy = None
+
+  def _refresh_kinematics(self) -> None:
+    vx, vy = self.vx, self.vy
+    self._kin_vx = vx
+    self._kin_vy = vy
+    speed = math.hypot(vx, vy)
+    self._speed = speed
+    # same values as AgentUtils.direction, without a second hypot
+    self._direction = (vx / speed, vy / speed) if speed != 0 else (0.0, 0.0)
+    self._heading = None  # atan2 only on demand
 
   @property
   def speed(self) -> float:
-    return AgentUtils.speed(self.vx, self.vy)
+    if self.vx != self._kin_vx or self.vy != self._kin_vy:
+      self._refresh_kinematics()
+    return self._speed
 
   @property
   def heading(self) -> float:
-    return AgentUtils.heading(self.vx, self.vy)
+    if self.vx != self._kin_vx or self.vy != self._kin_vy:
+      self._refresh_kinematics()
+    if self._heading is None:
+      self._heading = AgentUtils.heading(self.vx, self.vy)
+    return self._heading
 
   @property
   def direction(self) -> Tuple[float, float]:
-    return AgentUtils.direction(self.vx, self.vy)
+    if self.vx != self._kin_vx or self.vy != self._kin_vy:
+      self._refresh_kinematics()
+    return self._direction
 
   # def move(self, dt: float):
   #   (move_x, move_y) = (self.speed[0] * dt, self.speed[1] * dt)
@@ -42,20 +67,69 @@ class Agent:
 
 
 class Sheep(Agent):
+  # force components are stored as plain float slots so an update allocates no tuples;
+  # the tuple-valued properties below keep the old attribute names working
+  __slots__ = ("att_x", "att_y", "ali_x", "ali_y", "rep_x", "rep_y",
+               "dog_x", "dog_y", "noise_x", "noise_y")
+
   def __init__(self, x, y):
     super().__init__(x, y)
-    self.social_attraction = (0.0, 0.0)
-    self.social_alignment  = (0.0, 0.0)
-    self.social_repulsion  = (0.0, 0.0)
-    self.dog_repulsion     = (0.0, 0.0)
-    self.noise             = (0.0, 0.0)
+    self.att_x = self.att_y = 0.0
+    self.ali_x = self.ali_y = 0.0
+    self.rep_x = self.rep_y = 0.0
+    self.dog_x = self.dog_y = 0.0
+    self.noise_x = self.noise_y = 0.0
+
+  @property
+  def social_attraction(self) -> Tuple[float, float]:
+    return (self.att_x, self.att_y)
+
+  @social_attraction.setter
+  def social_attraction(self, value: Tuple[float, float]):
+    self.att_x, self.att_y = value
+
+  @property
+  def social_alignment(self) -> Tuple[float, float]:
+    return (self.ali_x, self.ali_y)
+
+  @social_alignment.setter
+  def social_alignment(self, value: Tuple[float, float]):
+    self.ali_x, self.ali_y = value
+
+  @property
+  def social_repulsion(self) -> Tuple[float, float]:
+    return (self.rep_x, self.rep_y)
+
+  @social_repulsion.setter
+  def social_repulsion(self, value: Tuple[float, float]):
+    self.rep_x, self.rep_y = value
 
-  def update_social(self, neighbors, wAtt, wAli, wRep, nAtt, nAli, dRep):
+  @property
+  def dog_repulsion(self) -> Tuple[float, float]:
+    return (self.dog_x, self.dog_y)
+
+  @dog_repulsion.setter
+  def dog_repulsion(self, value: Tuple[float, float]):
+    self.dog_x, self.dog_y = value
+
+  @property
+  def noise(self) -> Tuple[float, float]:
+    return (self.noise_x, self.noise_y)
+
+  @noise.setter
+  def noise(self, value: Tuple[float, float]):
+    self.noise_x, self.noise_y = value
+
+  def update_social(self, neighbors, wAtt, wAli, wRep, nAtt, nAli, dRep, rep_neighbors=None) -> int:
+    """
+    Updates the social forces; returns the number of neighbours within dRep (repulsion hits).
+    `rep_neighbors` (default `neighbors`) may narrow the repulsion scan to the sheep near this one.
+    """
     if not neighbors:
-      self.social_attraction = (0.0, 0.0)
-      self.social_alignment  = (0.0, 0.0)
-      self.social_repulsion  = (0.0, 0.0)
-      return
+      self.att_x = self.att_y = 0.0
+      self.ali_x = self.ali_y = 0.0
+      self.rep_x = self.rep_y = 0.0
+      return 0
     # --- 1. Attraction ---
     nAtt = min(nAtt, len(neighbors))
     att_neighbors = random.sample(neighbors, nAtt)
@@ -68,7 +142,8 @@ class Sheep(Agent):
       if dist > 0:
         sum_dx += dx / dist
         sum_dy += dy / dist
-    self.social_attraction = (wAtt * sum_dx / nAtt, wAtt * sum_dy / nAtt)
+    self.att_x = wAtt * sum_dx / nAtt
+    self.att_y = wAtt * sum_dy / nAtt
     # --- 2. Alignment ---
     nAli = min(nAli, nAtt)
     ali_neighbors = random.sample(att_neighbors, nAli)
@@ -77,12 +152,17 @@ class Sheep(Agent):
       dir_x, dir_y = n.direction
       sum_dx += dir_x
       sum_dy += dir_y
-    self.social_alignment = (wAli * sum_dx / nAli, wAli * sum_dy / nAli)
+    self.ali_x = wAli * sum_dx / nAli
+    self.ali_y = wAli * sum_dy / nAli
     # --- 3. Repulsion ---
+    return self.update_social_repulsion(neighbors if rep_neighbors is None else rep_neighbors, wRep, dRep)
+
+  def update_social_repulsion(self, neighbors, wRep, dRep) -> int:
+    """Short-range repulsion only (re-evaluated on every sub-step); returns the number of repulsion hits."""
     rep_neighbors = [n for n in neighbors if math.hypot(n.x - self.x, n.y - self.y) < dRep]
     nRep = len(rep_neighbors)
     if nRep == 0:
-      self.social_repulsion = (0.0, 0.0)
+      self.rep_x = self.rep_y = 0.0
     else:
       sum_dx, sum_dy = 0.0, 0.0
       for n in rep_neighbors:
@@ -92,19 +172,23 @@ class Sheep(Agent):
         if dist > 0:
           sum_dx += dx / dist
           sum_dy += dy / dist
-      self.social_repulsion = (-wRep * sum_dx / nRep, -wRep * sum_dy / nRep)
+      self.rep_x = -wRep * sum_dx / nRep
+      self.rep_y = -wRep * sum_dy / nRep
+    return nRep
 
   def update_repulsion(self, dog, wDog, dDog): #dDog = R_D in paper
     dx = self.x - dog.x
     dy = self.y - dog.y
     dist = math.hypot(dx, dy)
     if dist < dDog and dist > 0:
-      self.dog_repulsion = (wDog * dx / dist, wDog * dy / dist)
+      self.dog_x = wDog * dx / dist
+      self.dog_y = wDog * dy / dist
     else:
-      self.dog_repulsion = (0.0, 0.0)
+      self.dog_x = self.dog_y = 0.0
 
   def update_noise(self):
-    self.noise = (random.random(), random.random())
+    self.noise_x = random.random()
+    self.noise_y = random.random()
 
 
   def move(self, dt, alpha=0.5, epsilon=0.1):
@@ -113,19 +197,19 @@ class Sheep(Agent):
 
     ux = (
             alpha * dir_x
-            + self.social_attraction[0]
-            + self.social_alignment[0]
-            + self.social_repulsion[0]
-            + self.dog_repulsion[0]
-            + epsilon * (self.noise[0] - 0.5) * 2.0
+            + self.att_x
+            + self.ali_x
+            + self.rep_x
+            + self.dog_x
+            + epsilon * (self.noise_x - 0.5) * 2.0
     )
     uy = (
             alpha * dir_y
-            + self.social_attraction[1]
-            + self.social_alignment[1]
-            + self.social_repulsion[1]
-            + self.dog_repulsion[1]
-            + epsilon * (self.noise[1] - 0.5) * 2.0
+            + self.att_y
+            + self.ali_y
+            + self.rep_y
+            + self.dog_y
+            + epsilon * (self.noise_y - 0.5) * 2.0
     )
 
     norm = math.hypot(ux, uy)
@@ -141,8 +225,12 @@ class Sheep(Agent):
     self.y += self.vy * dt
 
 class Dog(Agent):
+  __slots__ = ("mode",)
+
   def __init__(self, x: float, y: float):
     super().__init__(x, y)
+    # last decision taken in update(): "collect", "drive", "slow" or None
+    self.mode = None
 
   def update(self,
              sheep: List[Sheep],
@@ -152,61 +240,75 @@ class Dog(Agent):
              f_n: float,
              pc: float,
              pd: float,
-             noise_strength: float # e in MATLAB
+             noise_strength: float, # e in MATLAB
+             centre: Tuple[float, float] | None = None,  # group centre if already known (FlockStats)
+             extremal=None  # ExtremalQuery over the same sheep, replaces the per-sheep scans
              ) -> None:
 
     if not sheep:
       return
 
     # distance from dog to each sheep (pos_s_t_1 - pos_d_t_1)
-    dists = []
-    for s in sheep:
-      dx = s.x - self.x
-      dy = s.y - self.y
-      d = math.hypot(dx, dy)
-      dists.append(d)
-
-    min_dist = min(dists)
+    if extremal is None:
+      dists = []
+      for s in sheep:
+        dx = s.x - self.x
+        dy = s.y - self.y
+        d = math.hypot(dx, dy)
+        dists.append(d)
+
+      min_dist = min(dists)
+    else:
+      _, min_dist = extremal.nearest_to(self.x, self.y)
 
     # force-slow branch: if any sheep is within rad_rep_s
     # if min(dist_rds) < rad_rep_s
     if min_dist < rad_rep_s:
+      self.mode = "slow"
       # use previous velocity direction (vel_d_t_1)
-      norm_v = math.hypot(self.vx, self.vy)
-      if norm_v > 0.0:
-        ux = self.vx / norm_v
-        uy = self.vy / norm_v
+      if self.speed > 0.0:
+        ux, uy = self.direction
         slow_step = 0.05  #  vel_d_t_1 (vel_d_t_1 is unit vector in MATLAB)
         self.vx = slow_step * ux
         self.vy = slow_step * uy
         self.x += self.vx * dt
         self.y += self.vy * dt
-      # if norm_v == 0, do nothing this step
+      # if the dog stands still, do nothing this step
       return
 
     # group centre (grp_centre)
-    avg_x = sum(s.x for s in sheep) / len(sheep)
-    avg_y = sum(s.y for s in sheep) / len(sheep)
-
-    # vectors from group centre to sheep (r_gcm_i) and their distances (dist_gcm_i)
-    r_gcm = []
-    dist_gcm = []
-    for s in sheep:
-      rx = s.x - avg_x
-      ry = s.y - avg_y
-      d = math.hypot(rx, ry)
-      r_gcm.append((rx, ry))
-      dist_gcm.append(d)
+    if centre is None:
+      avg_x = sum(s.x for s in sheep) / len(sheep)
+      avg_y = sum(s.y for s in sheep) / len(sheep)
+    else:
+      avg_x, avg_y = centre
 
     # farthest sheep from group centre
-    max_dist = max(dist_gcm)
-    max_idx = dist_gcm.index(max_dist)
+    if extremal is None:
+      # vectors from group centre to sheep (r_gcm_i) and their distances (dist_gcm_i)
+      r_gcm = []
+      dist_gcm = []
+      for s in sheep:
+        rx = s.x - avg_x
+        ry = s.y - avg_y
+        d = math.hypot(rx, ry)
+        r_gcm.append((rx, ry))
+        dist_gcm.append(d)
+
+      max_dist = max(dist_gcm)
+      max_idx = dist_gcm.index(max_dist)
+      far_r, far_d = r_gcm[max_idx], dist_gcm[max_idx]
+    else:
+      max_idx, max_dist = extremal.farthest_from(avg_x, avg_y)
+      far = sheep[max_idx]
+      far_r, far_d = (far.x - avg_x, far.y - avg_y), max_dist
 
     # collect or drive?
     if max_dist > f_n:
+      self.mode = "collect"
       # COLLECT: go behind farthest sheep relative to group centre
-      rx, ry = r_gcm[max_idx]
-      d_far = dist_gcm[max_idx]
+      rx, ry = far_r
+      d_far = far_d
 
       # d_far should be > 0 here if we are in collect regime like MATLAB
       if d_far == 0.0:
@@ -226,6 +328,7 @@ class Dog(Agent):
         target_x, target_y = rcx, rcy
 
     else:
+      self.mode = "drive"
       # DRIVE: go behind group centre relative to origin
       grp_norm = math.hypot(avg_x, avg_y)
       if grp_norm == 0.0:
@@ -0,0 +1,304 @@
+import os
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from spatial import GridIndex
+from trajectory_store import ANALYSIS_DIR, TrajectoryReader
+
+# Metrics recomputed from stored trajectories (trajectory_store.py).
+#
+# A metric is a function of a Chunk (the arrays of up to chunk_size consecutive ticks) that
+# returns named columns with one row per tick: (T,) for scalars, (T, B) for per-tick histograms.
+# Chunks are processed independently - in parallel with workers > 1 - and every computed
+# column is cached next to the run, in <run_dir>/analysis/<metric>-v<version>/chunk_%05d.npz,
+# so asking again (for any tick range) only loads what is already there.
+
+ANGLE_BINS = 36           # bins of the dog bearing histogram over [-pi, pi)
+DISTANCE_BINS = 40        # bins of the neighbour distance histogram
+DISTANCE_RANGE_D_REP = 5  # the neighbour distance histogram covers [0, 5 * d_rep)
+
+
+class Chunk:
+  """Arrays of one stored chunk plus the flock frame quantities shared by the metrics (computed once)."""
+
+  def __init__(self, arrays: Dict[str, np.ndarray], meta: dict):
+    self.arrays = arrays
+    self.meta = meta
+    self.sheep_pos = arrays["sheep_pos"].astype(np.float64, copy=False)  # (T, N, 2)
+    self.sheep_vel = arrays["sheep_vel"].astype(np.float64, copy=False)
+    self.dog_pos = arrays["dog_pos"].astype(np.float64, copy=False)      # (T, D, 2)
+    self.dog_vel = arrays["dog_vel"].astype(np.float64, copy=False)
+
+  @property
+  def num_ticks(self) -> int:
+    return len(self.arrays["tick"])
+
+  @property
+  def config(self) -> dict:
+    return self.meta.get("config", {})
+
+  @cached_property
+  def barycenter(self) -> np.ndarray:
+    return self.sheep_pos.mean(axis=1)
+
+  @cached_property
+  def velocity(self) -> np.ndarray:
+    return self.sheep_vel.mean(axis=1)
+
+  @cached_property
+  def direction(self) -> np.ndarray:
+    """Unit mean velocity (zero when the flock stands still)."""
+    return _unit(self.velocity)
+
+  @cached_property
+  def perp_direction(self) -> np.ndarray:
+    d = self.direction
+    return np.stack([-d[:, 1], d[:, 0]], axis=1)
+
+  @cached_property
+  def offsets(self) -> np.ndarray:
+    """Sheep positions relative to the barycenter, (T, N, 2)."""
+    return self.sheep_pos - self.barycenter[:, None, :]
+
+  @cached_property
+  def along(self) -> np.ndarray:
+    """Projections of the offsets on the flock direction, (T, N)."""
+    return np.einsum("tni,ti->tn", self.offsets, self.direction)
+
+  @cached_property
+  def across(self) -> np.ndarray:
+    """Projections of the offsets on the perpendicular direction, (T, N)."""
+    return np.einsum("tni,ti->tn", self.offsets, self.perp_direction)
+
+
+def _unit(v: np.ndarray) -> np.ndarray:
+  norm = np.sqrt(np.einsum("...i,...i->...", v, v))
+  out = np.zeros_like(v)
+  np.divide(v, norm[..., None], out=out, where=norm[..., None] > 0)
+  return out
+
+
+def _pair(name: str, values: np.ndarray) -> Dict[str, np.ndarray]:
+  return {f"{name}_x": values[:, 0], f"{name}_y": values[:, 1]}
+
+
+def _nan_column(chunk: Chunk) -> np.ndarray:
+  return np.full(chunk.num_ticks, np.nan)
+
+
+# ---------- registry ----------
+
+@dataclass
+class Metric:
+  name: str
+  fn: Callable[[Chunk], Dict[str, np.ndarray]]
+  version: int = 1  # bump when the definition changes, older cached columns are then ignored
+
+  @property
+  def cache_name(self) -> str:
+    return f"{self.name}-v{self.version}"
+
+
+METRICS: Dict[str, Metric] = {}
+
+
+def metric(name: str, version: int = 1):
+  """Decorator registering a metric function under `name`."""
+  def register(fn: Callable[[Chunk], Dict[str, np.ndarray]]):
+    METRICS[name] = Metric(name, fn, version)
+    return fn
+  return register
+
+
+def get_metric(name: str) -> Metric:
+  if name not in METRICS:
+    raise ValueError(f"Unknown metric '{name}' (choose from {', '.join(sorted(METRICS))})")
+  return METRICS[name]
+
+
+# ---------- built-in metrics (same definitions as the engines' per-tick metrics) ----------
+
+@metric("barycenter")
+def _barycenter(c: Chunk):
+  return _pair("barycenter", c.barycenter)
+
+
+@metric("velocity")
+def _velocity(c: Chunk):
+  return _pair("velocity", c.velocity)
+
+
+@metric("direction")
+def _direction(c: Chunk):
+  return {**_pair("direction", c.direction), **_pair("perp_direction", c.perp_direction)}
+
+
+@metric("cohesion")
+def _cohesion(c: Chunk):
+  return {"cohesion": np.sqrt(np.einsum("tni,tni->tn", c.offsets, c.offsets)).mean(axis=1)}
+
+
+@metric("polarization")
+def _polarization(c: Chunk):
+  mean_dir = _unit(c.sheep_vel).mean(axis=1)
+  return {"polarization": np.hypot(mean_dir[:, 0], mean_dir[:, 1])}
+
+
+@metric("elongation")
+def _elongation(c: Chunk):
+  length = c.along.max(axis=1) - c.along.min(axis=1)
+  width = c.across.max(axis=1) - c.across.min(axis=1)
+  return {"elongation": np.divide(length, width, out=np.zeros_like(length), where=width > 0)}
+
+
+@metric("dog_offset")
+def _dog_offset(c: Chunk):
+  if c.dog_pos.shape[1] == 0:
+    return {"dog_offset_x": _nan_column(c), "dog_offset_y": _nan_column(c), "dog_rear_distance": _nan_column(c)}
+  rd = c.dog_pos[:, 0] - c.barycenter
+  x_d = np.einsum("ti,ti->t", rd, c.perp_direction)
+  y_d = np.einsum("ti,ti->t", rd, c.direction)
+  return {"dog_offset_x": x_d, "dog_offset_y": y_d, "dog_rear_distance": c.along.min(axis=1) - y_d}
+
+
+@metric("dog_bearing_hist")
+def _dog_bearing_hist(c: Chunk):
+  """Density of the sheep bearings seen from the first dog, relative to its heading, over [-pi, pi)."""
+  edges = np.linspace(-np.pi, np.pi, ANGLE_BINS + 1)
+  hist = np.zeros((c.num_ticks, ANGLE_BINS))
+  if c.dog_pos.shape[1] == 0 or c.sheep_pos.shape[1] == 0:
+    return {"dog_bearing_hist": hist}
+  rel = c.sheep_pos - c.dog_pos[:, :1]
+  bearing = np.arctan2(rel[..., 1], rel[..., 0]) - np.arctan2(c.dog_vel[:, :1, 1], c.dog_vel[:, :1, 0])
+  bearing = (bearing + np.pi) % (2 * np.pi) - np.pi
+  bins = np.clip(np.searchsorted(edges, bearing, side="right") - 1, 0, ANGLE_BINS - 1)
+  rows = np.repeat(np.arange(c.num_ticks), bearing.shape[1])
+  np.add.at(hist, (rows, bins.ravel()), 1.0)
+  hist /= bearing.shape[1] * (edges[1] - edges[0])
+  return {"dog_bearing_hist": hist}
+
+
+@metric("neighbour_distance_hist")
+def _neighbour_distance_hist(c: Chunk):
+  """Density of the sheep-sheep pair distances below DISTANCE_RANGE_D_REP * d_rep (grid-indexed per tick)."""
+  r_max = DISTANCE_RANGE_D_REP * float(c.config.get("d_rep", 2.0))
+  edges = np.linspace(0.0, r_max, DISTANCE_BINS + 1)
+  hist = np.zeros((c.num_ticks, DISTANCE_BINS))
+  for t in range(c.num_ticks):
+    _, _, dist = GridIndex(c.sheep_pos[t], r_max).pairs_within(r_max)
+    if len(dist):
+      hist[t] = np.histogram(dist, bins=edges, density=True)[0]
+  return {"neighbour_distance_hist": hist}
+
+
+@metric("nearest_neighbour_distance")
+def _nearest_neighbour_distance(c: Chunk):
+  """Mean distance of a sheep to its nearest neighbour (NaN if no pair is closer than 5 * d_rep)."""
+  r_max = DISTANCE_RANGE_D_REP * float(c.config.get("d_rep", 2.0))
+  n = c.sheep_pos.shape[1]
+  out = _nan_column(c)
+  for t in range(c.num_ticks):
+    i, _, dist = GridIndex(c.sheep_pos[t], r_max).pairs_within(r_max)
+    if len(dist):
+      nearest = np.full(n, np.inf)
+      np.minimum.at(nearest, i, dist)
+      found = np.isfinite(nearest)
+      out[t] = nearest[found].mean()
+  return {"nearest_neighbour_distance": out}
+
+
+@metric("clusters")
+def _clusters(c: Chunk):
+  """Number of clusters of sheep linked within clusters.LINK_D_REP * d_rep, largest cluster's share, size histogram."""
+  from clusters import CLUSTER_SIZE_BINS, default_link_radius, flock_clusters, size_histogram
+  link_radius = default_link_radius(c.config)
+  count = np.zeros(c.num_ticks)
+  largest = _nan_column(c)
+  hist = np.zeros((c.num_ticks, CLUSTER_SIZE_BINS))
+  for t in range(c.num_ticks):
+    _, sizes = flock_clusters(c.sheep_pos[t], link_radius)
+    count[t] = len(sizes)
+    if len(sizes):
+      largest[t] = sizes[0] / c.sheep_pos.shape[1]
+    hist[t] = size_histogram(sizes)
+  return {"num_clusters": count, "largest_cluster_fraction": largest, "cluster_size_hist": hist}
+
+
+# ---------- computation ----------
+
+def _cache_path(run_dir: str, m: Metric, index: int) -> str:
+  return os.path.join(run_dir, ANALYSIS_DIR, m.cache_name, f"chunk_{index:05d}.npz")
+
+
+def compute_chunk(run_dir: str, index: int, names: Sequence[str], use_cache: bool = True) -> Dict[str, np.ndarray]:
+  """Columns of the metrics `names` over stored chunk `index` (whole chunk), from the cache when possible."""
+  reader = TrajectoryReader(run_dir)
+  columns = reader.load_chunk(index, ("tick", "time"))
+  chunk = None
+  for name in names:
+    m = get_metric(name)
+    path = _cache_path(run_dir, m, index)
+    if use_cache and os.path.exists(path):
+      with np.load(path) as data:
+        columns.update({k: data[k] for k in data.files})
+      continue
+    if chunk is None:
+      chunk = Chunk(reader.load_chunk(index), reader.meta)
+    values = {k: np.asarray(v) for k, v in m.fn(chunk).items()}
+    if use_cache:
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      np.savez(path, **values)
+    columns.update(values)
+  return columns
+
+
+def _compute_chunk_job(job: Tuple[str, int, Tuple[str, ...], bool]) -> Dict[str, np.ndarray]:
+  """Pool entry point (module level so it can be pickled)."""
+  return compute_chunk(*job)
+
+
+def compute(run_dir: str, names: Iterable[str] | None = None, start: int = 0, stop: int | None = None,
+            workers: int = 1, use_cache: bool = True) -> Dict[str, np.ndarray]:
+  """
+  Recomputes the metrics `names` (default: all registered) over ticks [start, stop) of a stored
+  run, one chunk in memory per worker. Returns the columns plus "tick" and "time".
+  Metrics registered at runtime are visible to the workers on fork-based platforms only.
+  """
+  names = tuple(sorted(METRICS) if names is None else names)
+  for name in names:
+    get_metric(name)
+  reader = TrajectoryReader(run_dir)
+  stop = reader.num_ticks if stop is None else min(stop, reader.num_ticks)
+  selected = [(i, c_start, c_stop) for i, (c_start, c_stop) in enumerate(reader.chunk_ranges())
+              if c_stop > start and c_start < stop]
+  jobs = [(run_dir, i, names, use_cache) for i, _, _ in selected]
+
+  if workers > 1 and len(jobs) > 1:
+    from multiprocessing import Pool
+    with Pool(min(workers, len(jobs))) as pool:
+      results = pool.map(_compute_chunk_job, jobs)
+  else:
+    results = [_compute_chunk_job(job) for job in jobs]
+
+  parts: List[Dict[str, np.ndarray]] = []
+  for (i, c_start, c_stop), columns in zip(selected, results):
+    lo = max(start, c_start) - c_start
+    hi = min(stop, c_stop) - c_start
+    parts.append({k: v[lo:hi] for k, v in columns.items()})
+  if not parts:
+    return {}
+  return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+
+def clear_cache(run_dir: str, names: Iterable[str] | None = None) -> None:
+  """Removes the cached columns of `names` (default: every metric) of a run."""
+  import shutil
+  root = os.path.join(run_dir, ANALYSIS_DIR)
+  if names is None:
+    shutil.rmtree(root, ignore_errors=True)
+    return
+  for name in names:
+    shutil.rmtree(os.path.join(root, get_metric(name).cache_name), ignore_errors=True)
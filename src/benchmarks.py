@@ -0,0 +1,228 @@
+import json
+import math
+import os
+import subprocess
+import sys
+from typing import Dict, List, Sequence
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ---------- start-up time ----------
+
+# Modules a simulation-only worker imports, and backends none of them may pull in at import time
+# (numpy is part of the engine: the neighbour index and extremal queries run on it).
+ENGINE_ENTRY_POINTS = ("simulation", "config_io", "runner", "sinks", "main", "visulizer", "plotter", "two_dogs_sim")
+HEAVY_MODULES = ("matplotlib", "pygame", "pygame_gui", "PIL", "numba")
+
+_STARTUP_PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+print(json.dumps([elapsed, [m for m in {heavy!r} if m in sys.modules]]))
+"""
+
+
+def startup_time(module: str, repeat: int = 5) -> Dict[str, object]:
+  """Import time of `module` in fresh interpreters (best of `repeat`) and the heavy modules it loaded."""
+  code = _STARTUP_PROBE.format(module=module, heavy=HEAVY_MODULES)
+  best = None
+  heavy: List[str] = []
+  for _ in range(repeat):
+    out = subprocess.run([sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True, check=True)
+    seconds, heavy = json.loads(out.stdout.strip().splitlines()[-1])
+    best = seconds if best is None else min(best, seconds)
+  return {"module": module, "import_s": best, "heavy": heavy}
+
+
+def startup_benchmark(modules: Sequence[str] = ENGINE_ENTRY_POINTS, repeat: int = 5) -> int:
+  """Prints import times; returns the number of entry points that eagerly import a heavy backend."""
+  failures = 0
+  print(f"{'module':<16}{'import [ms]':>12}  heavy modules loaded")
+  for module in modules:
+    r = startup_time(module, repeat)
+    if r["heavy"]:
+      failures += 1
+    print(f"{module:<16}{1000.0 * r['import_s']:>12.1f}  {', '.join(r['heavy']) or '-'}")
+  if failures:
+    print(f"{failures} entry point(s) import heavy modules at start-up")
+  return failures
+
+
+# ---------- state precision ----------
+
+def precision_benchmark(sizes: Sequence[int] = (1_000, 10_000, 100_000), steps: int = 10, seed: int = 1) -> List[dict]:
+  """Memory and throughput of the array engine with float64 vs float32 state (and object-engine memory for scale)."""
+  import dataclasses
+  import time
+  import tracemalloc
+
+  from config_io import default_config, scaled_config
+  from engine import ArraySimulation
+  from simulation import Simulation
+
+  rows = []
+  print(f"{'sheep':>8} {'precision':>9} {'state [MB]':>11} {'snapshot [KB/tick]':>19} {'peak [MB]':>10} "
+        f"{'ms/tick':>9} {'mean cohesion':>14}")
+  for n in sizes:
+    for precision in ("float64", "float32"):
+      # figure 6 density and thresholds
+      cfg = dataclasses.replace(scaled_config(default_config(), n), precision=precision)
+
+      tracemalloc.start()
+      sim = ArraySimulation(cfg, collect_metrics=False, seed=seed)
+      sim.update(1.0)
+      peak = tracemalloc.get_traced_memory()[1]
+      tracemalloc.stop()
+
+      sim = ArraySimulation(cfg, collect_metrics=True, seed=seed)
+      start = time.perf_counter()
+      cohesion = [state.cohesion for state in sim.steps(steps)]
+      elapsed = time.perf_counter() - start
+
+      a = sim.arrays
+      row = {
+        "sheep": n,
+        "precision": precision,
+        "state_bytes": a.nbytes,
+        "snapshot_bytes": a.pos.nbytes + a.vel.nbytes + a.dog_pos.nbytes + a.dog_vel.nbytes,
+        "peak_bytes": peak,
+        "seconds_per_tick": elapsed / steps,
+        "mean_cohesion": sum(cohesion) / len(cohesion),
+      }
+      rows.append(row)
+      print(f"{n:>8} {precision:>9} {row['state_bytes'] / 2**20:>11.2f} {row['snapshot_bytes'] / 2**10:>19.1f} "
+            f"{peak / 2**20:>10.1f} {1000 * row['seconds_per_tick']:>9.2f} {row['mean_cohesion']:>14.3f}")
+
+  # the object engine for scale: one slotted object of Python floats per agent
+  n = min(sizes)
+  tracemalloc.start()
+  sim = Simulation(scaled_config(default_config(), n), seed=seed)
+  object_bytes = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  del sim
+  print(f"object engine: {object_bytes / n:.0f} bytes/sheep "
+        f"(array engine: {rows[0]['state_bytes'] / n:.0f} float64, {rows[1]['state_bytes'] / n:.0f} float32)")
+  return rows
+
+
+# ---------- flock-size scaling ----------
+
+def log_spaced_sizes(lo: int, hi: int, count: int) -> List[int]:
+  """About `count` log-spaced flock sizes from lo to hi (duplicates removed)."""
+  import numpy as np
+  return sorted({int(round(v)) for v in np.geomspace(lo, hi, max(count, 2))})
+
+
+SCALING_MODES = ("weak", "strong")
+
+
+def scaling_study(cfg=None, sizes: Sequence[int] = (14, 100, 1_000, 10_000), engines: Sequence[str] = ("object", "array"),
+                  steps: int = 20, seed: int = 1, max_object_sheep: int = 2_000,
+                  modes: Sequence[str] = SCALING_MODES) -> List[dict]:
+  """
+  Runs every engine over the flock sizes with the N-dependent parameters re-derived
+  (config_io.scaled_config) and reports behaviour (mean cohesion / polarization / elongation)
+  next to cost: seconds per tick, peak traced memory of construction plus one tick, and the
+  local log-log slope of seconds/tick against N (1 = linear, 2 = quadratic). Every mode is
+  its own curve:
+    weak    the field grows with the flock (constant initial density)
+    strong  the config's field for every flock size (the density grows with N)
+  The object engine, quadratic in N, is skipped above max_object_sheep.
+  """
+  import dataclasses
+  import time
+  import tracemalloc
+
+  from config_io import default_config, scaled_config
+  from engines import make_simulation
+
+  unknown = set(modes) - set(SCALING_MODES)
+  if unknown:
+    raise ValueError(f"Unknown scaling modes: {', '.join(sorted(unknown))} (choose from {', '.join(SCALING_MODES)})")
+  base = cfg or default_config()
+  rows = []
+  print(f"{'mode':>6} {'engine':>7} {'sheep':>8} {'ms/tick':>10} {'slope':>6} {'peak [MB]':>10} {'cohesion':>9} "
+        f"{'polarization':>13} {'elongation':>11}")
+  for mode, engine in [(m, e) for m in modes for e in engines]:
+    previous = None
+    for n in sizes:
+      if engine == "object" and n > max_object_sheep:
+        print(f"{mode:>6} {engine:>7} {n:>8}    skipped (object engine above {max_object_sheep} sheep)")
+        continue
+      run_cfg = dataclasses.replace(scaled_config(base, n, keep_density=mode == "weak"), engine=engine)
+
+      tracemalloc.start()
+      sim = make_simulation(run_cfg, collect_metrics=False, seed=seed)
+      sim.update(1.0)
+      peak = tracemalloc.get_traced_memory()[1]
+      tracemalloc.stop()
+      del sim
+
+      sim = make_simulation(run_cfg, collect_metrics=True, seed=seed)
+      sums = {"cohesion": 0.0, "polarization": 0.0, "elongation": 0.0}
+      start = time.perf_counter()
+      for state in sim.steps(steps):
+        for name in sums:
+          sums[name] += getattr(state, name)
+      seconds_per_tick = (time.perf_counter() - start) / steps
+
+      slope = math.nan
+      if previous is not None:
+        slope = math.log(seconds_per_tick / previous[1]) / math.log(n / previous[0])
+      previous = (n, seconds_per_tick)
+      row = {"mode": mode, "engine": engine, "sheep": n, "seconds_per_tick": seconds_per_tick, "slope": slope,
+             "peak_bytes": peak, "f_n": run_cfg.f_n, "pd": run_cfg.pd, "field_size": run_cfg.field_size[0]}
+      row.update({f"mean_{name}": total / steps for name, total in sums.items()})
+      rows.append(row)
+      print(f"{mode:>6} {engine:>7} {n:>8} {1000 * seconds_per_tick:>10.2f} {slope:>6.2f} {peak / 2**20:>10.1f} "
+            f"{row['mean_cohesion']:>9.2f} {row['mean_polarization']:>13.3f} {row['mean_elongation']:>11.3f}")
+  return rows
+
+
+# ---------- worker scaling ----------
+
+def worker_scaling(cfg=None, sizes: Sequence[int] = (1_000, 5_000, 20_000), workers: Sequence[int] = (1, 2, 4, 8, 16, 32),
+                   engines: Sequence[str] = ("threaded",), steps: int = 20, seed: int = 1) -> List[dict]:
+  """
+  Seconds per tick of the strip-parallel engines (parallel_engine.py) against the number of
+  workers, with speedup and parallel efficiency relative to one worker. cpu/wall is the CPU
+  time of this process over the wall time: above 1 the threaded engine ran NumPy kernels
+  concurrently, i.e. with the GIL released (worker processes do not count towards it).
+  Worker counts above os.cpu_count() are marked as oversubscribed.
+  """
+  import dataclasses
+  import time
+
+  from config_io import default_config, scaled_config
+  from engines import make_simulation
+
+  base = cfg or default_config()
+  cpus = os.cpu_count() or 1
+  # speedup and efficiency are relative to one worker, timed even when not asked for
+  counts = sorted(set(workers) | {1})
+  rows = []
+  print(f"{'engine':>9} {'sheep':>7} {'workers':>8} {'ms/tick':>10} {'speedup':>8} {'efficiency':>11} {'cpu/wall':>9}")
+  for engine in engines:
+    for n in sizes:
+      single = None
+      for w in counts:
+        run_cfg = dataclasses.replace(scaled_config(base, n), engine=engine, workers=w)
+        sim = make_simulation(run_cfg, collect_metrics=False, seed=seed)
+        sim.update(1.0)  # warm-up: worker start, first strip layout
+        wall, cpu = time.perf_counter(), time.process_time()
+        for _ in range(steps):
+          sim.update(1.0)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        sim.close()
+
+        seconds_per_tick = wall / steps
+        if w == 1:
+          single = seconds_per_tick
+        row = {"engine": engine, "sheep": n, "workers": w, "seconds_per_tick": seconds_per_tick,
+               "speedup": single / seconds_per_tick, "efficiency": single / seconds_per_tick / w,
+               "cpu_per_wall": cpu / wall, "oversubscribed": w > cpus}
+        rows.append(row)
+        print(f"{engine:>9} {n:>7} {w:>8} {1000 * seconds_per_tick:>10.2f} {row['speedup']:>8.2f} "
+              f"{row['efficiency']:>11.2f} {row['cpu_per_wall']:>9.2f}{'  (oversubscribed)' if w > cpus else ''}")
+  return rows
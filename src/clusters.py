@@ -0,0 +1,200 @@
+import csv
+from dataclasses import astuple, dataclass, fields
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from spatial import GridIndex
+
+# Sub-flocks and breakaways (docs/upgrade-ideas.md: how often does a sheep break away from the
+# flock and force the dog back to collecting?).
+#
+# Every tick the flock is split into clusters, the connected components of the graph linking
+# sheep closer than link_radius (default LINK_D_REP * d_rep):
+#   - the links are the pairs of a GridIndex with cells of link_radius;
+#   - components come from a vectorized union-find: every link hooks the larger of its two roots
+#     under the smaller one (np.minimum.at), then pointer jumping (parent = parent[parent]) makes
+#     every parent a root again; links inside one component are dropped after each round, and the
+#     rounds stop when none is left (a few rounds, each O(N + links)).
+# Cluster labels are ranked by size, 0 being the largest cluster (the main flock).
+#
+# ClusterTracker follows the clusters from tick to tick with persistent ids: a cluster keeps the
+# id of the previous cluster it received most of its sheep from, provided that cluster sent
+# most of its sheep to it. It emits
+#   split      a cluster with a new id that came mostly from cluster `other`
+#   merge      the bulk of cluster `other` ended up in `cluster`, which kept its own id
+#   breakaway  a fragment split from the main flock stayed apart for `persistence` ticks
+#   rejoin     a cluster that broke away merged back into the main flock
+
+LINK_D_REP = 3.0        # default link radius, in units of d_rep
+CLUSTER_SIZE_BINS = 16  # cluster size histogram: bin k counts clusters of 2^k .. 2^(k+1) - 1 sheep
+
+
+def connected_components(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+  """Root (smallest member) of the component of each of n nodes linked by the edges (i, j)."""
+  parent = np.arange(n)
+  i, j = np.asarray(i, dtype=np.intp), np.asarray(j, dtype=np.intp)
+  while len(i):
+    ri, rj = parent[i], parent[j]
+    open_ = ri != rj
+    i, j, ri, rj = i[open_], j[open_], ri[open_], rj[open_]
+    if not len(i):
+      break
+    np.minimum.at(parent, np.maximum(ri, rj), np.minimum(ri, rj))
+    while True:
+      jumped = parent[parent]
+      if np.array_equal(jumped, parent):
+        break
+      parent = jumped
+  return parent
+
+
+def flock_clusters(pos: np.ndarray, link_radius: float) -> Tuple[np.ndarray, np.ndarray]:
+  """(labels (N,), sizes (K,)) of the clusters of sheep linked within link_radius, largest first."""
+  pos = np.asarray(pos, dtype=np.float64).reshape(-1, 2)
+  n = len(pos)
+  if n == 0:
+    return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+  i, j, _ = GridIndex(pos, link_radius).pairs_within(link_radius)
+  keep = i < j  # pairs_within lists both orderings
+  roots = connected_components(n, i[keep], j[keep])
+  _, inverse, counts = np.unique(roots, return_inverse=True, return_counts=True)
+  rank = np.argsort(-counts, kind="stable")
+  relabel = np.empty_like(rank)
+  relabel[rank] = np.arange(len(rank))
+  return relabel[inverse.ravel()], counts[rank]
+
+
+def size_histogram(sizes: np.ndarray) -> np.ndarray:
+  """Number of clusters per CLUSTER_SIZE_BINS log2 size bin (the last bin is open-ended)."""
+  bins = np.minimum(np.log2(np.maximum(sizes, 1)).astype(np.intp), CLUSTER_SIZE_BINS - 1)
+  return np.bincount(bins, minlength=CLUSTER_SIZE_BINS)
+
+
+def default_link_radius(config: dict) -> float:
+  return LINK_D_REP * float(config.get("d_rep", 2.0))
+
+
+@dataclass
+class ClusterEvent:
+  tick: int
+  kind: str     # split, merge, breakaway, rejoin
+  cluster: int  # persistent id of the cluster the event is about
+  size: int     # its number of sheep (merge: sheep of `other` that joined it)
+  other: int    # split / breakaway: cluster it came from; merge / rejoin: cluster it joined
+
+
+EVENT_COLUMNS = tuple(f.name for f in fields(ClusterEvent))
+
+
+class ClusterTracker:
+  """Clusters of every tick passed to update(), with persistent ids and events (see the top of this module)."""
+
+  def __init__(self, link_radius: float, persistence: int = 10):
+    self.link_radius = link_radius
+    self.persistence = persistence
+    self.labels: np.ndarray | None = None  # per sheep, ranked by size
+    self.sizes = np.zeros(0, dtype=np.intp)
+    self.ids = np.zeros(0, dtype=np.int64)  # persistent id of every label
+    self._next_id = 0
+    self._pending: Dict[int, int] = {}     # fragments split from the main flock -> tick of the split
+    self._away: set = set()                # fragments that broke away
+    self.breakaways = 0
+
+  @property
+  def num_clusters(self) -> int:
+    return len(self.sizes)
+
+  @property
+  def main(self) -> int:
+    return int(self.ids[0]) if len(self.ids) else -1
+
+  def _new_ids(self, count: int) -> np.ndarray:
+    ids = np.arange(self._next_id, self._next_id + count, dtype=np.int64)
+    self._next_id += count
+    return ids
+
+  def update(self, tick: int, pos: np.ndarray) -> List[ClusterEvent]:
+    labels, sizes = flock_clusters(pos, self.link_radius)
+    if self.labels is None or len(self.labels) != len(labels):
+      self.labels, self.sizes, self.ids = labels, sizes, self._new_ids(len(sizes))
+      self._pending.clear()
+      self._away.clear()
+      return []
+
+    k = max(len(sizes), 1)
+    overlap, counts = np.unique(self.labels * k + labels, return_counts=True)
+    prev, cur = overlap // k, overlap % k
+    # successor of every previous cluster: the current cluster that received most of its sheep
+    order = np.lexsort((-counts, prev))
+    successor = np.zeros(len(overlap), dtype=bool)
+    successor[order[np.r_[True, prev[order][1:] != prev[order][:-1]]]] = True
+    # a current cluster inherits the id of its largest source among the clusters it succeeds
+    rows = np.flatnonzero(successor)
+    rows = rows[np.lexsort((-counts[rows], cur[rows]))]
+    heirs = rows[np.r_[True, cur[rows][1:] != cur[rows][:-1]]] if len(rows) else rows
+    ids = np.full(len(sizes), -1, dtype=np.int64)
+    ids[cur[heirs]] = self.ids[prev[heirs]]
+    fresh = np.flatnonzero(ids < 0)
+    ids[fresh] = self._new_ids(len(fresh))
+
+    events: List[ClusterEvent] = []
+    if len(fresh):
+      # origin of a new cluster: its largest source
+      order = np.lexsort((-counts, cur))
+      largest = order[np.r_[True, cur[order][1:] != cur[order][:-1]]]
+      origin = np.full(len(sizes), -1, dtype=np.intp)
+      origin[cur[largest]] = prev[largest]
+      for c in fresh:
+        events.append(ClusterEvent(tick, "split", int(ids[c]), int(sizes[c]), int(self.ids[origin[c]])))
+    inherited = np.zeros(len(overlap), dtype=bool)
+    inherited[heirs] = True
+    for r in np.flatnonzero(successor & ~inherited):
+      events.append(ClusterEvent(tick, "merge", int(ids[cur[r]]), int(counts[r]), int(self.ids[prev[r]])))
+
+    previous_main = self.main
+    self.labels, self.sizes, self.ids = labels, sizes, ids
+    events.extend(self._breakaways(tick, events, previous_main))
+    return events
+
+  def _breakaways(self, tick: int, events: List[ClusterEvent], previous_main: int) -> List[ClusterEvent]:
+    main = self.main
+    size_of = dict(zip(self.ids.tolist(), self.sizes.tolist()))
+    out = []
+    for e in events:
+      if e.kind == "split" and e.other == previous_main:
+        self._pending[e.cluster] = tick
+      elif e.kind == "merge" and e.cluster == main and e.other in self._away:
+        self._away.discard(e.other)
+        out.append(ClusterEvent(tick, "rejoin", e.other, e.size, main))
+    for cluster, start in list(self._pending.items()):
+      if cluster not in size_of or cluster == main:
+        del self._pending[cluster]
+      elif tick - start >= self.persistence:
+        del self._pending[cluster]
+        self._away.add(cluster)
+        self.breakaways += 1
+        out.append(ClusterEvent(tick, "breakaway", cluster, size_of[cluster], main))
+    self._away.intersection_update(size_of)
+    self._away.discard(main)
+    return out
+
+
+def track_run(run_dir: str, link_radius: float | None = None, persistence: int = 10,
+              start: int = 0, stop: int | None = None) -> Iterator[Tuple[int, ClusterTracker, List[ClusterEvent]]]:
+  """(tick, tracker, events) for every stored tick of a run (trajectory_store.py), in order."""
+  from trajectory_store import TrajectoryReader
+  reader = TrajectoryReader(run_dir)
+  if link_radius is None:
+    link_radius = default_link_radius(reader.meta.get("config", {}))
+  tracker = ClusterTracker(link_radius, persistence)
+  for chunk in reader.chunks(start, stop):
+    for tick, pos in zip(chunk["tick"], chunk["sheep_pos"]):
+      yield int(tick), tracker, tracker.update(int(tick), pos)
+
+
+def write_events(path: str, events: List[ClusterEvent]) -> None:
+  with open(path, "w", newline="") as f:
+    writer = csv.writer(f)
+    writer.writerow(EVENT_COLUMNS)
+    writer.writerows(astuple(e) for e in events)
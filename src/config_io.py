@@ -0,0 +1,147 @@
+import dataclasses
+import json
+import math
+import os
+from typing import Any, Dict, Tuple
+
+from simulation import SimulationConfig
+
+# Parameters used for figure 6 of the paper; config files override any subset of them.
+FIGURE6 = dict(
+  field_size=(250, 250),
+
+  num_sheep=14,
+  num_shepherds=1,
+
+  neighbors_num=10,  # K_atr
+
+  # social attraction / alignment
+  w_att=1.5,  # c
+  n_att=4,  # k_atr
+  w_ali=1.3,  # alg_str
+  n_ali=1,  # k_alg
+
+  # social repulsion
+  w_rep=2.0,  # rho_a
+  d_rep=2.0,  # rad_rep_s
+
+  # dog repulsion
+  inertia_dog=0.5,  # h
+  w_dog=1.0,  # rho_d
+  d_dog=12.0,  # rad_rep_dog
+
+  goal_pos=(50, 50),
+
+  # global dog-logic parameters
+  v_dog=1.5,  # v_dog
+  e=0.3,  # noise strength e
+
+  # flock cohesion threshold and collecting / driving offsets
+  f_n=2.0 * (14 ** (2 / 3)),  # rad_rep_s * no_shp^(2/3)
+  pc=2.0,  # collecting offset (pc = rad_rep_s)
+  pd=2.0 * (14 ** 0.5),  # pd = rad_rep_s * sqrt(no_shp)
+)
+
+
+@dataclasses.dataclass
+class RunOptions:
+  steps: int = 310
+  seed: int = 42
+  dt: float = 1.0
+  collect_metrics: bool = True
+
+
+def default_config() -> SimulationConfig:
+  return SimulationConfig(**FIGURE6)
+
+
+def scaled_config(cfg: SimulationConfig, num_sheep: int, keep_density: bool = True) -> SimulationConfig:
+  """
+  `cfg` for a flock of `num_sheep`, with the flock-size dependent herding thresholds of the paper
+  re-derived: f_n = d_rep * N^(2/3), pd = d_rep * sqrt(N). With keep_density the field (and the
+  goal with it) is scaled by sqrt(N / cfg.num_sheep), so the initial sheep density stays the same.
+  """
+  n = max(num_sheep, 1)
+  values = dict(num_sheep=num_sheep, f_n=cfg.d_rep * n ** (2 / 3), pd=cfg.d_rep * math.sqrt(n))
+  if keep_density and cfg.num_sheep > 0:
+    factor = math.sqrt(n / cfg.num_sheep)
+    values["field_size"] = tuple(int(round(v * factor)) for v in cfg.field_size)
+    if cfg.goal_pos is not None:
+      values["goal_pos"] = tuple(v * factor for v in cfg.goal_pos)
+  return dataclasses.replace(cfg, **values)
+
+
+def read_document(path: str) -> Dict[str, Any]:
+  """Reads a TOML (.toml) or JSON (.json) file into a dict."""
+  ext = os.path.splitext(path)[1].lower()
+  if ext == ".toml":
+    import tomllib
+    with open(path, "rb") as f:
+      return tomllib.load(f)
+  if ext == ".json":
+    with open(path) as f:
+      return json.load(f)
+  raise ValueError(f"Unsupported config format '{ext}' (expected .toml or .json)")
+
+
+def config_from_dict(values: Dict[str, Any], base: SimulationConfig | None = None) -> SimulationConfig:
+  """Builds a SimulationConfig from `base` (figure 6 by default) with `values` overriding fields."""
+  known = {f.name for f in dataclasses.fields(SimulationConfig)}
+  unknown = set(values) - known
+  if unknown:
+    raise ValueError(f"Unknown simulation parameters: {', '.join(sorted(unknown))}")
+  merged = dataclasses.asdict(base) if base is not None else dict(FIGURE6)
+  merged.update(values)
+  # TOML/JSON have no tuples
+  for name in ("field_size", "goal_pos"):
+    if merged.get(name) is not None:
+      merged[name] = tuple(merged[name])
+  return SimulationConfig(**merged)
+
+
+def config_to_dict(cfg: SimulationConfig) -> Dict[str, Any]:
+  """JSON-serialisable form of a config (tuples become lists)."""
+  out = dataclasses.asdict(cfg)
+  for name, value in out.items():
+    if isinstance(value, tuple):
+      out[name] = list(value)
+  return out
+
+
+def load_config(path: str) -> Tuple[SimulationConfig, RunOptions]:
+  """
+  Loads a run description:
+
+    seed = 10          # optional run options (see RunOptions)
+    steps = 310
+    [simulation]       # SimulationConfig fields, missing ones default to FIGURE6
+    num_sheep = 14
+    [sweep]            # optional, only used by the sweep command (see load_sweep)
+    num_sheep = [14, 28, 56]
+    [optimize]         # optional, only used by the optimize command (see load_optimize)
+    pc = [0.5, 20.0]
+  """
+  doc = dict(read_document(path))
+  sim_values = doc.pop("simulation", {})
+  doc.pop("sweep", None)
+  doc.pop("optimize", None)
+  run_fields = {f.name for f in dataclasses.fields(RunOptions)}
+  unknown = set(doc) - run_fields
+  if unknown:
+    raise ValueError(f"Unknown run options in {path}: {', '.join(sorted(unknown))}")
+  return config_from_dict(sim_values), RunOptions(**doc)
+
+
+def load_sweep(path: str) -> Dict[str, list]:
+  """The [sweep] table of a config file: parameter name -> list of values (seed is allowed too)."""
+  sweep = read_document(path).get("sweep", {})
+  return {name: list(values) for name, values in sweep.items()}
+
+
+def load_optimize(path: str) -> Dict[str, Tuple[float, float]]:
+  """The [optimize] table of a config file: parameter name -> [lo, hi] search range."""
+  table = read_document(path).get("optimize", {})
+  for name, bounds in table.items():
+    if len(bounds) != 2:
+      raise ValueError(f"[optimize] {name} must be [lo, hi]")
+  return {name: (float(lo), float(hi)) for name, (lo, hi) in table.items()}
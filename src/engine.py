@@ -0,0 +1,862 @@
+import math
+from dataclasses import dataclass, fields
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from agent_views import dog_views, sheep_views
+from kernels import select_kernels
+from perception import make_perception
+from profiling import SimulationProfiler
+from simulation import SimulationConfig
+from simulation_state import SimulationState
+from spatial import GridIndex
+
+# Constants of the object model (agents.py)
+ALPHA = 0.5        # Sheep.move alpha (inertia of the previous direction)
+EPSILON = 0.1      # Sheep.move epsilon (noise strength)
+SPEED_CONST = 1.0  # Agent.speed_const
+SLOW_STEP = 0.05   # Dog.update slow-step speed
+
+# Up to this many sheep the attraction sample is drawn exactly like random.sample (O(N^2) keys);
+# above it indices are drawn with replacement and rows containing duplicates are redrawn.
+EXACT_SAMPLING_MAX_SHEEP = 256
+
+PRECISIONS = ("float64", "float32")
+ORDERINGS = ("sequential", "synchronous")
+SEQUENTIAL_BLOCKS = 64  # sheep blocks per tick of the sequential ordering (one sheep per block up to this size)
+NEAREST_SLACK = 4.0     # sequential ordering: a dog's nearest-sheep candidates reach this many d_rep beyond d_rep
+PERCEIVED_BLOCK_PAIRS = 1 << 20  # candidate pairs per block of the cone-only perception test
+
+
+@dataclass
+class FlockArrays:
+  """Agent state of the array engines, one row per agent."""
+  pos: np.ndarray      # (N, 2) sheep positions
+  vel: np.ndarray      # (N, 2) sheep velocities
+  att: np.ndarray      # (N, 2) social attraction
+  ali: np.ndarray      # (N, 2) social alignment
+  rep: np.ndarray      # (N, 2) social repulsion
+  dog_rep: np.ndarray  # (N, 2) dog repulsion
+  noise: np.ndarray    # (N, 2) uniform [0, 1) noise draws
+  dog_pos: np.ndarray  # (D, 2)
+  dog_vel: np.ndarray  # (D, 2)
+
+  DOG_FIELDS = ("dog_pos", "dog_vel")
+
+  @classmethod
+  def empty(cls, num_sheep: int, num_dogs: int, dtype="float64") -> 'FlockArrays':
+    values = {}
+    for f in fields(cls):
+      rows = num_dogs if f.name in cls.DOG_FIELDS else num_sheep
+      values[f.name] = np.zeros((rows, 2), dtype=dtype)
+    return cls(**values)
+
+  @property
+  def nbytes(self) -> int:
+    return sum(getattr(self, f.name).nbytes for f in fields(self))
+
+
+def sample_others(rng: np.random.Generator, n: int, k: int, rows: np.ndarray | None = None) -> np.ndarray:
+  """
+  (len(rows), k) array whose row m holds k distinct indices of [0, n) other than rows[m],
+  uniformly chosen and in random order; rows defaults to all n indices.
+  """
+  m = n if rows is None else len(rows)
+  if n <= 1 or k <= 0:
+    return np.zeros((m, 0), dtype=np.int64)
+  k = min(k, n - 1)
+  if n <= EXACT_SAMPLING_MAX_SHEEP:
+    idx = np.argsort(rng.random((m, n - 1)), axis=1)[:, :k]
+  else:
+    idx = rng.integers(0, n - 1, size=(m, k))
+    while k > 1:
+      s = np.sort(idx, axis=1)
+      dup = np.nonzero((s[:, 1:] == s[:, :-1]).any(axis=1))[0]
+      if len(dup) == 0:
+        break
+      idx[dup] = rng.integers(0, n - 1, size=(len(dup), k))
+  # skip over the row's own index
+  own = np.arange(n) if rows is None else np.asarray(rows)
+  return idx + (idx >= own[:, None])
+
+
+def unit_vectors(d: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+  """Rows of d divided by their norm (zero rows stay zero), and the norms."""
+  norm = np.sqrt(np.einsum("...i,...i->...", d, d))
+  out = np.zeros_like(d)
+  np.divide(d, norm[..., None], out=out, where=norm[..., None] > 0)
+  return out, norm
+
+
+# ---------- rules (vectorized agents.py) ----------
+# Pure functions over position / direction arrays, shared by ArraySimulation and the tiles of
+# the parallel engine (parallel_engine.py), which evaluate them for a subset of the flock.
+
+def social_forces(rng: np.random.Generator, cfg: SimulationConfig, pos: np.ndarray, dirs: np.ndarray,
+                  rows: np.ndarray | None = None, kernels=None) -> Tuple[np.ndarray, np.ndarray]:
+  """
+  Attraction and alignment (Sheep.update_social) of the sheep `rows` (default all), sampling the
+  whole flock; `kernels` (kernels.py) evaluates them compiled.
+  """
+  n = len(pos)
+  own = pos if rows is None else pos[rows]
+  n_att = min(cfg.n_att, n - 1)
+  if n_att <= 0:
+    return np.zeros_like(own), np.zeros_like(own)
+
+  idx = sample_others(rng, n, n_att, rows)
+  if kernels is not None:
+    att, ali = np.empty_like(own), np.empty_like(own)
+    kernels.attraction_alignment(pos, dirs, np.arange(n) if rows is None else np.asarray(rows), idx,
+                                 min(cfg.n_ali, n_att), cfg.w_att, cfg.w_ali, att, ali)
+    return att, ali
+
+  # --- 1. Attraction ---
+  unit, _ = unit_vectors(pos[idx] - own[:, None, :])
+  att = cfg.w_att * unit.sum(axis=1) / n_att
+
+  # --- 2. Alignment (random subset of the attraction sample) ---
+  n_ali = min(cfg.n_ali, n_att)
+  ali = cfg.w_ali * dirs[idx[:, :n_ali]].sum(axis=1) / n_ali
+  return att, ali
+
+
+def perceived_social_forces(rng: np.random.Generator, cfg: SimulationConfig, pos: np.ndarray, dirs: np.ndarray,
+                            i: np.ndarray, j: np.ndarray, d: np.ndarray, n: int,
+                            offset: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+  """
+  Attraction and alignment of sheep offset..offset+n-1 when every sheep only uses the neighbours
+  it perceives, given as the pairs (i, j) at distance d (variable count per sheep).
+  """
+  counts = np.bincount(i - offset, minlength=n)
+  # shuffle inside every row; the first n_att pairs of a row are its attraction sample and
+  # the first n_ali of those its alignment sample, as random.sample would draw them
+  order = np.lexsort((rng.random(len(i)), i))
+  i, j, d = i[order], j[order], d[order]
+  row = i - offset
+  rank = np.arange(len(i)) - np.repeat(np.cumsum(counts) - counts, counts)
+  n_att = np.minimum(cfg.n_att, counts)
+  n_ali = np.minimum(cfg.n_ali, n_att)
+  att_out = np.zeros((n, 2), dtype=pos.dtype)
+  ali_out = np.zeros((n, 2), dtype=pos.dtype)
+
+  # --- 1. Attraction ---
+  att = rank < n_att[row]
+  rel = pos[j[att]] - pos[i[att]]
+  unit = np.zeros_like(rel)
+  np.divide(rel, d[att, None], out=unit, where=d[att, None] > 0)
+  scale = np.divide(cfg.w_att, n_att, out=np.zeros(n), where=n_att > 0)
+  att_out[:, 0] = np.bincount(row[att], weights=unit[:, 0], minlength=n) * scale
+  att_out[:, 1] = np.bincount(row[att], weights=unit[:, 1], minlength=n) * scale
+
+  # --- 2. Alignment ---
+  ali = rank < n_ali[row]
+  d_ali = dirs[j[ali]]
+  scale = np.divide(cfg.w_ali, n_ali, out=np.zeros(n), where=n_ali > 0)
+  ali_out[:, 0] = np.bincount(row[ali], weights=d_ali[:, 0], minlength=n) * scale
+  ali_out[:, 1] = np.bincount(row[ali], weights=d_ali[:, 1], minlength=n) * scale
+  return att_out, ali_out
+
+
+def repulsion_forces(w_rep: float, pos: np.ndarray, rep_i: np.ndarray, rep_j: np.ndarray, rep_d: np.ndarray,
+                     n: int, offset: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+  """
+  Social repulsion of sheep offset..offset+n-1 from the pairs closer than d_rep; returns (force,
+  hits per sheep).
+  """
+  row = rep_i - offset if offset else rep_i
+  hits = np.bincount(row, minlength=n)
+  rep = np.zeros((n, 2), dtype=pos.dtype)
+  if len(rep_i) == 0:
+    return rep, hits
+  d = pos[rep_j] - pos[rep_i]
+  unit = np.zeros_like(d)
+  np.divide(d, rep_d[:, None], out=unit, where=rep_d[:, None] > 0)
+  sx = np.bincount(row, weights=unit[:, 0], minlength=n)
+  sy = np.bincount(row, weights=unit[:, 1], minlength=n)
+  scale = np.divide(-w_rep, hits, out=np.zeros(n), where=hits > 0)
+  rep[:, 0] = sx * scale
+  rep[:, 1] = sy * scale
+  return rep, hits
+
+
+def sorted_pairs(pos: np.ndarray, radius: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+  """The ordered pairs (i, j) closer than radius, sorted by i, and where the pairs of every i start (N + 1,)."""
+  i, j, _ = GridIndex(pos, radius).pairs_within(radius)
+  order = np.argsort(i, kind="stable")
+  i, j = i[order], j[order]
+  return i, j, np.searchsorted(i, np.arange(len(pos) + 1))
+
+
+def block_pairs(pos: np.ndarray, pairs, lo: int, hi: int, radius: float | None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+  """
+  Pairs (i, j) with lo <= i < hi closer than radius at the current positions, and their
+  distances, among the candidates `pairs` (sorted_pairs, None = every pair).
+  """
+  if pairs is None:
+    n = len(pos)
+    i = np.repeat(np.arange(lo, hi), n)
+    j = np.tile(np.arange(n), hi - lo)
+    keep = i != j
+    i, j = i[keep], j[keep]
+  else:
+    ci, cj, starts = pairs
+    i, j = ci[starts[lo]:starts[hi]], cj[starts[lo]:starts[hi]]
+  rel = pos[j] - pos[i]
+  d = np.sqrt(np.einsum("ij,ij->i", rel, rel))
+  if radius is None:
+    return i, j, d
+  keep = d < radius
+  return i[keep], j[keep], d[keep]
+
+
+def dog_repulsion_forces(cfg: SimulationConfig, pos: np.ndarray, dog: np.ndarray) -> np.ndarray:
+  """Sheep.update_repulsion against the dog at `dog`."""
+  unit, dist = unit_vectors(pos - dog)
+  inside = (dist < cfg.d_dog) & (dist > 0)
+  return np.where(inside[:, None], cfg.w_dog * unit, 0.0)
+
+
+def steer(direction: np.ndarray, att: np.ndarray, ali: np.ndarray, rep: np.ndarray, dog_rep: np.ndarray,
+          noise: np.ndarray) -> np.ndarray:
+  """Sheep.move: the new unit direction (zero if the forces cancel) from the current one and the forces."""
+  u = ALPHA * direction + att + ali + rep + dog_rep + EPSILON * (noise - 0.5) * 2.0
+  unit, _ = unit_vectors(u)
+  return unit
+
+
+class FlockKinematics:
+  """
+  Speed, direction (unit velocity) and heading of every sheep, evaluated in batch and kept until
+  the velocities change. ArraySimulation.move() updates the rows it moves; the alignment rule and
+  the metrics read the cached arrays instead of re-normalizing FlockArrays.vel. Heading (arctan2)
+  is only evaluated when asked for.
+  """
+
+  def __init__(self, vel: np.ndarray):
+    self.vel = vel
+    self.refresh()
+
+  def refresh(self) -> None:
+    """Recomputes everything from the velocities (after writing vel from outside move())."""
+    self.direction, self.speed = unit_vectors(self.vel)
+    self._heading = None
+
+  def set_unit(self, rows, unit: np.ndarray, speed: float) -> None:
+    """Rows `rows` were given velocity unit * speed, with `unit` unit (or zero) vectors."""
+    self.direction[rows] = unit
+    self.speed[rows] = np.where(unit.any(axis=1), speed, 0.0)
+    self._heading = None
+
+  def changed(self) -> None:
+    """direction / speed were updated in place (compiled move kernel)."""
+    self._heading = None
+
+  @property
+  def heading(self) -> np.ndarray:
+    if self._heading is None:
+      self._heading = np.arctan2(self.vel[:, 1], self.vel[:, 0])
+    return self._heading
+
+
+class ArraySimulation:
+  """
+  Vectorized engine over FlockArrays; implements the rules of agents.py.
+
+  With the default ordering, "synchronous", all forces and the dog decisions are computed from
+  the state at the start of the tick, then everyone moves, and the dogs are updated
+  cfg.dog_substeps times per tick (the strip engines, parallel_engine.py, implement the same
+  ordering). This polarizes the flock less than the object engine.
+  ordering = "sequential" follows the object engine instead, for validation runs: the sheep are
+  updated one after another, each seeing the sheep moved before it, and between the forces and
+  the move of every sheep each dog is updated once (a dog takes N steps per tick). The sheep go
+  in SEQUENTIAL_BLOCKS blocks of consecutive indices, the forces of a block evaluated at once,
+  then its dog steps (sheep m is repelled by the first dog as it stood before the m-th step),
+  then its move; up to SEQUENTIAL_BLOCKS sheep that is the object engine's order exactly, above
+  it the sheep of a block see each other as they were at the start of the block. It costs
+  5-6x a synchronous tick (64 block passes plus N dog steps per tick).
+  State is stored in cfg.precision ("float64" or "float32").
+  """
+  default_ordering = "synchronous"
+
+  def __init__(self, simCfg: SimulationConfig, collect_metrics=True, seed: int = 42,
+               profiler: Optional[SimulationProfiler] = None):
+    if simCfg.precision not in PRECISIONS:
+      raise ValueError(f"Unknown precision '{simCfg.precision}' (choose from {', '.join(PRECISIONS)})")
+    self.ordering = simCfg.ordering or self.default_ordering
+    if self.ordering not in ORDERINGS:
+      raise ValueError(f"Unknown ordering '{self.ordering}' (choose from {', '.join(ORDERINGS)})")
+    self.cfg = simCfg
+    self.collect_metrics = collect_metrics
+    self.profiler = profiler
+    self.dtype = np.dtype(simCfg.precision)
+    self.rng = np.random.default_rng(seed)
+
+    a = FlockArrays.empty(simCfg.num_sheep, simCfg.num_shepherds, self.dtype)
+    w, h = simCfg.field_size
+    a.pos[:] = self.rng.uniform((0.0, 0.0), (w, h), size=(simCfg.num_sheep, 2))
+    a.dog_pos[:] = self.rng.uniform((0.0, 0.0), (w, h), size=(simCfg.num_shepherds, 2))
+    self.arrays = a
+    self.kinematics = FlockKinematics(a.vel)
+
+    # last decision of every dog: "collect", "drive", "slow" or None
+    self.dog_modes: List[Optional[str]] = [None] * simCfg.num_shepherds
+    # views for SimulationState / visualizer consumers
+    self.sheep = sheep_views(a)
+    self.shepherds = dog_views(a, self.dog_modes)
+
+    # limited senses (perception.py); None = the whole flock
+    self.sheep_perception = make_perception(simCfg.sheep_vision_radius, simCfg.sheep_view_angle)
+    self.dog_perception = make_perception(simCfg.dog_vision_radius, simCfg.dog_view_angle)
+    self.dog_index: GridIndex | None = None
+    self._dog_index_reach = 0.0  # how far the sheep may have moved since dog_index was built
+    # EventRecorder told about every dog decision (events.py); None = not recorded
+    self.dog_events = None
+    # compiled rule kernels (kernels.py); None = NumPy
+    self.kernels = select_kernels(simCfg.kernels)
+
+  # ---------- stepping ----------
+
+  def steps(self, steps=100, dt=1.0, stop_when: Optional[Callable[['ArraySimulation'], bool]] = None):
+    """Same protocol as Simulation.steps()."""
+    accum = 0.0
+    prof = self.profiler
+    try:
+      for step in range(steps):
+        state = SimulationState(
+          tick=step,
+          time=accum,
+          bounds=self.cfg.field_size,
+          sheep=self.sheep,
+          dogs=self.shepherds,
+          barycenter=None,
+          velocity=None,
+          direction=None,
+          perp_direction=None,
+          cohesion=None,
+          polarization=None,
+          elongation=None,
+          dog_offsets=None,
+          dog_rear_distance=None,
+          arrays=self.arrays,
+        )
+
+        if prof is not None:
+          prof.begin_tick(step)
+          t0 = prof.clock()
+
+        if self.collect_metrics and len(self.arrays.pos):
+          self.fill_metrics(state)
+
+        if prof is not None:
+          prof.add_time("metrics", prof.clock() - t0)
+
+        # yield before updating, so positions and metrics of the state describe the same instant
+        yield state
+
+        if stop_when is not None and stop_when(self):
+          return
+
+        accum += dt
+        self.update(dt)
+
+        if prof is not None:
+          prof.end_tick()
+    finally:
+      # a consumer that stops iterating early (or a stop_when return) leaves the tick open
+      if prof is not None and prof.current is not None:
+        prof.end_tick()
+
+  def update(self, dt: float) -> None:
+    prof = self.profiler
+    if prof is not None:
+      own_tick = prof.current is None
+      if own_tick:
+        prof.begin_tick(prof.num_ticks)
+      clock = prof.clock
+      t0 = clock()
+
+    if self.ordering == "sequential":
+      self.update_sequential(dt)
+      if prof is not None and own_tick:
+        prof.end_tick()
+      return
+
+    cfg = self.cfg
+    a = self.arrays
+
+    index = GridIndex(a.pos, cfg.d_rep)
+    rep_i, rep_j, rep_d = self.repulsion_pairs(index)
+    if self.dog_perception is not None:
+      self.dog_index = self.dog_perception.make_index(a.pos)
+    if prof is not None:
+      t1 = clock()
+      prof.add_time("neighbors", t1 - t0)
+      prof.count("neighbor_candidates", index.candidates_examined)
+
+    rep_hits = self.update_social(rep_i, rep_j, rep_d)
+    if prof is not None:
+      t0 = clock()
+      prof.add_time("social", t0 - t1)
+      prof.count("repulsion_hits", len(rep_i))
+
+    self.update_dog_repulsion()
+    if prof is not None:
+      t1 = clock()
+      prof.add_time("dog_repulsion", t1 - t0)
+
+    for _ in range(max(1, cfg.dog_substeps)):
+      for k in range(len(a.dog_pos)):
+        self.update_dog(k, dt)
+        if prof is not None and self.dog_modes[k] is not None:
+          prof.count(f"dog_{self.dog_modes[k]}")
+    if prof is not None:
+      t0 = clock()
+      prof.add_time("dog", t0 - t1)
+
+    a.noise[:] = self.rng.random(a.noise.shape)
+    if prof is not None:
+      t1 = clock()
+      prof.add_time("noise", t1 - t0)
+
+    substeps = self.integrate(dt, rep_hits)
+    if prof is not None:
+      t0 = clock()
+      prof.add_time("move", t0 - t1)
+      prof.count("substeps", substeps)
+      if own_tick:
+        prof.end_tick()
+
+  def update_sequential(self, dt: float) -> None:
+    """One tick in the object engine's order (see the class docstring)."""
+    cfg = self.cfg
+    a = self.arrays
+    kin = self.kinematics
+    prof = self.profiler
+    n = len(a.pos)
+    if n == 0:
+      return
+    if prof is not None:
+      clock = prof.clock
+      t0 = clock()
+
+    # a sheep moves at most `reach` during the tick, so the pairs and dog neighbours found on the
+    # start-of-tick positions, widened by that, contain every current one
+    reach = SPEED_CONST * dt
+    rep_pairs = sorted_pairs(a.pos, cfg.d_rep + 2.0 * reach)
+    perception = self.sheep_perception
+    vision_pairs = None
+    if perception is not None and perception.radius is not None:
+      vision_pairs = sorted_pairs(a.pos, perception.radius + 2.0 * reach)
+    dog_near = None
+    if self.dog_perception is not None:
+      self.dog_index = self.dog_perception.make_index(a.pos)
+      self._dog_index_reach = reach
+    elif len(a.dog_pos):
+      dog_near = GridIndex(a.pos, cfg.d_rep + reach)
+      dog_step = max(cfg.v_dog, SLOW_STEP) * dt
+      dog_slack = NEAREST_SLACK * cfg.d_rep
+    if prof is not None:
+      t1 = clock()
+      prof.add_time("neighbors", t1 - t0)
+
+    block = -(-n // SEQUENTIAL_BLOCKS)
+    path = np.empty((block + 1, 2), dtype=self.dtype)  # first dog before step m (and after the last)
+    hits = 0
+    substeps = 0
+    for lo in range(0, n, block):
+      hi = min(lo + block, n)
+      rows = np.arange(lo, hi)
+      if prof is not None:
+        t0 = clock()
+
+      # --- forces of the block, from the current state ---
+      if perception is None:
+        a.att[lo:hi], a.ali[lo:hi] = social_forces(self.rng, cfg, a.pos, kin.direction, rows, self.kernels)
+      else:
+        i, j, d = self._perceived(*block_pairs(a.pos, vision_pairs, lo, hi, perception.radius))
+        a.att[lo:hi], a.ali[lo:hi] = perceived_social_forces(self.rng, cfg, a.pos, kin.direction,
+                                                             i, j, d, hi - lo, offset=lo)
+      i, j, d = block_pairs(a.pos, rep_pairs, lo, hi, cfg.d_rep)
+      if perception is not None:
+        i, j, d = self._perceived(i, j, d)
+      a.rep[lo:hi], rep_hits = repulsion_forces(cfg.w_rep, a.pos, i, j, d, hi - lo, offset=lo)
+      hits += len(i)
+      if prof is not None:
+        t1 = clock()
+        prof.add_time("social", t1 - t0)
+
+      # --- one step of every dog per sheep ---
+      if len(a.dog_pos):
+        near = [None] * len(a.dog_pos)
+        extent = []
+        for m in range(hi - lo):
+          path[m] = a.dog_pos[0]
+          for k in range(len(a.dog_pos)):
+            if dog_near is None:
+              self.update_dog(k, dt)
+            else:
+              slack = min((hi - lo - m) * dog_step, dog_slack)  # at most the rest of its travel in the block
+              self._sequential_dog_step(k, dt, dog_near, reach, slack, near, extent)
+            if prof is not None and self.dog_modes[k] is not None:
+              prof.count(f"dog_{self.dog_modes[k]}")
+        path[hi - lo] = a.dog_pos[0]
+        a.dog_rep[lo:hi] = dog_repulsion_forces(cfg, a.pos[lo:hi], path[:hi - lo])
+      else:
+        a.dog_rep[lo:hi] = 0.0
+      if prof is not None:
+        t0 = clock()
+        prof.add_time("dog", t0 - t1)
+
+      # --- move the block ---
+      a.noise[lo:hi] = self.rng.random((hi - lo, 2))
+      substeps += self.integrate(dt, rep_hits, rows,
+                                 lambda fine: self._block_repulsion(fine, lo, hi, rep_pairs, path))
+      if prof is not None:
+        prof.add_time("move", clock() - t0)
+
+    self._dog_index_reach = 0.0
+    if prof is not None:
+      prof.count("repulsion_hits", hits)
+      prof.count("substeps", substeps)
+
+  def _block_repulsion(self, rows: np.ndarray, lo: int, hi: int, rep_pairs, path: np.ndarray) -> None:
+    """
+    Social and dog repulsion of the given rows of block lo..hi between their sub-steps, from the
+    block's candidate pairs; the dog stands where its step for the sheep left it.
+    """
+    cfg = self.cfg
+    a = self.arrays
+    i, j, d = block_pairs(a.pos, rep_pairs, lo, hi, cfg.d_rep)
+    fine = np.zeros(hi - lo, dtype=bool)
+    fine[rows - lo] = True
+    keep = fine[i - lo]
+    i, j, d = i[keep], j[keep], d[keep]
+    if self.sheep_perception is not None:
+      i, j, d = self._perceived(i, j, d)
+    rep, _ = repulsion_forces(cfg.w_rep, a.pos, i, j, d, hi - lo, offset=lo)
+    a.rep[rows] = rep[rows - lo]
+    if len(a.dog_pos):
+      a.dog_rep[rows] = dog_repulsion_forces(cfg, a.pos[rows], path[rows - lo + 1])
+
+  def _sequential_dog_step(self, k: int, dt: float, index: GridIndex, reach: float, slack: float,
+                           near: list, extent: list) -> None:
+    """
+    update_dog for dog k inside a block of the sequential tick, during which the sheep stand
+    still. The flock extent is computed once per block (`extent`). The nearest sheep is searched
+    among the sheep within d_rep + slack of where the dog was when `index` (built `reach`
+    earlier) was last queried, kept in near[k]; the query is repeated when the dog has moved
+    more than slack from there.
+    """
+    cfg = self.cfg
+    a = self.arrays
+    dog = a.dog_pos[k]
+    x, y = float(dog[0]), float(dog[1])
+    if near[k] is None or math.hypot(x - near[k][0], y - near[k][1]) > near[k][2]:
+      # a sheep within d_rep + slack now was within that + reach when the index was built
+      cand = index.query_radius((x, y), cfg.d_rep + slack + reach)
+      near[k] = (x, y, slack, a.pos[cand])
+    pts = near[k][3]
+    slow = False
+    if len(pts):
+      d = pts - dog
+      slow = math.sqrt(float(np.einsum("ij,ij->i", d, d).min())) < cfg.d_rep
+    if slow:
+      self._dog_slow_step(k, dt)
+      return
+    if not extent:
+      if self.kernels is not None:
+        _, avg_x, avg_y = self.kernels.flock_extent(a.pos, x, y)
+        far, far_d2 = self.kernels.farthest(a.pos, avg_x, avg_y)
+        extent.extend((avg_x, avg_y, float(a.pos[far, 0]) - avg_x, float(a.pos[far, 1]) - avg_y, far_d2))
+      else:
+        avg_x, avg_y = (float(c) for c in a.pos.mean(axis=0, dtype=np.float64))
+        r = a.pos - (avg_x, avg_y)
+        d2 = np.einsum("ij,ij->i", r, r)
+        far = int(np.argmax(d2))
+        extent.extend((avg_x, avg_y, float(r[far, 0]), float(r[far, 1]), d2[far]))
+    self._dog_target_step(k, dt, *extent)
+
+  # ---------- rules ----------
+
+  def update_social(self, rep_i: np.ndarray, rep_j: np.ndarray, rep_d: np.ndarray) -> np.ndarray:
+    """Sheep.update_social for every sheep; returns the repulsion hits per sheep."""
+    a = self.arrays
+    if self.sheep_perception is not None:
+      return self.update_social_perceived(rep_i, rep_j, rep_d)
+    a.att[:], a.ali[:] = social_forces(self.rng, self.cfg, a.pos, self.kinematics.direction, kernels=self.kernels)
+    return self.update_social_repulsion(rep_i, rep_j, rep_d)
+
+  def update_social_perceived(self, rep_i: np.ndarray, rep_j: np.ndarray, rep_d: np.ndarray) -> np.ndarray:
+    """update_social when every sheep only uses the neighbours it perceives (variable count per sheep)."""
+    a = self.arrays
+    for lo, hi, i, j, d in self.perceived_pairs():
+      a.att[lo:hi], a.ali[lo:hi] = perceived_social_forces(self.rng, self.cfg, a.pos, self.kinematics.direction,
+                                                           i, j, d, hi - lo, offset=lo)
+    # rep pairs are already limited to perceived neighbours
+    return self.update_social_repulsion(rep_i, rep_j, rep_d)
+
+  def perceived_pairs(self) -> Iterator[Tuple[int, int, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Ordered pairs (i, j) where sheep i perceives sheep j, and their distances, as blocks
+    (lo, hi, i, j, d) covering the sheep lo..hi-1. With a vision radius the pairs come from a
+    GridIndex in one block; with a view cone only, every pair is a candidate and the cone is
+    tested PERCEIVED_BLOCK_PAIRS candidates at a time, so memory stays bounded for large flocks.
+    """
+    a = self.arrays
+    perception = self.sheep_perception
+    n = len(a.pos)
+    if perception.radius is not None:
+      i, j, d = GridIndex(a.pos, perception.radius).pairs_within(perception.radius)
+      yield (0, n) + self._perceived(i, j, d)
+      return
+    rows = max(1, PERCEIVED_BLOCK_PAIRS // max(n, 1))
+    others = np.arange(n)
+    for lo in range(0, n, rows):
+      hi = min(lo + rows, n)
+      i = np.repeat(np.arange(lo, hi), n)
+      j = np.tile(others, hi - lo)
+      keep = i != j
+      i, j = i[keep], j[keep]
+      rel = a.pos[j] - a.pos[i]
+      d = np.sqrt(np.einsum("ij,ij->i", rel, rel))
+      yield (lo, hi) + self._perceived(i, j, d)
+
+  def repulsion_pairs(self, index: GridIndex | None = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pairs closer than d_rep, limited to the ones the first sheep of the pair perceives."""
+    if index is None:
+      index = GridIndex(self.arrays.pos, self.cfg.d_rep)
+    i, j, d = index.pairs_within(self.cfg.d_rep)
+    if self.sheep_perception is None:
+      return i, j, d
+    return self._perceived(i, j, d)
+
+  def _perceived(self, i: np.ndarray, j: np.ndarray, d: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    a = self.arrays
+    keep = self.sheep_perception.mask(self.kinematics.direction[i], a.pos[j] - a.pos[i], d)
+    return i[keep], j[keep], d[keep]
+
+  def update_social_repulsion(self, rep_i: np.ndarray, rep_j: np.ndarray, rep_d: np.ndarray) -> np.ndarray:
+    a = self.arrays
+    a.rep[:], hits = repulsion_forces(self.cfg.w_rep, a.pos, rep_i, rep_j, rep_d, len(a.pos))
+    return hits
+
+  def update_dog_repulsion(self) -> None:
+    """Sheep.update_repulsion against the first dog, as in the object engine."""
+    a = self.arrays
+    if len(a.dog_pos) == 0:
+      a.dog_rep[:] = 0.0
+      return
+    if self.kernels is not None:
+      dog = a.dog_pos[0]
+      self.kernels.dog_repulsion(a.pos, float(dog[0]), float(dog[1]), self.cfg.d_dog, self.cfg.w_dog, a.dog_rep)
+      return
+    a.dog_rep[:] = dog_repulsion_forces(self.cfg, a.pos, a.dog_pos[0])
+
+  def _decided(self, k: int, mode: str) -> None:
+    self.dog_modes[k] = mode
+    if self.dog_events is not None:
+      self.dog_events.decided(k, mode)
+
+  def update_dog(self, k: int, dt: float) -> None:
+    """Dog.update for dog k, against the current sheep state."""
+    cfg = self.cfg
+    a = self.arrays
+    if len(a.pos) == 0:
+      return
+    dog = a.dog_pos[k]
+
+    pos = a.pos
+    if self.dog_perception is not None:
+      # the dog only works with the sheep it sees
+      pos = pos[self.seen_by_dog(k)]
+      if len(pos) == 0:
+        return
+
+    kernels = self.kernels
+    if kernels is not None:
+      min_d2, avg_x, avg_y = kernels.flock_extent(pos, float(dog[0]), float(dog[1]))
+      min_dist = math.sqrt(min_d2)
+    else:
+      d = pos - dog
+      min_dist = math.sqrt(float(np.einsum("ij,ij->i", d, d).min()))
+    if min_dist < cfg.d_rep:
+      self._dog_slow_step(k, dt)
+      return
+
+    if kernels is not None:
+      far, far_d2 = kernels.farthest(pos, avg_x, avg_y)
+      far_x, far_y = float(pos[far, 0]) - avg_x, float(pos[far, 1]) - avg_y
+    else:
+      avg_x, avg_y = (float(c) for c in pos.mean(axis=0, dtype=np.float64))
+      r = pos - (avg_x, avg_y)
+      d2 = np.einsum("ij,ij->i", r, r)
+      far = int(np.argmax(d2))
+      far_d2 = d2[far]
+      far_x, far_y = float(r[far, 0]), float(r[far, 1])
+    self._dog_target_step(k, dt, avg_x, avg_y, far_x, far_y, far_d2)
+
+  def _dog_slow_step(self, k: int, dt: float) -> None:
+    """Dog.update with a sheep within d_rep: a slow step along the previous velocity."""
+    self._decided(k, "slow")
+    dog = self.arrays.dog_pos[k]
+    vel = self.arrays.dog_vel[k]
+    norm_v = math.hypot(float(vel[0]), float(vel[1]))
+    if norm_v > 0.0:
+      vel[:] = (SLOW_STEP * float(vel[0]) / norm_v, SLOW_STEP * float(vel[1]) / norm_v)
+      dog += vel * dt
+
+  def _dog_target_step(self, k: int, dt: float, avg_x: float, avg_y: float, far_x: float, far_y: float,
+                       far_d2: float) -> None:
+    """Dog.update collecting or driving, given the flock centre and the farthest sheep relative to it."""
+    cfg = self.cfg
+    dog = self.arrays.dog_pos[k]
+    vel = self.arrays.dog_vel[k]
+    max_dist = math.sqrt(float(far_d2))
+
+    if max_dist > cfg.f_n:
+      self._decided(k, "collect")
+      d_behind = max_dist + cfg.pc
+      target_x = avg_x + d_behind * far_x / max_dist
+      target_y = avg_y + d_behind * far_y / max_dist
+    else:
+      self._decided(k, "drive")
+      grp_norm = math.hypot(avg_x, avg_y)
+      if grp_norm == 0.0:
+        return
+      d_behind = grp_norm + cfg.pd
+      target_x = d_behind * (avg_x / grp_norm)
+      target_y = d_behind * (avg_y / grp_norm)
+
+    dir_x = target_x - float(dog[0])
+    dir_y = target_y - float(dog[1])
+    norm = math.hypot(dir_x, dir_y)
+    if norm == 0.0:
+      return
+    theta_err = self.rng.random() * 2.0 * math.pi
+    ux = dir_x / norm + cfg.e * math.cos(theta_err)
+    uy = dir_y / norm + cfg.e * math.sin(theta_err)
+    norm2 = math.hypot(ux, uy)
+    if norm2 == 0.0:
+      return
+    vel[:] = (ux / norm2 * cfg.v_dog, uy / norm2 * cfg.v_dog)
+    dog += vel * dt
+
+  def seen_by_dog(self, k: int) -> np.ndarray:
+    """Indices of the sheep dog k perceives (candidates from the per-tick dog index)."""
+    a = self.arrays
+    dog = a.dog_pos[k]
+    if self.dog_index is not None:
+      cand = np.sort(self.dog_index.query_radius(dog, self.dog_perception.radius + self._dog_index_reach))
+    else:
+      cand = np.arange(len(a.pos))
+    rel = a.pos[cand] - dog
+    dist = np.sqrt(np.einsum("ij,ij->i", rel, rel))
+    direction, _ = unit_vectors(a.dog_vel[k:k + 1])
+    keep = self.dog_perception.mask(np.repeat(direction, len(cand), axis=0), rel, dist)
+    return cand[keep]
+
+  def move(self, dt, rows: np.ndarray | None = None) -> None:
+    """Sheep.move for every sheep (or the given rows); dt may be a scalar or an (N, 1) array."""
+    a = self.arrays
+    kin = self.kinematics
+    if self.kernels is not None and np.isscalar(dt):
+      self.kernels.move(a.pos, a.vel, kin.direction, kin.speed, a.att, a.ali, a.rep, a.dog_rep, a.noise,
+                        np.arange(len(a.pos)) if rows is None else rows, ALPHA, EPSILON, SPEED_CONST, float(dt))
+      kin.changed()
+      return
+    sel = slice(None) if rows is None else rows
+    unit = steer(kin.direction[sel], a.att[sel], a.ali[sel], a.rep[sel], a.dog_rep[sel], a.noise[sel])
+    a.vel[sel] = unit * SPEED_CONST
+    kin.set_unit(sel, unit, SPEED_CONST)
+    a.pos[sel] += a.vel[sel] * dt
+
+  def integrate(self, dt: float, rep_hits: np.ndarray, rows: np.ndarray | None = None,
+                repulsion: Callable[[np.ndarray], None] | None = None) -> int:
+    """
+    Moves the sheep (or the given rows, rep_hits being theirs) with cfg.integrator (see
+    integrators.py); returns the number of sheep sub-steps. repulsion(fine_rows) re-evaluates
+    the repulsion of the sub-stepping rows between sub-steps (default: the whole flock's).
+    """
+    cfg = self.cfg
+    a = self.arrays
+    n = len(a.pos) if rows is None else len(rows)
+    if cfg.integrator == "euler" or n == 0:
+      self.move(dt, rows)
+      return n
+    k = max(1, cfg.substeps)
+    if cfg.integrator == "substep":
+      fine = np.ones(n, dtype=bool)
+    elif cfg.integrator == "multirate":
+      fine = (rep_hits > 0) | ((a.dog_rep if rows is None else a.dog_rep[rows]) != 0.0).any(axis=1)
+      if cfg.substep_budget is not None and k > 1:
+        # most crowded sheep first; a share of the tick's budget for a subset of the rows
+        allowed = cfg.substep_budget * n // (len(a.pos) * (k - 1))
+        if fine.sum() > allowed:
+          priority = np.where(fine, rep_hits + 1, 0)
+          keep = np.argsort(-priority, kind="stable")[:allowed]
+          fine = np.zeros(n, dtype=bool)
+          fine[keep] = True
+    else:
+      raise ValueError(f"Unknown integrator '{cfg.integrator}'")
+    if k == 1 or not fine.any():
+      self.move(dt, rows)
+      return n
+
+    h = dt / k
+    self.move(np.where(fine, h, dt)[:, None], rows)
+    fine_rows = np.nonzero(fine)[0] if rows is None else rows[fine]
+    for _ in range(k - 1):
+      # only the short-range repulsion is re-evaluated between sub-steps
+      if repulsion is None:
+        i, j, d = self.repulsion_pairs()
+        self.update_social_repulsion(i, j, d)
+        self.update_dog_repulsion()
+      else:
+        repulsion(fine_rows)
+      self.move(h, fine_rows)
+    return n + len(fine_rows) * (k - 1)
+
+  # ---------- metrics ----------
+
+  def fill_metrics(self, state: SimulationState) -> None:
+    a = self.arrays
+    pos = a.pos.astype(np.float64, copy=False)
+    b = pos.mean(axis=0)
+    v = a.vel.mean(axis=0, dtype=np.float64)
+    speed = math.hypot(v[0], v[1])
+    dir_x, dir_y = (v[0] / speed, v[1] / speed) if speed != 0.0 else (0.0, 0.0)
+    perp_x, perp_y = -dir_y, dir_x
+    r = pos - b
+    mean_dir = self.kinematics.direction.mean(axis=0, dtype=np.float64)
+    proj = r @ np.array([[dir_x, perp_x], [dir_y, perp_y]])
+    y_min, x_min = proj.min(axis=0)
+    y_max, x_max = proj.max(axis=0)
+    width = x_max - x_min
+
+    state.barycenter = (float(b[0]), float(b[1]))
+    state.velocity = (float(v[0]), float(v[1]))
+    state.direction = (float(dir_x), float(dir_y))
+    state.perp_direction = (float(perp_x), float(perp_y))
+    state.cohesion = float(np.sqrt(np.einsum("ij,ij->i", r, r)).mean())
+    state.polarization = float(math.hypot(mean_dir[0], mean_dir[1]))
+    state.elongation = float((y_max - y_min) / width) if width > 0.0 else 0.0
+    if len(a.dog_pos):
+      rd = a.dog_pos[0].astype(np.float64) - b
+      x_D = float(rd[0] * perp_x + rd[1] * perp_y)
+      y_D = float(rd[0] * dir_x + rd[1] * dir_y)
+      state.dog_offsets = (x_D, y_D)
+      state.dog_rear_distance = float(y_min) - y_D
+
+  def calculate_barycenter(self) -> Tuple[float, float]:
+    if not len(self.arrays.pos):
+      raise ValueError("Cannot calculate barycenter: no sheep in simulation")
+    b = self.arrays.pos.mean(axis=0, dtype=np.float64)
+    return (float(b[0]), float(b[1]))
+
+  def goal_reached(self, tolerance: float = 40.0) -> bool:
+    if self.cfg.goal_pos is None or not len(self.arrays.pos):
+      return False
+    bx, by = self.calculate_barycenter()
+    return math.hypot(bx - self.cfg.goal_pos[0], by - self.cfg.goal_pos[1]) < tolerance
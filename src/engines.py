@@ -0,0 +1,28 @@
+import importlib
+from typing import Dict, Tuple
+
+from simulation import SimulationConfig
+
+# Part of every run_cache key: bump it whenever a change alters the states an existing
+# (config, seed) produces, so cached results of the old code are not reused.
+ENGINE_VERSION = 1
+
+# SimulationConfig.engine -> (module, class); modules are imported on first use.
+ENGINES: Dict[str, Tuple[str, str]] = {
+  "object": ("simulation", "Simulation"),
+  "array": ("engine", "ArraySimulation"),
+  "parallel": ("parallel_engine", "ParallelSimulation"),
+  "threaded": ("parallel_engine", "ThreadedSimulation"),
+}
+
+
+def engine_class(name: str):
+  if name not in ENGINES:
+    raise ValueError(f"Unknown engine '{name}' (choose from {', '.join(ENGINES)})")
+  module, cls = ENGINES[name]
+  return getattr(importlib.import_module(module), cls)
+
+
+def make_simulation(cfg: SimulationConfig, collect_metrics=True, seed: int = 42, profiler=None):
+  """Builds the engine selected by cfg.engine; all engines share the Simulation.steps() protocol."""
+  return engine_class(cfg.engine)(cfg, collect_metrics=collect_metrics, seed=seed, profiler=profiler)
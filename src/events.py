@@ -0,0 +1,221 @@
+import json
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from simulation_state import SimulationState
+
+# Structured log of the rare behavioural transitions of a run, so that analysing them does not
+# need stored trajectories.
+#
+# Events are fixed-size records (EVENT_DTYPE, 17 bytes) written into a preallocated ring buffer
+# of `capacity` records. With a file, a full buffer is flushed to it in one write; without one,
+# the oldest records are overwritten (the log keeps the last `capacity` events).
+#
+# File layout: MAGIC, a little-endian uint32 header length, a JSON header (kinds, mode codes,
+# payload layout, record dtype, run meta), then the records back to back - read_events() maps them straight into
+# a structured array.
+#
+# Kinds and payloads (subject, other, value), also in PAYLOADS and the log header. `value` is a
+# measurement for every kind but mode_switch, whose `other` and `value` are both MODES codes:
+#   mode_switch   dog index, new strategy code (1 = collect, 2 = drive), previous strategy code
+#                 (0 = none; stored as a float in `value`)
+#   slow_steps    dog index, -1, number of consecutive slow-branch dog steps (Dog.update: a sheep
+#                 within d_rep); logged at the decision that leaves the slow branch
+#   goal_reached  -1, -1, distance of the barycenter to goal_pos; first tick within the tolerance
+#   breakaway     cluster id, main flock cluster id, cluster size (clusters.ClusterTracker)
+#   rejoin        cluster id, main flock cluster id, sheep that rejoined
+#   checkpoint    chunk index, ticks stored so far (trajectory_store.TrajectoryWriter chunk written)
+#
+# The dog events come from the decisions themselves, not from the state sampled once per tick:
+# the engines report every dog update to their `dog_events` hook (EventRecorder.decided), which
+# is many per tick (once per sheep in the object engine and the sequential array engine,
+# dog_substeps with synchronous ticks), so a collect -> drive -> collect within one tick is two
+# switches. Events are stamped with the tick of the state the decision started from.
+
+EVENT_DTYPE = np.dtype([("tick", "<u4"), ("kind", "u1"), ("subject", "<i4"), ("other", "<i4"), ("value", "<f4")])
+KINDS = ("mode_switch", "slow_steps", "goal_reached", "breakaway", "rejoin", "checkpoint")
+MODE_SWITCH, SLOW_STEPS, GOAL_REACHED, BREAKAWAY, REJOIN, CHECKPOINT = range(len(KINDS))
+MODES = (None, "collect", "drive", "slow")  # mode codes
+PAYLOADS = {  # kind -> meaning of (subject, other, value)
+  "mode_switch": ("dog", "new mode code", "previous mode code"),
+  "slow_steps": ("dog", "-", "slow steps"),
+  "goal_reached": ("-", "-", "barycenter distance to goal_pos"),
+  "breakaway": ("cluster", "main flock cluster", "cluster size"),
+  "rejoin": ("cluster", "main flock cluster", "sheep that rejoined"),
+  "checkpoint": ("chunk", "ticks stored", "-"),
+}
+
+MAGIC = b"SHEEPEV1"
+HEADER_LENGTH = np.dtype("<u4")
+
+
+class EventLog:
+  """Ring buffer of EVENT_DTYPE records, flushed in bulk to `path` (if given) when full and on close()."""
+
+  def __init__(self, path: str | None = None, capacity: int = 4096, meta: dict | None = None):
+    if capacity < 1:
+      raise ValueError("EventLog needs a capacity of at least one event")
+    self.path = path
+    self.meta = dict(meta or {})
+    self.buffer = np.zeros(capacity, dtype=EVENT_DTYPE)
+    self._start = 0
+    self.count = 0       # events in the buffer
+    self.total = 0       # events emitted
+    self.dropped = 0     # events overwritten (no file)
+    self.flushes = 0
+    self._file = None
+
+  @property
+  def capacity(self) -> int:
+    return len(self.buffer)
+
+  def emit(self, tick: int, kind: int, subject: int = -1, other: int = -1, value: float = 0.0) -> None:
+    if self.count == self.capacity:
+      if self.path is not None:
+        self.flush()
+      else:
+        self._start = (self._start + 1) % self.capacity
+        self.count -= 1
+        self.dropped += 1
+    self.buffer[(self._start + self.count) % self.capacity] = (tick, kind, subject, other, value)
+    self.count += 1
+    self.total += 1
+
+  def events(self) -> np.ndarray:
+    """Buffered events, oldest first."""
+    return np.roll(self.buffer, -self._start)[:self.count]
+
+  def _open(self) -> None:
+    self._file = open(self.path, "wb")
+    header = json.dumps({"kinds": KINDS, "modes": MODES, "payloads": PAYLOADS, "dtype": EVENT_DTYPE.descr,
+                         "meta": self.meta}).encode()
+    self._file.write(MAGIC + np.array(len(header), dtype=HEADER_LENGTH).tobytes() + header)
+
+  def flush(self) -> None:
+    if self.path is None or not self.count:
+      return
+    if self._file is None:
+      self._open()
+    self._file.write(self.events().tobytes())
+    self._start = self.count = 0
+    self.flushes += 1
+
+  def close(self) -> None:
+    if self.path is None:
+      return
+    if self._file is None:
+      self._open()  # a run without events still gets its header
+    self.flush()
+    self._file.close()
+    self._file = None
+
+
+def read_events(path: str) -> Tuple[dict, np.ndarray]:
+  """(header, records) of an event log file."""
+  with open(path, "rb") as f:
+    if f.read(len(MAGIC)) != MAGIC:
+      raise ValueError(f"{path} is not an event log")
+    length = int(np.frombuffer(f.read(HEADER_LENGTH.itemsize), dtype=HEADER_LENGTH)[0])
+    header = json.loads(f.read(length))
+    records = np.frombuffer(f.read(), dtype=EVENT_DTYPE)
+  return header, records
+
+
+def event_columns(records: np.ndarray) -> Dict[str, np.ndarray]:
+  return {name: records[name] for name in EVENT_DTYPE.names}
+
+
+class EventRecorder:
+  """
+  Emits the dog events of every decision reported to decided() and the goal event of the states
+  passed to observe() (see the top of this module). Set it as a simulation's `dog_events`.
+  """
+
+  def __init__(self, log: EventLog, goal_pos: Tuple[float, float] | None = None, tolerance: float = 40.0):
+    self.log = log
+    self.goal_pos = goal_pos
+    self.tolerance = tolerance
+    self.goal_reached = goal_pos is None
+    self._strategy: List[int] = []  # last collect / drive code of every dog
+    self._slow: List[int] = []      # steps of the current slow run of every dog
+    self._tick = 0
+
+  def observe(self, state: SimulationState) -> None:
+    self._tick = state.tick
+    if not self.goal_reached:
+      self._check_goal(state)
+
+  def decided(self, k: int, mode: str | None, steps: int = 1) -> None:
+    """Dog k took decision `mode` (Dog.mode) for `steps` dog steps."""
+    if k >= len(self._strategy):
+      grow = k + 1 - len(self._strategy)
+      self._strategy += [0] * grow
+      self._slow += [0] * grow
+    if mode == "slow":
+      self._slow[k] += steps
+      return
+    self._end_slow(k, self._tick)
+    if mode is not None and MODES.index(mode) != self._strategy[k]:
+      code = MODES.index(mode)
+      self.log.emit(self._tick, MODE_SWITCH, k, code, self._strategy[k])
+      self._strategy[k] = code
+
+  def _end_slow(self, k: int, tick: int) -> None:
+    if self._slow[k]:
+      self.log.emit(tick, SLOW_STEPS, k, -1, self._slow[k])
+      self._slow[k] = 0
+
+  def _check_goal(self, state: SimulationState) -> None:
+    center = state.barycenter
+    if center is None:
+      if state.arrays is not None:
+        pos = state.arrays.pos
+        if not len(pos):
+          return
+        center = pos.mean(axis=0, dtype=np.float64)
+      elif state.sheep:
+        center = (sum(s.x for s in state.sheep) / len(state.sheep), sum(s.y for s in state.sheep) / len(state.sheep))
+      else:
+        return
+    distance = math.hypot(center[0] - self.goal_pos[0], center[1] - self.goal_pos[1])
+    if distance < self.tolerance:
+      self.log.emit(state.tick, GOAL_REACHED, -1, -1, distance)
+      self.goal_reached = True
+
+  def finish(self) -> None:
+    """Closes the slow runs still open at the end of the run (logged at the tick after the last one)."""
+    for k in range(len(self._slow)):
+      self._end_slow(k, self._tick + 1)
+
+
+def summarize(records: np.ndarray) -> Dict[str, int]:
+  """Number of events of every kind."""
+  counts = np.bincount(records["kind"], minlength=len(KINDS))
+  return {kind: int(counts[k]) for k, kind in enumerate(KINDS)}
+
+
+def payload_legend(kinds) -> List[str]:
+  """One line per kind: what its subject / other / value columns hold (mode codes spelled out)."""
+  lines = []
+  for kind in kinds:
+    subject, other, value = PAYLOADS[kind]
+    lines.append(f"{kind}: subject = {subject}, other = {other}, value = {value}")
+    if kind == "mode_switch":
+      lines[-1] += f" (mode codes: 0 = none, {MODES.index('collect')} = collect, {MODES.index('drive')} = drive)"
+  return lines
+
+
+def describe(record) -> str:
+  kind = KINDS[record["kind"]]
+  subject, other, value = int(record["subject"]), int(record["other"]), float(record["value"])
+  if kind == "mode_switch":
+    return f"dog {subject}: {MODES[int(value)] or '-'} -> {MODES[other]}"
+  if kind == "slow_steps":
+    return f"dog {subject}: {int(value)} slow steps"
+  if kind == "goal_reached":
+    return f"barycenter {value:.3g} from goal_pos"
+  if kind in ("breakaway", "rejoin"):
+    return f"cluster {subject} ({int(value)} sheep), main flock {other}"
+  return f"chunk {subject} written, {other} ticks stored"
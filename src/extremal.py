@@ -0,0 +1,67 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from agents import Sheep
+
+# Below this many sheep a plain Python scan is faster than a NumPy call per dog update.
+VECTORIZE_MIN_SHEEP = 32
+
+
+class ExtremalQuery:
+  """
+  Answers the extremal queries of the dog controller and the metrics in vectorized passes
+  over a position array that mirrors the sheep:
+
+    - farthest_from(point)        farthest sheep from the group centre (collecting target)
+    - nearest_to(point)           closest sheep to a dog (slow-step branch)
+    - frame_extents(origin, ...)  min/max projections along the flock direction and its
+                                  perpendicular (elongation, rear-most sheep)
+
+  Simulation.update writes every sheep move with set(); results are memoised until the next
+  write, so the consumers asking the same question about the same flock state (e.g. the
+  elongation and rear-distance metrics) share one pass.
+  """
+
+  def __init__(self, sheep: List[Sheep]):
+    self.sync(sheep)
+
+  def sync(self, sheep: List[Sheep]) -> None:
+    self.pos = np.array([(s.x, s.y) for s in sheep], dtype=np.float64).reshape(-1, 2)
+    self._memo = {}
+
+  def set(self, i: int, x: float, y: float) -> None:
+    self.pos[i] = (x, y)
+    if self._memo:
+      self._memo = {}
+
+  def _dist2(self, px: float, py: float) -> np.ndarray:
+    d = self.pos - (px, py)
+    return np.einsum("ij,ij->i", d, d)
+
+  def farthest_from(self, px: float, py: float) -> Tuple[int, float]:
+    key = ("far", px, py)
+    if key not in self._memo:
+      d2 = self._dist2(px, py)
+      i = int(np.argmax(d2))
+      self._memo[key] = (i, float(np.sqrt(d2[i])))
+    return self._memo[key]
+
+  def nearest_to(self, px: float, py: float) -> Tuple[int, float]:
+    key = ("near", px, py)
+    if key not in self._memo:
+      d2 = self._dist2(px, py)
+      i = int(np.argmin(d2))
+      self._memo[key] = (i, float(np.sqrt(d2[i])))
+    return self._memo[key]
+
+  def frame_extents(self, ox: float, oy: float, dir_x: float, dir_y: float,
+                    perp_x: float, perp_y: float) -> Tuple[float, float, float, float]:
+    """(min, max) of the projections along (dir_x, dir_y) and along (perp_x, perp_y), relative to (ox, oy)."""
+    key = ("frame", ox, oy, dir_x, dir_y, perp_x, perp_y)
+    if key not in self._memo:
+      proj = (self.pos - (ox, oy)) @ np.array([[dir_x, perp_x], [dir_y, perp_y]])
+      lo = proj.min(axis=0)
+      hi = proj.max(axis=0)
+      self._memo[key] = (float(lo[0]), float(hi[0]), float(lo[1]), float(hi[1]))
+    return self._memo[key]
@@ -0,0 +1,65 @@
+import math
+from typing import List, Tuple
+
+from agents import Sheep
+
+
+class FlockStats:
+  """
+  Running sums of the sheep positions, velocities and direction vectors.
+
+  Simulation.update reports every sheep move through moved(), so the group centre,
+  mean velocity and polarization are O(1) lookups that stay exact between the moves
+  of a tick (Dog.update sees the partially moved flock, exactly as before). The sums
+  are recomputed from scratch every `resync_interval` ticks to bound round-off drift.
+  """
+
+  def __init__(self, sheep: List[Sheep], resync_interval: int = 64):
+    self.sheep = sheep
+    self.resync_interval = max(1, resync_interval)
+    self.ticks_since_resync = 0
+    self.resync()
+
+  def resync(self) -> None:
+    sheep = self.sheep
+    self.n = len(sheep)
+    self.sum_x = math.fsum(s.x for s in sheep)
+    self.sum_y = math.fsum(s.y for s in sheep)
+    self.sum_vx = math.fsum(s.vx for s in sheep)
+    self.sum_vy = math.fsum(s.vy for s in sheep)
+    dirs = [s.direction for s in sheep]
+    self.sum_dx = math.fsum(d[0] for d in dirs)
+    self.sum_dy = math.fsum(d[1] for d in dirs)
+    self.ticks_since_resync = 0
+
+  def moved(self, sheep: Sheep, old_x: float, old_y: float, old_vx: float, old_vy: float,
+            old_direction: Tuple[float, float]) -> None:
+    self.sum_x += sheep.x - old_x
+    self.sum_y += sheep.y - old_y
+    self.sum_vx += sheep.vx - old_vx
+    self.sum_vy += sheep.vy - old_vy
+    old_dx, old_dy = old_direction
+    new_dx, new_dy = sheep.direction
+    self.sum_dx += new_dx - old_dx
+    self.sum_dy += new_dy - old_dy
+
+  def end_tick(self) -> None:
+    self.ticks_since_resync += 1
+    if self.ticks_since_resync >= self.resync_interval or self.n != len(self.sheep):
+      self.resync()
+
+  @property
+  def centroid(self) -> Tuple[float, float]:
+    return (self.sum_x / self.n, self.sum_y / self.n)
+
+  @property
+  def mean_velocity(self) -> Tuple[float, float]:
+    return (self.sum_vx / self.n, self.sum_vy / self.n)
+
+  @property
+  def mean_direction(self) -> Tuple[float, float]:
+    return (self.sum_dx / self.n, self.sum_dy / self.n)
+
+  @property
+  def polarization(self) -> float:
+    return math.hypot(self.sum_dx / self.n, self.sum_dy / self.n)
@@ -0,0 +1,239 @@
+import dataclasses
+import json
+import math
+import os
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from config_io import config_from_dict
+from engines import ENGINE_VERSION, make_simulation
+from stream import state_positions
+
+# Golden-trajectory harness: checks that a fast engine (or a change to one) still implements the
+# model of agents.py.
+#
+# `golden record` runs the reference engines on a few fixed cases and stores them compactly in
+# golden/<case>.npz:
+#   - one exact run per reference engine ("object" = agents.py, "array-sequential" = engine.py in
+#     the object engine's order, "array" = engine.py with its default synchronous ticks, the model
+#     of the strip engines; NumPy kernels in float64): sheep and dog positions every `stride`
+#     ticks, in float64;
+#   - per-tick dog decisions (collect / drive / slow) of the reference run;
+#   - for every reference engine, the cohesion / polarization / elongation of `seeds` runs, each
+#     averaged over its ticks after burn-in (one sample per seed: windows of the same run are
+#     correlated, and treating them as independent made the KS test fail equal distributions).
+# `golden check` runs engine variants (VARIANTS) on the same cases:
+#   exact         when the variant draws the same random numbers as a reference engine (its
+#                 `exact` family): positions must stay within `atol` of the golden run, over the
+#                 first `exact_ticks` ticks (rounding differences grow chaotically, so compiled
+#                 kernels are only held to the start of the run)
+#   distribution  always: two-sample Kolmogorov-Smirnov test of the run means of every metric
+#                 against the golden ones of the variant's `model` reference, failing below `alpha`
+# Each row of the report also has the variant's ms/tick and its speedup over the object engine,
+# timed in the same session on the exact-run seed.
+#
+# The cases cover every branch of Dog.update: figure 6 (collect, drive and slow steps), two dogs,
+# and a dense flock in which the dog is mostly within d_rep of a sheep (slow steps).
+
+GOLDEN_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "golden"))
+METRICS = ("cohesion", "polarization", "elongation")
+MODES = ("collect", "drive", "slow")
+REFERENCES = ("object", "array-sequential", "array")
+
+
+@dataclasses.dataclass
+class GoldenCase:
+  name: str
+  config: dict           # overrides of the figure 6 parameters
+  steps: int = 400
+  seed: int = 10         # seed of the exact runs; distribution runs use seed, seed + 1, ...
+  seeds: int = 48
+  stride: int = 10       # exact runs store every stride-th tick
+  burn_in: int = 50
+
+
+CASES: Dict[str, GoldenCase] = {c.name: c for c in (
+  GoldenCase("figure6", {}),
+  GoldenCase("two_dogs", {"num_shepherds": 2}),
+  GoldenCase("dense", {"num_sheep": 60, "field_size": (80, 80), "goal_pos": (20, 20)}),
+)}
+
+
+@dataclasses.dataclass
+class Variant:
+  config: dict             # config fields selecting the engine / backend
+  model: str = "object"    # reference whose distributions the variant must match
+  exact: str | None = None # reference with the same random number usage, if any
+  atol: float = 0.0
+  exact_ticks: int | None = None  # None = the whole run
+
+
+VARIANTS: Dict[str, Variant] = {
+  "object": Variant({"engine": "object"}, exact="object"),
+  "array-sequential": Variant({"engine": "array", "ordering": "sequential"}, exact="array-sequential"),
+  "array-sequential-numba": Variant({"engine": "array", "ordering": "sequential", "kernels": "numba"},
+                                    exact="array-sequential", atol=1e-6, exact_ticks=50),
+  "array": Variant({"engine": "array"}, model="array", exact="array"),
+  "array-float32": Variant({"engine": "array", "precision": "float32"}, model="array"),
+  "array-numba": Variant({"engine": "array", "kernels": "numba"}, model="array", exact="array", atol=1e-6,
+                         exact_ticks=50),
+  "threaded": Variant({"engine": "threaded", "workers": 2}, model="array"),
+  "parallel": Variant({"engine": "parallel", "workers": 2}, model="array"),
+}
+
+
+def ks_2samp(a: np.ndarray, b: np.ndarray) -> Tuple[float, float]:
+  """Two-sample Kolmogorov-Smirnov statistic and asymptotic p-value (Numerical Recipes ksone/kstwo)."""
+  a, b = np.sort(a), np.sort(b)
+  n, m = len(a), len(b)
+  both = np.concatenate([a, b])
+  d = float(np.abs(np.searchsorted(a, both, side="right") / n - np.searchsorted(b, both, side="right") / m).max())
+  en = math.sqrt(n * m / (n + m))
+  x = (en + 0.12 + 0.11 / en) * d
+  if x < 0.2:
+    return d, 1.0
+  k = np.arange(1, 101)
+  p = float(2.0 * np.sum((-1.0) ** (k - 1) * np.exp(-2.0 * k * k * x * x)))
+  return d, min(max(p, 0.0), 1.0)
+
+
+def case_config(case: GoldenCase, engine: dict):
+  return config_from_dict({**case.config, **engine})
+
+
+def exact_run(cfg, case: GoldenCase) -> Dict[str, np.ndarray]:
+  """Positions every case.stride ticks, per-tick dog modes, and the ms/tick of one seed."""
+  sim = make_simulation(cfg, collect_metrics=True, seed=case.seed)
+  sheep, dogs, modes = [], [], []
+  start = time.perf_counter()
+  for state in sim.steps(case.steps):
+    if state.tick % case.stride == 0 or state.tick == case.steps - 1:
+      s, d = state_positions(state)
+      sheep.append(np.array(s, dtype=np.float64))
+      dogs.append(np.array(d, dtype=np.float64))
+    modes.append([MODES.index(d.mode) + 1 if d.mode in MODES else 0 for d in state.dogs])
+  elapsed = time.perf_counter() - start
+  if hasattr(sim, "close"):
+    sim.close()
+  return {"sheep": np.stack(sheep), "dogs": np.stack(dogs), "modes": np.array(modes, dtype=np.int8),
+          "ms_per_tick": 1000.0 * elapsed / case.steps}
+
+
+def run_means(cfg, case: GoldenCase) -> Dict[str, np.ndarray]:
+  """Metric means over the ticks after burn-in, one per seed of case.seeds."""
+  out = {name: [] for name in METRICS}
+  for seed in range(case.seed, case.seed + case.seeds):
+    sim = make_simulation(cfg, collect_metrics=True, seed=seed)
+    values = {name: [] for name in METRICS}
+    for state in sim.steps(case.steps):
+      if state.tick >= case.burn_in:
+        for name in METRICS:
+          values[name].append(getattr(state, name))
+    if hasattr(sim, "close"):
+      sim.close()
+    for name in METRICS:
+      out[name].append(np.mean(values[name]))
+  return {name: np.asarray(v) for name, v in out.items()}
+
+
+def mode_fractions(modes: np.ndarray) -> Dict[str, float]:
+  return {mode: float((modes == k + 1).mean()) for k, mode in enumerate(MODES)}
+
+
+# ---------- record ----------
+
+def record_case(case: GoldenCase, directory: str = GOLDEN_DIR) -> str:
+  arrays = {}
+  for ref in REFERENCES:
+    cfg = case_config(case, VARIANTS[ref].config)
+    run = exact_run(cfg, case)
+    arrays[f"{ref}_sheep"] = run["sheep"]
+    arrays[f"{ref}_dogs"] = run["dogs"]
+    arrays[f"{ref}_modes"] = run["modes"]
+    for name, values in run_means(cfg, case).items():
+      arrays[f"{ref}_{name}"] = values
+  missing = [m for m, f in mode_fractions(arrays["object_modes"]).items() if f == 0.0]
+  meta = {"case": dataclasses.asdict(case), "engine_version": ENGINE_VERSION, "missing_modes": missing}
+  os.makedirs(directory, exist_ok=True)
+  path = os.path.join(directory, f"{case.name}.npz")
+  np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+  return path
+
+
+def load_golden(name: str, directory: str = GOLDEN_DIR) -> Tuple[GoldenCase, dict, Dict[str, np.ndarray]]:
+  with np.load(os.path.join(directory, f"{name}.npz")) as data:
+    arrays = {k: data[k] for k in data.files}
+  meta = json.loads(str(arrays.pop("meta")))
+  case = meta["case"]
+  case["config"] = {k: tuple(v) if isinstance(v, list) else v for k, v in case["config"].items()}
+  return GoldenCase(**case), meta, arrays
+
+
+# ---------- check ----------
+
+CHECK_COLUMNS = (
+  "case", "variant", "exact", "max_deviation", "diverged_at",
+  "ks_cohesion", "ks_polarization", "ks_elongation", "distribution",
+  "collect", "drive", "slow", "ms_per_tick", "speedup", "passed",
+)
+
+
+def check_variant(name: str, case: GoldenCase, golden: Dict[str, np.ndarray], reference_ms: float,
+                  alpha: float = 0.01) -> dict:
+  variant = VARIANTS[name]
+  cfg = case_config(case, variant.config)
+  run = exact_run(cfg, case)
+  row = {"case": case.name, "variant": name}
+  passed = True
+
+  if variant.exact is not None:
+    ticks = np.minimum(np.arange(len(run["sheep"])) * case.stride, case.steps - 1)
+    keep = ticks < (variant.exact_ticks or case.steps)
+    dev = np.maximum(np.abs(run["sheep"] - golden[f"{variant.exact}_sheep"]).max(axis=(1, 2)),
+                     np.abs(run["dogs"] - golden[f"{variant.exact}_dogs"]).max(axis=(1, 2)))
+    bad = np.flatnonzero(dev > variant.atol)
+    exact_ok = not (bad < keep.sum()).any()
+    row.update(exact="pass" if exact_ok else "FAIL", max_deviation=float(dev[keep].max()),
+               diverged_at=int(ticks[bad[0]]) if len(bad) else -1)
+    passed &= exact_ok
+  else:
+    row.update(exact="-", max_deviation=math.nan, diverged_at=-1)
+
+  means = run_means(cfg, case)
+  dist_ok = True
+  for metric in METRICS:
+    _, p = ks_2samp(means[metric], golden[f"{variant.model}_{metric}"])
+    row[f"ks_{metric}"] = p
+    dist_ok &= p >= alpha
+  row["distribution"] = "pass" if dist_ok else "FAIL"
+  passed &= dist_ok
+
+  row.update(mode_fractions(run["modes"]))
+  row["ms_per_tick"] = run["ms_per_tick"]
+  row["speedup"] = reference_ms / run["ms_per_tick"]
+  row["passed"] = passed
+  return row
+
+
+def check(variants: Sequence[str], cases: Sequence[str] | None = None, directory: str = GOLDEN_DIR,
+          alpha: float = 0.01, log=print) -> List[dict]:
+  """One CHECK_COLUMNS row per (case, variant)."""
+  unknown = set(variants) - set(VARIANTS)
+  if unknown:
+    raise ValueError(f"Unknown variants: {', '.join(sorted(unknown))} (choose from {', '.join(VARIANTS)})")
+  rows = []
+  for name in cases or CASES:
+    case, meta, golden = load_golden(name, directory)
+    if meta["engine_version"] != ENGINE_VERSION:
+      log(f"{name}: recorded with engine version {meta['engine_version']}, now {ENGINE_VERSION}; "
+          f"exact checks are expected to fail until `golden record`")
+    reference_ms = exact_run(case_config(case, VARIANTS["object"].config), case)["ms_per_tick"]
+    for variant in variants:
+      row = check_variant(variant, case, golden, reference_ms, alpha)
+      log(f"{case.name:<9} {variant:<22} exact {row['exact']:<4} (max dev {row['max_deviation']:.2g})  "
+          f"distribution {row['distribution']:<4} (KS p {min(row[f'ks_{m}'] for m in METRICS):.3f})  "
+          f"{row['ms_per_tick']:7.3f} ms/tick  {row['speedup']:5.2f}x")
+      rows.append(row)
+  return rows
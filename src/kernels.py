@@ -0,0 +1,166 @@
+import importlib.util
+import math
+import warnings
+from types import SimpleNamespace
+
+import numpy as np
+
+# Optional compiled kernels for the array engine (SimulationConfig.kernels = "numba").
+#
+# The branchy per-sheep / per-dog rules of agents.py are written here as explicit loops and
+# compiled with Numba (parallel over sheep, GIL released), instead of being expressed as
+# whole-array NumPy passes with masks:
+#   attraction_alignment  Sheep.update_social (attraction + alignment) of a set of rows, given the
+#                         sampled indices
+#   dog_repulsion         Sheep.update_repulsion, the zero-distance / out-of-range cases inline
+#   move                  Sheep.move of a set of rows, fused with the velocity / direction / speed
+#                         update
+#   flock_extent          Dog.update: nearest sheep (slow-step rule) and barycenter in one pass
+#   farthest              Dog.update: farthest sheep from the barycenter (collect vs drive)
+# Random numbers are still drawn by the engine with NumPy, in the same order, so both backends
+# follow the same rules; sums are accumulated in a different order, so trajectories agree to
+# rounding, not bit for bit.
+#
+# numba is imported on first use only, and kernels are compiled with cache=True: the machine
+# code is stored in __pycache__ next to this file (or under $NUMBA_CACHE_DIR), so later processes
+# - sweep and study workers included - load it instead of compiling again. Without numba the
+# engine keeps the NumPy path.
+
+BACKENDS = ("numpy", "numba")
+
+prange = range  # numba.prange once numba is loaded; resolved when the kernels are compiled
+
+_kernels: SimpleNamespace | None = None
+
+
+def numba_available() -> bool:
+  return importlib.util.find_spec("numba") is not None
+
+
+def _attraction_alignment(pos, dirs, rows, idx, n_ali, w_att, w_ali, att, ali):
+  """Row r of idx / att / ali belongs to sheep rows[r]."""
+  n, k = idx.shape
+  for r in prange(n):
+    i = rows[r]
+    sx = 0.0
+    sy = 0.0
+    for m in range(k):
+      j = idx[r, m]
+      dx = pos[j, 0] - pos[i, 0]
+      dy = pos[j, 1] - pos[i, 1]
+      d = math.sqrt(dx * dx + dy * dy)
+      if d > 0.0:
+        sx += dx / d
+        sy += dy / d
+    att[r, 0] = w_att * sx / k
+    att[r, 1] = w_att * sy / k
+    ax = 0.0
+    ay = 0.0
+    for m in range(n_ali):
+      ax += dirs[idx[r, m], 0]
+      ay += dirs[idx[r, m], 1]
+    ali[r, 0] = w_ali * ax / n_ali
+    ali[r, 1] = w_ali * ay / n_ali
+
+
+def _dog_repulsion(pos, dog_x, dog_y, d_dog, w_dog, out):
+  for r in prange(len(pos)):
+    dx = pos[r, 0] - dog_x
+    dy = pos[r, 1] - dog_y
+    d = math.sqrt(dx * dx + dy * dy)
+    if 0.0 < d < d_dog:
+      out[r, 0] = w_dog * dx / d
+      out[r, 1] = w_dog * dy / d
+    else:
+      out[r, 0] = 0.0
+      out[r, 1] = 0.0
+
+
+def _move(pos, vel, direction, speed, att, ali, rep, dog_rep, noise, rows, alpha, epsilon, speed_const, dt):
+  for r in prange(len(rows)):
+    i = rows[r]
+    ux = (alpha * direction[i, 0] + att[i, 0] + ali[i, 0] + rep[i, 0] + dog_rep[i, 0]
+          + epsilon * (noise[i, 0] - 0.5) * 2.0)
+    uy = (alpha * direction[i, 1] + att[i, 1] + ali[i, 1] + rep[i, 1] + dog_rep[i, 1]
+          + epsilon * (noise[i, 1] - 0.5) * 2.0)
+    norm = math.sqrt(ux * ux + uy * uy)
+    if norm > 0.0:
+      ux /= norm
+      uy /= norm
+      speed[i] = speed_const
+    else:
+      ux = 0.0
+      uy = 0.0
+      speed[i] = 0.0
+    direction[i, 0] = ux
+    direction[i, 1] = uy
+    vel[i, 0] = ux * speed_const
+    vel[i, 1] = uy * speed_const
+    pos[i, 0] += vel[i, 0] * dt
+    pos[i, 1] += vel[i, 1] * dt
+
+
+def _flock_extent(pos, dog_x, dog_y):
+  """(squared distance of the nearest sheep to the dog, barycenter x, y)."""
+  min_d2 = np.inf
+  sx = 0.0
+  sy = 0.0
+  for r in prange(len(pos)):
+    dx = pos[r, 0] - dog_x
+    dy = pos[r, 1] - dog_y
+    min_d2 = min(min_d2, dx * dx + dy * dy)
+    sx += pos[r, 0]
+    sy += pos[r, 1]
+  return min_d2, sx / len(pos), sy / len(pos)
+
+
+def _farthest(pos, cx, cy):
+  """(index, squared distance) of the sheep farthest from (cx, cy); the first one on ties."""
+  n = len(pos)
+  blocks = min(n, 256)
+  best = np.full(blocks, -1.0)
+  where = np.zeros(blocks, dtype=np.int64)
+  for b in prange(blocks):
+    for r in range(b * n // blocks, (b + 1) * n // blocks):
+      dx = pos[r, 0] - cx
+      dy = pos[r, 1] - cy
+      d2 = dx * dx + dy * dy
+      if d2 > best[b]:
+        best[b] = d2
+        where[b] = r
+  k = 0
+  for b in range(1, blocks):
+    if best[b] > best[k]:
+      k = b
+  return where[k], best[k]
+
+
+def load_kernels() -> SimpleNamespace | None:
+  """The compiled kernels (compiled lazily per dtype, cached on disk), or None without numba."""
+  global _kernels, prange
+  if _kernels is None:
+    if not numba_available():
+      return None
+    import numba
+    prange = numba.prange
+    parallel = numba.njit(cache=True, parallel=True, nogil=True)
+    _kernels = SimpleNamespace(
+      attraction_alignment=parallel(_attraction_alignment),
+      dog_repulsion=parallel(_dog_repulsion),
+      move=parallel(_move),
+      flock_extent=parallel(_flock_extent),
+      farthest=parallel(_farthest),
+    )
+  return _kernels
+
+
+def select_kernels(backend: str) -> SimpleNamespace | None:
+  """Kernels for SimulationConfig.kernels; None = the NumPy path (also when numba is missing)."""
+  if backend not in BACKENDS:
+    raise ValueError(f"Unknown kernels '{backend}' (choose from {', '.join(BACKENDS)})")
+  if backend == "numpy":
+    return None
+  kernels = load_kernels()
+  if kernels is None:
+    warnings.warn("numba is not installed, the array engine uses its NumPy kernels", RuntimeWarning)
+  return kernels
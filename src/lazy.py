@@ -0,0 +1,30 @@
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+  """Module proxy that imports the real module on first attribute access."""
+
+  def __init__(self, name: str):
+    super().__init__(name)
+    self._lazy_target = None
+
+  def _load(self) -> types.ModuleType:
+    if self._lazy_target is None:
+      self._lazy_target = importlib.import_module(self.__name__)
+    return self._lazy_target
+
+  def __getattr__(self, attr):
+    return getattr(self._load(), attr)
+
+  def __dir__(self):
+    return dir(self._load())
+
+
+def lazy_import(name: str) -> LazyModule:
+  """
+  `np = lazy_import("numpy")` behaves like `import numpy as np`, but numpy is only
+  imported when `np.<something>` is first used. Keeps rendering/plotting backends
+  out of the start-up path of simulation-only processes.
+  """
+  return LazyModule(name)
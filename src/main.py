@@ -1,74 +1,596 @@
+import argparse
+import csv
+import os
+import sys
 import time
 
-import numpy as np
-from matplotlib import pyplot as plt
+from config_io import RunOptions, load_config, load_sweep, config_to_dict, default_config
 
-from simulation import Simulation, SimulationConfig
-from src.plotter import plot_all_metrics
-from src.simulation_state import SimulationState
-from visulizer import SimulationVisualizer, SimulationRecorder
+# Heavy modules (numpy, matplotlib, pygame, PIL) are only imported by the commands that need them,
+# so headless batch runs start fast and do not need a display stack.
 
 
-def main():
-  WORLD_WIDTH = 100
-  WORLD_HEIGHT = 100
+def load_run(args):
+  if args.config:
+    cfg, opts = load_config(args.config)
+  else:
+    cfg, opts = default_config(), RunOptions()
+  if getattr(args, "steps", None) is not None:
+    opts.steps = args.steps
+  if getattr(args, "seed", None) is not None:
+    opts.seed = args.seed
+  if getattr(args, "dt", None) is not None:
+    opts.dt = args.dt
+  return cfg, opts
 
-  # For figure 6
-  cfg = SimulationConfig(
-    field_size=(250, 250),
 
-    num_sheep=14,
-    num_shepherds=1,
+def default_out_dir(args) -> str:
+  if args.out:
+    return args.out
+  name = os.path.splitext(os.path.basename(args.config))[0] if args.config else "figure6"
+  return os.path.join("results", name)
 
-    neighbors_num=10,  # K_atr
 
-    # social attraction / alignment
-    w_att=1.5,  # c
-    n_att=4,  # k_atr
-    w_ali=1.3,  # alg_str
-    n_ali=1,  # k_alg
+def cmd_run(args) -> int:
+  import runner
+  import sinks as sink_mod
 
-    # social repulsion
-    w_rep=2.0,  # rho_a
-    d_rep=2.0,  # rad_rep_s
+  cfg, opts = load_run(args)
+  out_dir = default_out_dir(args)
+  os.makedirs(out_dir, exist_ok=True)
 
-    # dog repulsion
-    inertia_dog=0.5,  # h
-    w_dog=1.0,  # rho_d
-    d_dog=12.0,  # rad_rep_dog
+  if args.cache:
+    if args.metrics_csv or args.metrics_columnar or args.gif or args.plot or args.clusters or args.events or args.serve is not None:
+      print("--cache covers the summary and --trajectory only; running without the cache", file=sys.stderr)
+    else:
+      return run_cached(args, cfg, opts, out_dir)
 
-    goal_pos=(50, 50),
+  sinks = []
+  meta = {"config": config_to_dict(cfg), "seed": opts.seed, "dt": opts.dt, "steps": opts.steps}
+  event_sink = None
+  if args.events:
+    event_sink = sink_mod.EventSink(os.path.join(out_dir, "events.bin"), cfg.goal_pos, args.goal_tolerance,
+                                    capacity=args.events_capacity, meta=meta)
+  log = event_sink.log if event_sink is not None else None
+  if args.trajectory:
+    sinks.append(sink_mod.TrajectorySink(os.path.join(out_dir, "trajectory"), meta=meta, dtype=cfg.precision, log=log))
+  if args.metrics_csv:
+    sinks.append(sink_mod.MetricsCsvSink(os.path.join(out_dir, "metrics.csv")))
+  if args.metrics_columnar or args.plot:
+    sinks.append(sink_mod.MetricsColumnarSink(os.path.join(out_dir, "metrics.npz")))
+  if args.gif:
+    sinks.append(sink_mod.GifSink(os.path.join(out_dir, "run.gif"), cfg.field_size, fps=args.fps))
+  if args.clusters:
+    from clusters import LINK_D_REP
+    link_radius = args.cluster_link if args.cluster_link is not None else LINK_D_REP * cfg.d_rep
+    sinks.append(sink_mod.ClusterSink(os.path.join(out_dir, "clusters.npz"), os.path.join(out_dir, "cluster_events.csv"),
+                                      link_radius, args.cluster_persistence, log=log))
+  if args.serve is not None:
+    stream = sink_mod.StreamSink(args.serve_host, args.serve, max_fps=args.serve_fps)
+    host, port = stream.server.address
+    print(f"Streaming on {host}:{port} (watch with: main.py watch {host}:{port})")
+    if args.serve_wait:
+      print("Waiting for a client...")
+      stream.server.wait_for_client()
+    sinks.append(stream)
+  if event_sink is not None:
+    sinks.append(event_sink)  # last: closed after the sinks that add events
 
-    # global dog-logic parameters
-    v_dog=1.5,  # v_dog
-    e=0.3,  # noise strength e
+  summary = runner.run(cfg, opts, sinks)
+  print(" ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in summary.items()))
 
-    # flock cohesion threshold and collecting / driving offsets
-    f_n=2.0 * (14 ** (2 / 3)),  # rad_rep_s * no_shp^(2/3)
-    pc=2.0,  # collecting offset (pc = rad_rep_s)
-    pd=2.0 * (14 ** 0.5),  # pd = rad_rep_s * sqrt(no_shp)
-  )
+  if args.plot:
+    plot_metrics(os.path.join(out_dir, "metrics.npz"), out_dir, prefix="")
+  return 0
 
-  sim = Simulation(cfg, seed=10)
-  #sim_steps = sim.steps(steps=310)
-  #print(list(sim_steps()))
 
-  plot_all_metrics(list(sim_steps)[1:])
+def run_cached(args, cfg, opts, out_dir: str) -> int:
+  import shutil
+  from run_cache import RunCache, cached_run
 
+  start = time.perf_counter()
+  summary, trajectory_dir = cached_run(cfg, opts, RunCache(args.cache_dir), trajectory=args.trajectory)
+  if args.trajectory:
+    target = os.path.join(out_dir, "trajectory")
+    shutil.rmtree(target, ignore_errors=True)
+    shutil.copytree(trajectory_dir, target)
+  print(" ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in summary.items()))
+  print(f"({time.perf_counter() - start:.3f} s with the run cache)")
+  return 0
 
-  # CTRL + LMB to set goal pos
-  #player = SimulationVisualizer(sim)
-  #player.run(sim_steps)
 
-  #recorder = SimulationRecorder(WORLD_WIDTH, WORLD_HEIGHT)
-  #recorder.record(sim_steps, "test.gif")
+def cmd_sweep(args) -> int:
+  import runner
 
-  #print(sim.steps())
+  cfg, opts = load_run(args)
+  sweep = load_sweep(args.config)
+  if not sweep:
+    print(f"{args.config} has no [sweep] table", file=sys.stderr)
+    return 2
+  points = runner.sweep_points(cfg, opts, sweep)
+  print(f"Running {len(points)} sweep points on {args.workers} workers...")
+
+  run_point = runner.run_sweep_point
+  if args.cache:
+    if args.cache_dir:
+      # the workers find the cache through the environment
+      os.environ["SHEEP_RUN_CACHE"] = args.cache_dir
+    run_point = runner.run_sweep_point_cached
+  if args.workers > 1:
+    from multiprocessing import Pool
+    with Pool(args.workers) as pool:
+      rows = list(pool.imap(run_point, points))
+  else:
+    rows = [run_point(p) for p in points]
+
+  out_dir = default_out_dir(args)
+  os.makedirs(out_dir, exist_ok=True)
+  path = os.path.join(out_dir, "sweep.csv")
+  with open(path, "w", newline="") as f:
+    writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+  print(f"Saved sweep summary to {path}")
+  return 0
+
+
+def cmd_record(args) -> int:
+  import runner
+  from sinks import GifSink
+
+  cfg, opts = load_run(args)
+  opts.collect_metrics = False
+  runner.run(cfg, opts, [GifSink(args.output, cfg.field_size, fps=args.fps)])
+  return 0
+
+
+def cmd_watch(args) -> int:
+  from stream import StreamClient
+  from visulizer import SimulationVisualizer
+
+  host, _, port = args.address.rpartition(":")
+  client = StreamClient(host or "127.0.0.1", int(port), max_fps=args.fps)
+  SimulationVisualizer().run_stream(client)
+  return 0
+
+
+def plot_metrics(metrics_path: str, out_dir: str, prefix: str = "") -> None:
+  from plotter import plot_all_metrics
+  from sinks import read_metrics, metric_states
+
+  # the first state is the random initial placement, as in the old main.py
+  states = metric_states(read_metrics(metrics_path))[1:]
+  plot_all_metrics(states, results_dir=out_dir, prefix=prefix)
+  print(f"Saved plots to {out_dir}")
+
+
+def cmd_plot(args) -> int:
+  out_dir = args.out or os.path.dirname(os.path.abspath(args.metrics))
+  plot_metrics(args.metrics, out_dir, prefix=args.prefix)
+  return 0
+
+
+def cmd_analyze(args) -> int:
+  import numpy as np
+  import analysis
+
+  if args.list:
+    for name in sorted(analysis.METRICS):
+      print(name)
+    return 0
+  if not args.run_dir:
+    print("analyze needs a trajectory directory", file=sys.stderr)
+    return 2
+  names = args.metrics.split(",") if args.metrics else None
+  if args.clear_cache:
+    analysis.clear_cache(args.run_dir, names)
+  columns = analysis.compute(args.run_dir, names, start=args.start, stop=args.stop, workers=args.workers)
+  if not columns:
+    print("No ticks in the selected range", file=sys.stderr)
+    return 2
+  out = args.out or os.path.join(os.path.dirname(os.path.abspath(args.run_dir)), "analysis.npz")
+  np.savez(out, **columns)
+  if args.cluster_events:
+    import collections
+    from clusters import track_run, write_events
+    events = [e for _, _, tick_events in track_run(args.run_dir, args.cluster_link, args.cluster_persistence,
+                                                   args.start, args.stop) for e in tick_events]
+    events_path = os.path.join(os.path.dirname(out), "cluster_events.csv")
+    write_events(events_path, events)
+    counts = collections.Counter(e.kind for e in events)
+    print(f"Cluster events: {', '.join(f'{k}={v}' for k, v in sorted(counts.items())) or 'none'} ({events_path})")
+  for name, values in columns.items():
+    if name not in ("tick", "time") and values.ndim == 1:
+      print(f"{name:<28}mean={np.nanmean(values):.4g}")
+  print(f"Saved {len(columns['tick'])} ticks of {len(columns) - 2} columns to {out}")
+  return 0
+
+
+def cmd_events(args) -> int:
+  import numpy as np
+  import events
+
+  header, records = events.read_events(args.log)
+  if args.kinds:
+    kinds = args.kinds.split(",")
+    unknown = set(kinds) - set(events.KINDS)
+    if unknown:
+      print(f"Unknown event kinds: {', '.join(sorted(unknown))} (choose from {', '.join(events.KINDS)})", file=sys.stderr)
+      return 2
+    records = records[np.isin(records["kind"], [events.KINDS.index(k) for k in kinds])]
+  counts = events.summarize(records)
+  print(" ".join(f"{kind}={count}" for kind, count in counts.items()))
+  for line in events.payload_legend([kind for kind, count in counts.items() if count]):
+    print(f"  {line}")
+  if args.csv:
+    with open(args.csv, "w", newline="") as f:
+      writer = csv.writer(f)
+      writer.writerow(events.EVENT_DTYPE.names)
+      for r in records:
+        writer.writerow([int(r["tick"]), events.KINDS[r["kind"]], int(r["subject"]), int(r["other"]), float(r["value"])])
+    print(f"Wrote {len(records)} events to {args.csv}")
+  else:
+    for r in records[:args.limit]:
+      print(f"{int(r['tick']):>8} {events.KINDS[r['kind']]:<13} {events.describe(r)}")
+    if len(records) > args.limit:
+      print(f"... {len(records) - args.limit} more (--limit, --csv)")
+  return 0
+
+
+def cmd_time_to_target(args) -> int:
+  from time_to_target import STUDY_COLUMNS, time_to_target_study
+
+  cfg, opts = load_run(args)
+  if cfg.goal_pos is None:
+    print("time-to-target needs goal_pos in the config", file=sys.stderr)
+    return 2
+  if args.cache_dir:
+    os.environ["SHEEP_RUN_CACHE"] = args.cache_dir
+  sheep_counts = [int(v) for v in args.sheep.split(",")] if args.sheep else [cfg.num_sheep]
+  shepherd_counts = [int(v) for v in args.shepherds.split(",")]
+  seeds = range(opts.seed, opts.seed + args.seeds)
+  start = time.perf_counter()
+  rows = time_to_target_study(cfg, sheep_counts, shepherd_counts, seeds, steps=opts.steps, dt=opts.dt,
+                              tolerance=args.tolerance, workers=args.workers, use_cache=args.cache)
+  print(f"{len(rows) * args.seeds} trials in {time.perf_counter() - start:.1f} s")
+
+  out_dir = default_out_dir(args)
+  os.makedirs(out_dir, exist_ok=True)
+  path = os.path.join(out_dir, "time_to_target.csv")
+  with open(path, "w", newline="") as f:
+    writer = csv.DictWriter(f, fieldnames=list(STUDY_COLUMNS))
+    writer.writeheader()
+    writer.writerows(rows)
+  for r in rows:
+    print(f"sheep={r['num_sheep']:<6} dogs={r['num_shepherds']}  arrived {r['arrived']}/{r['trials']}  "
+          f"median={r['median']:.0f} [{r['median_lo']:.0f}, {r['median_hi']:.0f}]  "
+          f"restricted mean={r['restricted_mean']:.1f} [{r['restricted_mean_lo']:.1f}, {r['restricted_mean_hi']:.1f}]")
+  print(f"Saved {path}")
+  if args.plot:
+    from plotter import plot_time_to_target
+    plot_time_to_target(rows, os.path.join(out_dir, "time_to_target.png"))
+  return 0
+
+
+def parse_search_space(spec: str | None, config_path: str | None):
+  """--params "pc,pd=1:30" (bare names use the config's [optimize] range or the default one)."""
+  from config_io import load_optimize
+  from optimize import DEFAULT_SPACE, make_space
+
+  known = dict(DEFAULT_SPACE)
+  configured = load_optimize(config_path) if config_path else {}
+  known.update(configured)
+  if not spec:
+    return make_space(configured or DEFAULT_SPACE)
+  bounds = {}
+  for item in spec.split(","):
+    name, _, rng = item.strip().partition("=")
+    if rng:
+      lo, hi = rng.split(":")
+      bounds[name] = (float(lo), float(hi))
+    elif name in known:
+      bounds[name] = known[name]
+    else:
+      raise ValueError(f"No search range for '{name}', give one as {name}=LO:HI")
+  return make_space(bounds)
+
+
+def parse_targets(spec: str, burn_in: int):
+  """--target FILE (metrics .csv/.npz) or "cohesion=MEAN:STD,..." (normal targets)."""
+  from optimize import MetricTargets
+
+  if os.path.exists(spec):
+    return MetricTargets.from_metrics_file(spec, burn_in=burn_in)
+  moments = {}
+  for item in spec.split(","):
+    name, _, value = item.strip().partition("=")
+    mean, _, std = value.partition(":")
+    moments[name] = (float(mean), float(std or 0.0))
+  return MetricTargets.from_moments(moments, burn_in=burn_in)
+
+
+def cmd_optimize(args) -> int:
+  from optimize import TimeToGoal, optimize
+
+  cfg, opts = load_run(args)
+  try:
+    space = parse_search_space(args.params, args.config)
+    if args.objective == "time":
+      if cfg.goal_pos is None:
+        print("the time objective needs goal_pos in the config", file=sys.stderr)
+        return 2
+      objective = TimeToGoal(args.tolerance)
+    else:
+      if not args.target:
+        print("the metrics objective needs --target", file=sys.stderr)
+        return 2
+      objective = parse_targets(args.target, args.burn_in)
+  except ValueError as e:
+    print(e, file=sys.stderr)
+    return 2
+
+  out_dir = args.out or os.path.join(default_out_dir(args), "optimize")
+  print(f"Optimizing {', '.join(p.name for p in space)} ({args.objective}) on {args.workers} workers, "
+        f"checkpoints in {out_dir}")
+  doc = optimize(cfg, space, objective, out_dir, generations=args.generations, popsize=args.popsize,
+                 sigma=args.sigma, seeds=range(opts.seed, opts.seed + args.seeds), steps=opts.steps,
+                 dt=opts.dt, workers=args.workers, partial=args.partial, reject=args.reject, seed=opts.seed)
+  best = doc["best"]
+  if best["params"] is not None:
+    print(f"best loss {best['loss']:.4g}: " + " ".join(f"{k}={v:.4g}" for k, v in best["params"].items()))
+    print(f"Saved {os.path.join(out_dir, 'best.json')}")
+  return 0
+
+
+def cmd_golden(args) -> int:
+  import golden
+
+  directory = args.dir or golden.GOLDEN_DIR
+  cases = args.cases.split(",") if args.cases else list(golden.CASES)
+  unknown = set(cases) - set(golden.CASES)
+  if unknown:
+    print(f"Unknown cases: {', '.join(sorted(unknown))} (choose from {', '.join(golden.CASES)})", file=sys.stderr)
+    return 2
+  if args.action == "record":
+    for name in cases:
+      path = golden.record_case(golden.CASES[name], directory)
+      print(f"Saved {path} ({os.path.getsize(path) / 1024:.0f} kB)")
+    return 0
+
+  try:
+    rows = golden.check(args.engines.split(","), cases, directory, alpha=args.alpha)
+  except ValueError as e:
+    print(e, file=sys.stderr)
+    return 2
+  save_benchmark_rows(args.out, "golden.csv", rows)
+  failed = [f"{r['case']}/{r['variant']}" for r in rows if not r["passed"]]
+  print(f"{len(rows) - len(failed)}/{len(rows)} passed" + (f"; failed: {', '.join(failed)}" if failed else ""))
+  return 1 if failed else 0
+
+
+def save_benchmark_rows(out_dir: str | None, name: str, rows: list) -> None:
+  if not out_dir or not rows:
+    return
+  os.makedirs(out_dir, exist_ok=True)
+  path = os.path.join(out_dir, name)
+  with open(path, "w", newline="") as f:
+    writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+  print(f"Saved {path}")
+
+
+def cmd_benchmark(args) -> int:
+  if args.suite == "startup":
+    import benchmarks
+    return 1 if benchmarks.startup_benchmark(repeat=args.repeat) else 0
+
+  if args.suite == "precision":
+    import benchmarks
+    benchmarks.precision_benchmark(steps=args.steps or 20)
+    return 0
+
+  if args.suite == "scaling":
+    import benchmarks
+    cfg, opts = load_run(args)
+    lo, hi, count = (int(v) for v in (args.sizes or "14:20000:8").split(":"))
+    rows = benchmarks.scaling_study(cfg, benchmarks.log_spaced_sizes(lo, hi, count),
+                                    engines=(args.engines or "object,array").split(","),
+                                    steps=args.steps or 20, seed=opts.seed,
+                                    modes=args.scaling_mode.split(","))
+    save_benchmark_rows(args.out, "scaling.csv", rows)
+    return 0
+
+  if args.suite == "workers":
+    import benchmarks
+    cfg, opts = load_run(args)
+    rows = benchmarks.worker_scaling(cfg, [int(v) for v in (args.sizes or "1000,5000,20000").split(",")],
+                                     workers=[int(v) for v in args.workers.split(",")],
+                                     engines=(args.engines or "threaded").split(","),
+                                     steps=args.steps or 20, seed=opts.seed)
+    save_benchmark_rows(args.out, "workers.csv", rows)
+    return 0
+
+  from profiling import SimulationProfiler
+  from engines import make_simulation
+
+  cfg, opts = load_run(args)
+  best = None
+  for _ in range(args.repeat):
+    sim = make_simulation(cfg, collect_metrics=opts.collect_metrics, seed=opts.seed)
+    start = time.perf_counter()
+    for _ in sim.steps(opts.steps, dt=opts.dt):
+      pass
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  print(f"{cfg.num_sheep} sheep, {opts.steps} steps: best of {args.repeat} = {best:.3f} s "
+        f"({1000.0 * best / opts.steps:.3f} ms/tick)")
+
+  if args.profile:
+    profiler = SimulationProfiler(keep_ticks=False)
+    sim = make_simulation(cfg, collect_metrics=opts.collect_metrics, seed=opts.seed, profiler=profiler)
+    for _ in sim.steps(opts.steps, dt=opts.dt):
+      pass
+    print(profiler.report())
+  return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+  parser = argparse.ArgumentParser(description="Sheep herding simulation")
+  sub = parser.add_subparsers(dest="command", required=True)
+
+  def add_run_args(p, config_required=False):
+    p.add_argument("config", nargs=None if config_required else "?", help="TOML or JSON run description")
+    p.add_argument("--steps", type=int)
+    p.add_argument("--seed", type=int)
+    p.add_argument("--dt", type=float)
+
+  def add_cache_args(p):
+    p.add_argument("--cache", action="store_true", help="reuse identical earlier runs from the run cache")
+    p.add_argument("--cache-dir", help="run cache directory (default $SHEEP_RUN_CACHE or ~/.cache/sheep-herding/runs)")
+
+  p = sub.add_parser("run", help="run one simulation and write the selected outputs")
+  add_run_args(p)
+  p.add_argument("--out", help="output directory (default results/<config name>)")
+  p.add_argument("--trajectory", action="store_true", help="store the trajectories (chunked .npz store)")
+  p.add_argument("--metrics-csv", action="store_true", help="write per-tick metrics to metrics.csv")
+  p.add_argument("--metrics-columnar", action="store_true", help="write per-tick metrics to metrics.npz")
+  p.add_argument("--gif", action="store_true", help="render the run to run.gif")
+  p.add_argument("--fps", type=int, default=10)
+  p.add_argument("--plot", action="store_true", help="plot all metrics after the run")
+  p.add_argument("--clusters", action="store_true",
+                 help="track sub-flocks every tick: clusters.npz and split / merge / breakaway events in cluster_events.csv")
+  p.add_argument("--cluster-link", type=float, help="link radius of the clusters (default 3 * d_rep)")
+  p.add_argument("--cluster-persistence", type=int, default=10,
+                 help="ticks a fragment must stay apart from the main flock to count as a breakaway")
+  p.add_argument("--events", action="store_true",
+                 help="log dog mode switches, slow-step runs, goal arrival, checkpoints and (with --clusters) "
+                      "breakaways to events.bin")
+  p.add_argument("--events-capacity", type=int, default=4096, help="events buffered before a bulk write")
+  p.add_argument("--goal-tolerance", type=float, default=40.0, help="goal radius around goal_pos for goal_reached")
+  p.add_argument("--serve", type=int, metavar="PORT", help="stream the run to `watch` clients on PORT (0 = any)")
+  p.add_argument("--serve-host", default="127.0.0.1", help="interface to stream on (default localhost only)")
+  p.add_argument("--serve-fps", type=float, default=30.0, help="max frames per second sent to each client")
+  p.add_argument("--serve-wait", action="store_true", help="wait for the first client before running")
+  add_cache_args(p)
+  p.set_defaults(func=cmd_run)
+
+  p = sub.add_parser("watch", help="render a run streamed by `run --serve` (pygame)")
+  p.add_argument("address", help="HOST:PORT or PORT of the streaming run")
+  p.add_argument("--fps", type=float, default=0.0, help="max frames per second to receive (default the server's)")
+  p.set_defaults(func=cmd_watch)
+
+  p = sub.add_parser("sweep", help="run the [sweep] grid of a config, optionally in parallel")
+  add_run_args(p, config_required=True)
+  p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+  p.add_argument("--out")
+  add_cache_args(p)
+  p.set_defaults(func=cmd_sweep)
+
+  p = sub.add_parser("record", help="record a run to a GIF")
+  add_run_args(p)
+  p.add_argument("--output", default="run.gif")
+  p.add_argument("--fps", type=int, default=10)
+  p.set_defaults(func=cmd_record)
+
+  p = sub.add_parser("plot", help="plot a stored metrics file (.csv or .npz)")
+  p.add_argument("metrics")
+  p.add_argument("--out")
+  p.add_argument("--prefix", default="")
+  p.set_defaults(func=cmd_plot)
+
+  p = sub.add_parser("events", help="list the events logged by `run --events`")
+  p.add_argument("log", help="events.bin of a run")
+  p.add_argument("--kinds", help="comma separated event kinds (default: all)")
+  p.add_argument("--limit", type=int, default=50, help="events printed")
+  p.add_argument("--csv", help="write the selected events to this csv instead of printing them")
+  p.set_defaults(func=cmd_events)
+
+  p = sub.add_parser("time-to-target", help="time to target over many seeds per (num_sheep, num_shepherds) cell")
+  add_run_args(p)
+  p.add_argument("--sheep", help="comma separated flock sizes (default: the config's num_sheep)")
+  p.add_argument("--shepherds", default="1,2", help="comma separated numbers of dogs")
+  p.add_argument("--seeds", type=int, default=20, help="trials per cell (seeds seed, seed + 1, ...)")
+  p.add_argument("--tolerance", type=float, default=40.0, help="goal radius around goal_pos")
+  p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+  p.add_argument("--out")
+  p.add_argument("--plot", action="store_true")
+  add_cache_args(p)
+  p.set_defaults(func=cmd_time_to_target)
+
+  p = sub.add_parser("optimize", help="tune config parameters with CMA-ES (time to goal or target metric distributions)")
+  add_run_args(p)
+  p.add_argument("--params", help="comma separated parameters, NAME or NAME=LO:HI "
+                                  "(default: the config's [optimize] table, else pc,pd,f_n,v_dog,e,w_dog)")
+  p.add_argument("--objective", choices=("time", "metrics"), default="time",
+                 help="time: mean arrival tick at goal_pos; metrics: distance to --target distributions")
+  p.add_argument("--target", help="metrics: metrics file (.csv/.npz) or cohesion=MEAN:STD,polarization=...")
+  p.add_argument("--burn-in", type=int, default=50, help="metrics: ticks ignored at the start of every run")
+  p.add_argument("--tolerance", type=float, default=40.0, help="time: goal radius around goal_pos")
+  p.add_argument("--generations", type=int, default=30)
+  p.add_argument("--popsize", type=int, help="candidates per generation (default 4 + 3 ln(parameters))")
+  p.add_argument("--sigma", type=float, default=0.3, help="initial step size, in units of the search ranges")
+  p.add_argument("--seeds", type=int, default=4, help="runs per candidate (seeds seed, seed + 1, ...)")
+  p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+  p.add_argument("--partial", type=float, default=0.5,
+                 help="fraction of the run after which poor candidates are rejected (0 = never)")
+  p.add_argument("--reject", type=float, default=1.0,
+                 help="reject when the partial loss exceeds this times the last generation's selection cut")
+  p.add_argument("--out", help="study directory (default results/<config name>/optimize); reruns resume it")
+  p.set_defaults(func=cmd_optimize)
+
+  p = sub.add_parser("golden", help="record golden reference runs, or check engines against them")
+  p.add_argument("action", choices=("record", "check"))
+  p.add_argument("--engines", default="object,array-sequential,array,array-float32,threaded,parallel",
+                 help="check: comma separated variants (see golden.VARIANTS, e.g. array-numba)")
+  p.add_argument("--cases", help="comma separated cases (default: all of golden.CASES)")
+  p.add_argument("--alpha", type=float, default=0.01, help="check: KS p-value below which a distribution fails")
+  p.add_argument("--dir", help="golden run directory (default golden/ in the repository)")
+  p.add_argument("--out", help="check: directory for golden.csv")
+  p.set_defaults(func=cmd_golden)
+
+  p = sub.add_parser("analyze", help="recompute metrics from a stored trajectory (cached next to the run)")
+  p.add_argument("run_dir", nargs="?", help="trajectory directory written by `run --trajectory`")
+  p.add_argument("--metrics", help="comma separated metric names (default: all)")
+  p.add_argument("--start", type=int, default=0)
+  p.add_argument("--stop", type=int)
+  p.add_argument("--workers", type=int, default=1, help="chunks processed in parallel")
+  p.add_argument("--out", help="output .npz (default analysis.npz next to the trajectory)")
+  p.add_argument("--clear-cache", action="store_true", help="recompute instead of reusing cached columns")
+  p.add_argument("--list", action="store_true", help="list the registered metrics")
+  p.add_argument("--cluster-events", action="store_true",
+                 help="also track the clusters tick by tick and write cluster_events.csv next to the output")
+  p.add_argument("--cluster-link", type=float, help="link radius of the clusters (default 3 * d_rep)")
+  p.add_argument("--cluster-persistence", type=int, default=10,
+                 help="ticks a fragment must stay apart from the main flock to count as a breakaway")
+  p.set_defaults(func=cmd_analyze)
+
+  p = sub.add_parser("benchmark", help="time a run (optionally with a per-phase profile) or a benchmark suite")
+  add_run_args(p)
+  p.add_argument("--suite", choices=("run", "startup", "precision", "scaling", "workers"), default="run",
+                 help="run: time CONFIG; startup: import time of the entry points in fresh interpreters; "
+                      "precision: memory and throughput of float32 vs float64 array state; "
+                      "scaling: behaviour and cost vs flock size with the N-dependent parameters re-derived; "
+                      "workers: speedup of the threaded / parallel engines vs number of workers")
+  p.add_argument("--sizes", help="scaling: LO:HI:COUNT log-spaced flock sizes (default 14:20000:8); "
+                                 "workers: comma separated flock sizes (default 1000,5000,20000)")
+  p.add_argument("--engines", help="scaling: comma separated engines (default object,array); "
+                                   "workers: default threaded")
+  p.add_argument("--scaling-mode", default="weak,strong",
+                 help="scaling: weak (field grows with the flock, constant density) and/or strong (fixed field)")
+  p.add_argument("--workers", default="1,2,4,8,16,32", help="workers: comma separated worker counts")
+  p.add_argument("--out", help="scaling / workers: directory for the csv")
+  p.add_argument("--repeat", type=int, default=3)
+  p.add_argument("--profile", action="store_true")
+  p.set_defaults(func=cmd_benchmark)
+
+  return parser
+
+
+def main(argv=None) -> int:
+  args = build_parser().parse_args(argv)
+  return args.func(args)
 
-  #sim.run(
-  #  steps=100,
-  #  dt = 1.0  # seconds
-  #)
 
 if __name__ == "__main__":
-  main()
+  sys.exit(main())
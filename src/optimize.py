@@ -0,0 +1,448 @@
+import dataclasses
+import json
+import math
+import os
+import time
+from statistics import NormalDist
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from engine import SPEED_CONST
+from engines import make_simulation
+from simulation import SimulationConfig
+
+# Black-box tuning of SimulationConfig parameters (pc, pd, f_n, v_dog, e, w_dog, ...) with CMA-ES.
+#
+# Every generation CMA-ES samples `popsize` candidates in the unit box of the searched parameters
+# (log-scaled where the range spans a decade or more); each candidate is run for the same seeds
+# (common random numbers, so candidates are compared on the same initial placements) and scored
+# by an objective, lower is better:
+#   TimeToGoal     mean arrival tick over the seeds, non-arrivals censored at `steps`
+#                  (the restricted mean of time_to_target.py)
+#   MetricTargets  sum over cohesion / polarization / elongation of the Wasserstein-1 distance
+#                  between the per-tick values after burn-in (all seeds pooled) and a target
+#                  distribution, in units of the target's standard deviation
+# Candidates are evaluated in parallel on a process pool, all seeds of a candidate by one worker,
+# advancing the seed runs together. At `partial` of the run the worker stops a candidate whose
+# partial loss already exceeds `reject` times the selection cut of the previous generation (the
+# popsize/2-th best): for TimeToGoal the partial loss is a lower bound of the final one (see
+# there) and the cut is taken over final losses; for MetricTargets, whose partial loss includes
+# the initial transient, the cut is taken over the partial losses. Rejected candidates are ranked
+# by their partial loss when it is a bound, otherwise after every completed candidate
+# (ranking_losses).
+#
+# After every generation the optimizer state (CMA-ES mean, step size, covariance, evolution paths,
+# RNG state), the best candidate and the search space are written to <out>/optimizer.json
+# (atomically), every evaluation is appended to <out>/evaluations.csv and the best config so far
+# to <out>/best.json (a run file for `main.py run`). A study started again with the same output
+# directory resumes from the checkpoint: it must search the same space with the same popsize,
+# seeds, steps, dt, partial and objective, and evaluation rows of generations the checkpoint
+# does not have yet (appended before a crash) are dropped, since those generations run again.
+
+# Default search ranges (figure 6 value in brackets).
+DEFAULT_SPACE = {
+  "pc": (0.5, 20.0),      # collecting offset [2]
+  "pd": (1.0, 30.0),      # driving offset [7.5]
+  "f_n": (2.0, 40.0),     # cohesion threshold [11.6]
+  "v_dog": (0.5, 3.0),    # dog speed [1.5]
+  "e": (0.0, 1.0),        # dog noise [0.3]
+  "w_dog": (0.0, 5.0),    # dog repulsion weight [1]
+}
+
+METRICS = ("cohesion", "polarization", "elongation")
+QUANTILES = (np.arange(200) + 0.5) / 200  # grid on which distributions are compared
+
+
+@dataclasses.dataclass
+class Parameter:
+  name: str
+  lo: float
+  hi: float
+  log: bool = False
+
+  def decode(self, u: float) -> float:
+    u = min(max(u, 0.0), 1.0)
+    if self.log:
+      return math.exp(math.log(self.lo) + u * (math.log(self.hi) - math.log(self.lo)))
+    return self.lo + u * (self.hi - self.lo)
+
+  def encode(self, value: float) -> float:
+    if self.log:
+      u = (math.log(value) - math.log(self.lo)) / (math.log(self.hi) - math.log(self.lo))
+    else:
+      u = (value - self.lo) / (self.hi - self.lo)
+    return min(max(u, 0.0), 1.0)
+
+
+def make_space(bounds: Dict[str, Sequence[float]]) -> List[Parameter]:
+  """Parameters for name -> (lo, hi); ranges with lo > 0 spanning 10x or more are searched in log scale."""
+  known = {f.name for f in dataclasses.fields(SimulationConfig)}
+  space = []
+  for name, (lo, hi) in bounds.items():
+    if name not in known:
+      raise ValueError(f"Unknown simulation parameter '{name}'")
+    if not lo < hi:
+      raise ValueError(f"Empty range for {name}: [{lo}, {hi}]")
+    space.append(Parameter(name, float(lo), float(hi), log=lo > 0 and hi / lo >= 10.0))
+  return space
+
+
+def apply_params(cfg: SimulationConfig, space: Sequence[Parameter], u: np.ndarray) -> SimulationConfig:
+  values = {}
+  for p, x in zip(space, u):
+    value = p.decode(float(x))
+    values[p.name] = int(round(value)) if isinstance(getattr(cfg, p.name), int) else value
+  return dataclasses.replace(cfg, **values)
+
+
+# ---------- CMA-ES ----------
+
+class CMAES:
+  """(mu/mu_w, lambda)-CMA-ES (Hansen's tutorial defaults) in the unit box; samples outside it are redrawn."""
+
+  def __init__(self, mean: Sequence[float], sigma: float = 0.3, popsize: int | None = None, seed: int = 0):
+    n = len(mean)
+    self.n = n
+    self.mean = np.asarray(mean, dtype=np.float64)
+    self.sigma = sigma
+    self.popsize = popsize or 4 + int(3 * math.log(n))
+    self.mu = self.popsize // 2
+    w = math.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+    self.weights = w / w.sum()
+    self.mueff = 1.0 / (self.weights ** 2).sum()
+    self.cc = (4 + self.mueff / n) / (n + 4 + 2 * self.mueff / n)
+    self.cs = (self.mueff + 2) / (n + self.mueff + 5)
+    self.c1 = 2 / ((n + 1.3) ** 2 + self.mueff)
+    self.cmu = min(1 - self.c1, 2 * (self.mueff - 2 + 1 / self.mueff) / ((n + 2) ** 2 + self.mueff))
+    self.damps = 1 + 2 * max(0.0, math.sqrt((self.mueff - 1) / (n + 1)) - 1) + self.cs
+    self.chi_n = math.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n * n))
+    self.C = np.eye(n)
+    self.pc = np.zeros(n)
+    self.ps = np.zeros(n)
+    self.generation = 0
+    self.rng = np.random.default_rng(seed)
+
+  def _eigen(self) -> Tuple[np.ndarray, np.ndarray]:
+    self.C = (self.C + self.C.T) / 2
+    d2, B = np.linalg.eigh(self.C)
+    return B, np.sqrt(np.maximum(d2, 1e-20))
+
+  def ask(self, max_tries: int = 100) -> np.ndarray:
+    B, D = self._eigen()
+    out = np.empty((self.popsize, self.n))
+    for k in range(self.popsize):
+      for _ in range(max_tries):
+        x = self.mean + self.sigma * (B @ (D * self.rng.standard_normal(self.n)))
+        if ((x >= 0.0) & (x <= 1.0)).all():
+          break
+      out[k] = np.clip(x, 0.0, 1.0)
+    return out
+
+  def tell(self, xs: np.ndarray, losses: Sequence[float]) -> None:
+    n = self.n
+    order = np.argsort(losses, kind="stable")[:self.mu]
+    y = (xs[order] - self.mean) / self.sigma
+    y_w = self.weights @ y
+    self.mean = self.mean + self.sigma * y_w
+
+    B, D = self._eigen()
+    inv_sqrt_c = B @ np.diag(1 / D) @ B.T
+    self.ps = (1 - self.cs) * self.ps + math.sqrt(self.cs * (2 - self.cs) * self.mueff) * (inv_sqrt_c @ y_w)
+    ps_norm = np.linalg.norm(self.ps)
+    hsig = ps_norm / math.sqrt(1 - (1 - self.cs) ** (2 * (self.generation + 1))) / self.chi_n < 1.4 + 2 / (n + 1)
+    self.pc = (1 - self.cc) * self.pc + hsig * math.sqrt(self.cc * (2 - self.cc) * self.mueff) * y_w
+    rank_mu = (self.weights[:, None] * y).T @ y
+    self.C = ((1 - self.c1 - self.cmu) * self.C
+              + self.c1 * (np.outer(self.pc, self.pc) + (1 - hsig) * self.cc * (2 - self.cc) * self.C)
+              + self.cmu * rank_mu)
+    self.sigma *= math.exp((self.cs / self.damps) * (ps_norm / self.chi_n - 1))
+    self.generation += 1
+
+  def state_dict(self) -> dict:
+    return {
+      "mean": self.mean.tolist(), "sigma": self.sigma, "popsize": self.popsize, "C": self.C.tolist(),
+      "pc": self.pc.tolist(), "ps": self.ps.tolist(), "generation": self.generation,
+      "rng": self.rng.bit_generator.state,
+    }
+
+  @classmethod
+  def from_state(cls, state: dict) -> 'CMAES':
+    es = cls(state["mean"], state["sigma"], state["popsize"])
+    es.C = np.asarray(state["C"])
+    es.pc = np.asarray(state["pc"])
+    es.ps = np.asarray(state["ps"])
+    es.generation = state["generation"]
+    es.rng.bit_generator.state = state["rng"]
+    return es
+
+
+# ---------- objectives ----------
+
+class TimeToGoal:
+  """
+  Mean arrival tick over the seeds, non-arrivals censored at `steps`. Before the end of the run a
+  flock still at distance d from the goal counts as arriving (d - tolerance) / (SPEED_CONST * dt)
+  ticks later at the earliest (the barycenter is no faster than the sheep): a lower bound.
+  """
+  collect_metrics = False
+  partial_is_bound = True
+
+  def __init__(self, tolerance: float = 40.0):
+    self.tolerance = tolerance
+
+  def spec(self) -> dict:
+    return {"objective": "time", "tolerance": self.tolerance}
+
+  def new_record(self, dt: float) -> dict:
+    return {"arrival": None, "earliest": 0.0, "step": SPEED_CONST * dt}
+
+  def observe(self, record: dict, sim, state) -> bool:
+    if sim.goal_reached(self.tolerance):
+      record["arrival"] = state.tick
+      return True
+    bx, by = sim.calculate_barycenter()
+    distance = math.hypot(bx - sim.cfg.goal_pos[0], by - sim.cfg.goal_pos[1])
+    record["earliest"] = state.tick + max(1.0, math.ceil((distance - self.tolerance) / record["step"]))
+    return False
+
+  def loss(self, records: List[dict], ticks: int, steps: int) -> float:
+    if ticks >= steps:
+      return float(np.mean([steps if r["arrival"] is None else r["arrival"] for r in records]))
+    return float(np.mean([min(r["earliest"], steps) if r["arrival"] is None else r["arrival"] for r in records]))
+
+
+class MetricTargets:
+  """Distance of the cohesion / polarization / elongation distributions to target quantiles."""
+  collect_metrics = True
+  partial_is_bound = False
+
+  def __init__(self, targets: Dict[str, np.ndarray], burn_in: int = 0):
+    unknown = set(targets) - set(METRICS)
+    if unknown:
+      raise ValueError(f"Unknown target metrics: {', '.join(sorted(unknown))} (choose from {', '.join(METRICS)})")
+    self.targets = {name: np.asarray(q, dtype=np.float64) for name, q in targets.items()}
+    self.scales = {name: float(np.std(q)) or 1.0 for name, q in self.targets.items()}
+    self.burn_in = burn_in
+
+  @classmethod
+  def from_moments(cls, moments: Dict[str, Tuple[float, float]], burn_in: int = 0) -> 'MetricTargets':
+    """Normal targets from (mean, standard deviation) per metric."""
+    targets = {}
+    for name, (mean, std) in moments.items():
+      targets[name] = (np.array([NormalDist(mean, std).inv_cdf(q) for q in QUANTILES]) if std > 0
+                       else np.full(len(QUANTILES), float(mean)))
+    return cls(targets, burn_in)
+
+  @classmethod
+  def from_metrics_file(cls, path: str, names: Sequence[str] = METRICS, burn_in: int = 0) -> 'MetricTargets':
+    """Empirical targets from a metrics file (sinks.read_metrics: `run --metrics-csv / --metrics-columnar`)."""
+    from sinks import read_metrics
+    columns = read_metrics(path)
+    targets = {}
+    for name in names:
+      values = np.asarray(columns[name][burn_in:], dtype=np.float64)
+      values = values[np.isfinite(values)]
+      if len(values) == 0:
+        raise ValueError(f"{path} has no {name} values after tick {burn_in}")
+      targets[name] = np.quantile(values, QUANTILES)
+    return cls(targets, burn_in)
+
+  def spec(self) -> dict:
+    return {"objective": "metrics", "burn_in": self.burn_in,
+            "targets": {name: q.tolist() for name, q in self.targets.items()}}
+
+  def new_record(self, dt: float) -> dict:
+    return {name: [] for name in self.targets}
+
+  def observe(self, record: dict, sim, state) -> bool:
+    if state.tick >= self.burn_in:
+      for name, values in record.items():
+        values.append(getattr(state, name))
+    return False
+
+  def loss(self, records: List[dict], ticks: int, steps: int) -> float:
+    total = 0.0
+    for name, target in self.targets.items():
+      values = np.concatenate([np.asarray(r[name], dtype=np.float64) for r in records])
+      values = values[np.isfinite(values)]
+      if len(values) == 0:
+        return 0.0 if ticks <= self.burn_in else math.inf
+      total += float(np.abs(np.quantile(values, QUANTILES) - target).mean()) / self.scales[name]
+    return total
+
+
+# ---------- evaluation ----------
+
+@dataclasses.dataclass
+class Candidate:
+  cfg: SimulationConfig
+  objective: object
+  seeds: Sequence[int]
+  steps: int
+  dt: float = 1.0
+  partial_steps: int = 0
+  threshold: float | None = None  # reject above this partial loss (None = never)
+
+
+def evaluate(candidate: Candidate) -> Tuple[float, bool, int, float]:
+  """Pool entry point: (loss, rejected early, ticks simulated, loss at the partial checkpoint)."""
+  c = candidate
+  objective = c.objective
+  runs = []
+  for seed in c.seeds:
+    sim = make_simulation(c.cfg, collect_metrics=objective.collect_metrics, seed=seed)
+    runs.append({"sim": sim, "steps": sim.steps(c.steps, dt=c.dt), "record": objective.new_record(c.dt),
+                 "ticks": 0, "done": False})
+
+  checkpoints = [c.steps]
+  if 0 < c.partial_steps < c.steps:
+    checkpoints.insert(0, c.partial_steps)
+  ticks = 0
+  partial_loss = math.nan
+  for checkpoint in checkpoints:
+    for run in runs:
+      while not run["done"] and run["ticks"] < checkpoint:
+        state = next(run["steps"], None)
+        if state is None:
+          run["done"] = True
+          break
+        run["ticks"] += 1
+        ticks += 1
+        run["done"] = objective.observe(run["record"], run["sim"], state)
+    loss = objective.loss([r["record"] for r in runs], checkpoint, c.steps)
+    if checkpoint < c.steps:
+      partial_loss = loss
+      if c.threshold is not None and loss > c.threshold:
+        return loss, True, ticks, partial_loss
+  return loss, False, ticks, partial_loss
+
+
+# ---------- driver ----------
+
+EVALUATION_COLUMNS = ("generation", "candidate", "loss", "rejected", "ticks")
+
+
+def _write_json_atomic(path: str, doc: dict) -> None:
+  tmp = path + ".tmp"
+  with open(tmp, "w") as f:
+    json.dump(doc, f, indent=1)
+  os.replace(tmp, path)
+
+
+def _drop_evaluations(path: str, generation: int) -> None:
+  """Removes the rows of generations >= generation (and a partly written last row) from evaluations.csv."""
+  with open(path) as f:
+    lines = f.readlines()
+  keep = lines[:1] + [line for line in lines[1:]
+                      if line.endswith("\n") and int(line.split(",", 1)[0]) < generation]
+  if len(keep) < len(lines):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+      f.writelines(keep)
+    os.replace(tmp, path)
+
+
+def ranking_losses(results: Sequence[Tuple[float, bool, int, float]], partial_is_bound: bool) -> List[float]:
+  """
+  Losses CMA-ES ranks the candidates by. A rejected candidate's loss is its partial loss: when
+  that bounds the full loss it ranks as is, otherwise rejected candidates rank after every
+  completed one (worst completed loss plus their partial loss).
+  """
+  if partial_is_bound:
+    return [r[0] for r in results]
+  completed = [r[0] for r in results if not r[1] and math.isfinite(r[0])]
+  worst = max(completed, default=0.0)
+  return [worst + r[3] if r[1] else r[0] for r in results]
+
+
+def optimize(cfg: SimulationConfig, space: Sequence[Parameter], objective, out_dir: str,
+             generations: int = 30, popsize: int | None = None, sigma: float = 0.3,
+             seeds: Sequence[int] = (0, 1, 2, 3), steps: int = 500, dt: float = 1.0,
+             workers: int = 1, partial: float = 0.5, reject: float = 1.0, seed: int = 0,
+             log=print) -> dict:
+  """
+  Runs (or resumes, from <out_dir>/optimizer.json) a CMA-ES study; returns the checkpoint
+  document: "best" holds the best parameters and loss found.
+  """
+  os.makedirs(out_dir, exist_ok=True)
+  checkpoint_path = os.path.join(out_dir, "optimizer.json")
+  names = [p.name for p in space]
+  # arguments the checkpointed state (population, rejection threshold, losses) depends on
+  study = {"popsize": popsize, "seed": seed, "seeds": [int(s) for s in seeds], "steps": steps, "dt": dt,
+           "partial": partial, "objective": objective.spec()}
+  evaluations_path = os.path.join(out_dir, "evaluations.csv")
+  if os.path.exists(checkpoint_path):
+    with open(checkpoint_path) as f:
+      doc = json.load(f)
+    if [p["name"] for p in doc["space"]] != names:
+      raise ValueError(f"{checkpoint_path} searches {', '.join(p['name'] for p in doc['space'])}, "
+                       f"not {', '.join(names)}; use another output directory")
+    changed = [k for k, v in study.items() if doc.get("study", {}).get(k) != v]
+    if changed:
+      raise ValueError(f"{checkpoint_path} was run with a different {', '.join(changed)}; "
+                       f"use the same arguments to resume, or another output directory")
+    es = CMAES.from_state(doc["cmaes"])
+    log(f"Resuming at generation {es.generation} (best loss {doc['best']['loss']:.4g})")
+  else:
+    es = CMAES([p.encode(getattr(cfg, p.name)) for p in space], sigma, popsize, seed)
+    doc = {"space": [dataclasses.asdict(p) for p in space], "study": study,
+           "best": {"loss": math.inf, "params": None}, "generations": []}
+
+  if os.path.exists(evaluations_path):
+    _drop_evaluations(evaluations_path, es.generation)
+  else:
+    with open(evaluations_path, "w") as f:
+      f.write(",".join(EVALUATION_COLUMNS + tuple(names)) + "\n")
+
+  threshold = doc["generations"][-1]["threshold"] if doc["generations"] else None
+  partial_steps = int(partial * steps)
+  pool = None
+  if workers > 1:
+    from multiprocessing import Pool
+    pool = Pool(workers)
+  try:
+    while es.generation < generations:
+      start = time.perf_counter()
+      xs = es.ask()
+      configs = [apply_params(cfg, space, x) for x in xs]
+      candidates = [Candidate(c, objective, list(seeds), steps, dt, partial_steps,
+                              None if threshold is None else threshold * reject) for c in configs]
+      results = pool.map(evaluate, candidates) if pool is not None else [evaluate(c) for c in candidates]
+      es.tell(xs, ranking_losses(results, objective.partial_is_bound))
+
+      # selection cut: full losses when the partial loss bounds them, else partial losses
+      if objective.partial_is_bound:
+        cut = sorted(r[0] for r in results if not r[1] and math.isfinite(r[0]))
+      else:
+        cut = sorted(r[3] for r in results if math.isfinite(r[3]))
+      if cut:
+        threshold = cut[min(es.mu, len(cut)) - 1]
+      generation = es.generation - 1
+      with open(evaluations_path, "a") as f:
+        for k, (x, (loss, rejected, ticks, _)) in enumerate(zip(xs, results)):
+          values = [p.decode(float(u)) for p, u in zip(space, x)]
+          f.write(",".join(str(v) for v in [generation, k, loss, int(rejected), ticks] + values) + "\n")
+      best = int(np.argmin([math.inf if r[1] else r[0] for r in results]))
+      if not results[best][1] and results[best][0] < doc["best"]["loss"]:
+        doc["best"] = {"loss": results[best][0], "generation": generation,
+                       "params": {p.name: getattr(configs[best], p.name) for p in space}}
+        _write_json_atomic(os.path.join(out_dir, "best.json"), {
+          "seed": seeds[0], "steps": steps, "dt": dt,
+          "simulation": {k: list(v) if isinstance(v, tuple) else v
+                         for k, v in dataclasses.asdict(configs[best]).items()},
+        })
+      rejected = sum(r[1] for r in results)
+      generation_best = min((r[0] for r in results if not r[1]), default=math.nan)
+      elapsed = time.perf_counter() - start
+      doc["generations"].append({"generation": generation, "best_loss": generation_best, "threshold": threshold,
+                                 "rejected": rejected, "sigma": es.sigma, "seconds": elapsed})
+      doc["cmaes"] = es.state_dict()
+      _write_json_atomic(checkpoint_path, doc)
+      log(f"gen {generation:3d}  best {generation_best:10.4g}  overall {doc['best']['loss']:10.4g}  "
+          f"rejected {rejected}/{len(xs)}  sigma {es.sigma:.3g}  {elapsed:.1f} s")
+  finally:
+    if pool is not None:
+      pool.close()
+      pool.join()
+  return doc
@@ -0,0 +1,393 @@
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from engine import (ArraySimulation, FlockKinematics, SPEED_CONST, dog_repulsion_forces, perceived_social_forces,
+                    repulsion_forces, social_forces, steer, unit_vectors)
+from perception import make_perception
+from profiling import SimulationProfiler
+from simulation import SimulationConfig
+from spatial import GridIndex
+
+# Domain decomposition of one large flock over worker processes (engine = "parallel").
+#
+# The field is cut into cfg.workers vertical strips; a worker owns the sheep whose x lies in its
+# strip at the start of the tick, so sheep migrate between workers as they move. The sheep state
+# lives in one shared memory block, with positions, velocities and directions double-buffered:
+# during a tick every worker reads the "current" buffers of the whole flock and writes the "next"
+# buffers of its own sheep only, so a tick needs a single round trip and no locks. A worker's
+# neighbour search runs over its own sheep plus the halo, the sheep less than the halo width
+# (max(d_rep, sheep_vision_radius)) outside its strip; the attraction / alignment sample is drawn
+# from the whole flock, read straight from shared memory. The dogs are updated by the
+# coordinating process while the workers run, on the same start-of-tick state.
+#
+# Strip ownership follows the flock without any worker scanning the whole flock: the coordinator
+# keeps flock.order, the sheep indices sorted by x, and re-sorts it from the previous order every
+# tick (a stable sort of nearly sorted keys, about one O(N) pass, so a sheep only changes places
+# with the sheep it overtook). Strip k owns the k-th of `workers` equal slices of that order, so
+# the owned lists change exactly by the sheep that crossed a strip edge and every worker owns
+# N / workers sheep however the flock is spread; its halo is the adjoining runs of the order
+# found by binary search. A worker then touches O(N / workers + halo) rows per tick.
+#
+# The rules are those of the array engine (engine.py) with ordering = "synchronous", evaluated
+# per strip. Every worker draws its own random numbers, so runs match that ArraySimulation
+# statistically but not sample by sample, and depend on the number of workers.
+#
+# engine = "threaded" runs the same strips on a thread pool of the coordinating process
+# (ThreadedSimulation), for mid-size flocks where a tick is too short to pay for process round
+# trips.
+
+DOUBLE_BUFFERED = ("pos", "vel", "direction")
+FORCES = ("att", "ali", "rep", "dog_rep", "noise")
+
+
+class SharedFlock:
+  """
+  (N, 2) sheep arrays in one memory block: two buffers of the DOUBLE_BUFFERED fields, one of the
+  FORCES, and the (N,) strip order. The block is shared memory unless `process_shared` is False
+  (threads only).
+  """
+
+  def __init__(self, num_sheep: int, dtype, shm: SharedMemory | None = None, process_shared: bool = True):
+    self.num_sheep = num_sheep
+    self.dtype = np.dtype(dtype)
+    names = [f"{f}{b}" for f in DOUBLE_BUFFERED for b in (0, 1)] + list(FORCES)
+    block = num_sheep * 2 * self.dtype.itemsize
+    size = max(1, len(names) * block + num_sheep * np.dtype(np.intp).itemsize)
+    self.shm = shm or (SharedMemory(create=True, size=size) if process_shared else None)
+    memory = self.shm.buf if self.shm is not None else bytearray(size)
+    self.arrays: Dict[str, np.ndarray] = {
+      name: np.ndarray((num_sheep, 2), dtype=self.dtype, buffer=memory, offset=k * block)
+      for k, name in enumerate(names)
+    }
+    self.order = np.ndarray(num_sheep, dtype=np.intp, buffer=memory, offset=len(names) * block)
+
+  def get(self, field: str, buffer: int | None = None) -> np.ndarray:
+    return self.arrays[field if buffer is None else f"{field}{buffer}"]
+
+  def release(self) -> None:
+    """Drops this object's views and unmaps the block (views handed out elsewhere must be gone)."""
+    self.arrays = {}
+    self.order = None
+    if self.shm is None:
+      return
+    try:
+      self.shm.close()
+    except BufferError:
+      pass  # still referenced, unmapped when the last view goes
+
+
+def halo_width(cfg: SimulationConfig) -> float:
+  """How far outside its strip a worker needs to see the sheep."""
+  return max(cfg.d_rep, cfg.sheep_vision_radius or 0.0)
+
+
+def strip_rows(x: np.ndarray, order: np.ndarray, parts: int, halo: float):
+  """
+  Re-sorts `order` (in place) by x and cuts it into `parts` strips: (edges (parts + 1,), rows
+  (parts, 4)) where strip k owns order[rows[k, 1]:rows[k, 2]], the sheep with edges[k] <= x <
+  edges[k + 1] (outer edges infinite, ties may fall either side), and its halo is
+  order[rows[k, 0]:rows[k, 1]] plus order[rows[k, 2]:rows[k, 3]].
+  """
+  order[:] = order[np.argsort(x[order], kind="stable")]
+  sorted_x = x[order]
+  cuts = np.arange(parts + 1) * len(x) // parts
+  edges = np.full(parts + 1, np.inf)
+  edges[0] = -np.inf
+  edges[1:-1] = sorted_x[cuts[1:-1]]
+  rows = np.empty((parts, 4), dtype=np.intp)
+  rows[:, 0] = np.searchsorted(sorted_x, edges[:-1] - halo)
+  rows[:, 1] = cuts[:-1]
+  rows[:, 2] = cuts[1:]
+  rows[:, 3] = np.searchsorted(sorted_x, edges[1:] + halo)
+  return edges, rows
+
+
+class Tile:
+  """A worker's part of a tick: moves the sheep of one strip."""
+
+  def __init__(self, cfg: SimulationConfig, flock: SharedFlock, seed: np.random.SeedSequence):
+    self.cfg = cfg
+    self.flock = flock
+    self.rng = np.random.default_rng(seed)
+    self.perception = make_perception(cfg.sheep_vision_radius, cfg.sheep_view_angle)
+    self.halo = halo_width(cfg)
+
+  def step(self, cur: int, rows: Sequence[int], lo: float, hi: float, dog: np.ndarray | None, dt: float) -> dict:
+    """
+    Reads buffer `cur`, writes the sheep of the strip [lo, hi) to buffer 1 - cur; `rows` locates
+    them and their halo in flock.order (strip_rows). Returns load statistics.
+    """
+    cfg = self.cfg
+    f = self.flock
+    pos = f.get("pos", cur)
+    dirs = f.get("direction", cur)
+    halo_lo, start, stop, halo_hi = rows
+    owned = f.order[start:stop]
+    n = len(owned)
+    if n == 0:
+      return {"owned": 0, "repulsion_hits": 0, "migrations": 0}
+    # own sheep first: local row m < n is owned[m]
+    local = np.concatenate([owned, f.order[halo_lo:start], f.order[stop:halo_hi]])
+    local_pos = pos[local]
+    local_dirs = dirs[local]
+
+    # --- social forces ---
+    if self.perception is not None:
+      r = self.perception.radius
+      i, j, d = self._own_pairs(GridIndex(local_pos, r).pairs_within(r), n, local_pos, local_dirs)
+      att, ali = perceived_social_forces(self.rng, cfg, local_pos, local_dirs, i, j, d, n)
+    else:
+      att, ali = social_forces(self.rng, cfg, pos, dirs, owned)
+    i, j, d = self._own_pairs(GridIndex(local_pos, cfg.d_rep).pairs_within(cfg.d_rep), n, local_pos, local_dirs)
+    rep, _ = repulsion_forces(cfg.w_rep, local_pos, i, j, d, n)
+    own_pos = local_pos[:n]
+    dog_rep = dog_repulsion_forces(cfg, own_pos, dog) if dog is not None else np.zeros_like(own_pos)
+    noise = self.rng.random((n, 2))
+
+    # --- move ---
+    for name, value in (("att", att), ("ali", ali), ("rep", rep), ("dog_rep", dog_rep), ("noise", noise)):
+      f.get(name)[owned] = value
+    unit = steer(local_dirs[:n], att, ali, rep, dog_rep, noise.astype(f.dtype, copy=False))
+    vel = (unit * SPEED_CONST).astype(f.dtype, copy=False)
+    new_pos = own_pos + vel * dt
+    nxt = 1 - cur
+    f.get("pos", nxt)[owned] = new_pos
+    f.get("vel", nxt)[owned] = vel
+    f.get("direction", nxt)[owned] = unit
+
+    new_x = new_pos[:, 0]
+    return {
+      "owned": n,
+      "repulsion_hits": len(i),
+      "migrations": int(np.count_nonzero((new_x < lo) | (new_x >= hi))),
+    }
+
+  def _own_pairs(self, pairs, n: int, pos: np.ndarray, dirs: np.ndarray):
+    """The pairs whose first sheep is owned, limited to the ones it perceives."""
+    i, j, d = pairs
+    keep = i < n
+    i, j, d = i[keep], j[keep], d[keep]
+    if self.perception is not None:
+      keep = self.perception.mask(dirs[i], pos[j] - pos[i], d)
+      i, j, d = i[keep], j[keep], d[keep]
+    return i, j, d
+
+
+def _serve(conn, cfg: SimulationConfig, shm: SharedMemory, num_sheep: int, seed: np.random.SeedSequence) -> None:
+  """Worker process: runs Tile.step for every job received until None or the pipe closes."""
+  flock = SharedFlock(num_sheep, cfg.precision, shm)
+  tile = Tile(cfg, flock, seed)
+  try:
+    while True:
+      try:
+        job = conn.recv()
+      except EOFError:
+        break
+      if job is None:
+        break
+      try:
+        conn.send(tile.step(*job))
+      except Exception as exc:
+        conn.send(exc)
+  finally:
+    tile = None
+    flock.release()
+
+
+def _shutdown(conns, procs, shm: SharedMemory) -> None:
+  for conn in conns:
+    try:
+      conn.send(None)
+      conn.close()
+    except OSError:
+      pass
+  for p in procs:
+    p.join(timeout=5)
+    if p.is_alive():
+      p.terminate()
+  shm.unlink()
+  try:
+    shm.close()
+  except BufferError:
+    pass
+
+
+class SharedKinematics(FlockKinematics):
+  """FlockKinematics over the direction buffer the tiles write (speed follows from it)."""
+
+  def __init__(self, vel: np.ndarray, direction: np.ndarray):
+    self.vel = vel
+    self.direction = direction
+    self._heading = None
+
+  def refresh(self) -> None:
+    self.direction[:] = unit_vectors(self.vel)[0]
+    self._heading = None
+
+  @property
+  def speed(self) -> np.ndarray:
+    return np.where(self.direction.any(axis=1), SPEED_CONST, 0.0)
+
+
+class ParallelSimulation(ArraySimulation):
+  """
+  ArraySimulation with the sheep moved by cfg.workers processes, one strip of the field each
+  (see the top of this module). Only the euler integrator and the synchronous ordering are
+  supported, and a limited sheep view cone needs a finite sheep_vision_radius. With workers == 1
+  the strip is run in-process. Call close() (or drop the simulation) to stop the workers and free
+  the shared memory.
+  """
+  process_shared = True
+  default_ordering = "synchronous"
+
+  def __init__(self, simCfg: SimulationConfig, collect_metrics=True, seed: int = 42,
+               profiler: Optional[SimulationProfiler] = None):
+    super().__init__(simCfg, collect_metrics=collect_metrics, seed=seed, profiler=profiler)
+    if simCfg.integrator != "euler":
+      raise ValueError("The parallel engine only supports the euler integrator")
+    if self.ordering != "synchronous":
+      raise ValueError("The parallel engine only supports ordering = 'synchronous'")
+    if self.sheep_perception is not None and self.sheep_perception.radius is None:
+      raise ValueError("The parallel engine needs a finite sheep_vision_radius with a limited view cone")
+    num_workers = simCfg.workers or os.cpu_count() or 1
+    if num_workers < 1:
+      raise ValueError("workers must be at least 1")
+
+    # move the initial state into shared memory
+    a = self.arrays
+    self.flock = SharedFlock(simCfg.num_sheep, self.dtype, process_shared=self.process_shared)
+    self.flock.get("pos", 0)[:] = a.pos
+    self.flock.get("vel", 0)[:] = a.vel
+    self.flock.get("direction", 0)[:] = self.kinematics.direction
+    for name in FORCES:
+      self.flock.get(name)[:] = getattr(a, name)
+      setattr(a, name, self.flock.get(name))
+    self.cur = 0
+    self._bind()
+
+    self.flock.order[:] = np.arange(simCfg.num_sheep)
+    self.edges = np.full(num_workers + 1, np.inf)  # set every tick by strip_rows
+    self.edges[0] = -np.inf
+    self.halo = halo_width(simCfg)
+    self.tiles: List[Tile] = []
+    self._start_workers(np.random.SeedSequence(seed).spawn(num_workers))
+
+  @property
+  def num_workers(self) -> int:
+    return len(self.edges) - 1
+
+  def _bind(self) -> None:
+    """Points the FlockArrays fields and the kinematics at the current buffers."""
+    a = self.arrays
+    a.pos = self.flock.get("pos", self.cur)
+    a.vel = self.flock.get("vel", self.cur)
+    self.kinematics = SharedKinematics(a.vel, self.flock.get("direction", self.cur))
+
+  def close(self) -> None:
+    self._finalizer()
+
+  # ---------- workers ----------
+
+  def _start_workers(self, seeds: List[np.random.SeedSequence]) -> None:
+    self.conns = []
+    self.procs = []
+    if len(seeds) == 1:
+      self.tiles.append(Tile(self.cfg, self.flock, seeds[0]))
+    else:
+      ctx = get_context()
+      for seed in seeds:
+        parent, child = ctx.Pipe()
+        p = ctx.Process(target=_serve, args=(child, self.cfg, self.flock.shm, self.cfg.num_sheep, seed), daemon=True)
+        p.start()
+        child.close()
+        self.conns.append(parent)
+        self.procs.append(p)
+    self._finalizer = weakref.finalize(self, _shutdown, self.conns, self.procs, self.flock.shm)
+
+  def _submit(self, jobs: List[tuple]) -> None:
+    """Starts the strip steps of one tick; _collect() waits for them."""
+    self._jobs = jobs
+    for conn, job in zip(self.conns, jobs):
+      conn.send(job)
+
+  def _collect(self) -> List[dict]:
+    if self.tiles:
+      return [tile.step(*job) for tile, job in zip(self.tiles, self._jobs)]
+    results = [conn.recv() for conn in self.conns]
+    for r in results:
+      if isinstance(r, BaseException):
+        raise r
+    return results
+
+  def update(self, dt: float) -> None:
+    prof = self.profiler
+    if prof is not None:
+      own_tick = prof.current is None
+      if own_tick:
+        prof.begin_tick(prof.num_ticks)
+      clock = prof.clock
+      t0 = clock()
+
+    cfg = self.cfg
+    a = self.arrays
+    dog = a.dog_pos[0].copy() if len(a.dog_pos) else None
+    self.edges, rows = strip_rows(a.pos[:, 0], self.flock.order, self.num_workers, self.halo)
+    if prof is not None:
+      t_strips = clock()
+      prof.add_time("strips", t_strips - t0)
+      t0 = t_strips
+    self._submit([(self.cur, tuple(rows[k].tolist()), float(self.edges[k]), float(self.edges[k + 1]), dog, dt)
+                  for k in range(self.num_workers)])
+
+    # the dogs, on the start-of-tick state, while the workers move the sheep
+    if self.dog_perception is not None:
+      self.dog_index = self.dog_perception.make_index(a.pos)
+    for _ in range(max(1, cfg.dog_substeps)):
+      for k in range(len(a.dog_pos)):
+        self.update_dog(k, dt)
+        if prof is not None and self.dog_modes[k] is not None:
+          prof.count(f"dog_{self.dog_modes[k]}")
+    if prof is not None:
+      t1 = clock()
+      prof.add_time("dog", t1 - t0)
+
+    results = self._collect()
+    self.cur = 1 - self.cur
+    self._bind()
+
+    if prof is not None:
+      prof.add_time("tiles", clock() - t1)
+      prof.count("repulsion_hits", sum(r["repulsion_hits"] for r in results))
+      prof.count("migrations", sum(r["migrations"] for r in results))
+      prof.count("max_tile_sheep", max(r["owned"] for r in results))
+      if own_tick:
+        prof.end_tick()
+
+
+class ThreadedSimulation(ParallelSimulation):
+  """
+  The strips of ParallelSimulation evaluated by a pool of cfg.workers threads (engine =
+  "threaded"), in ordinary memory. Tile.step spends its time in NumPy calls over whole strips,
+  which release the GIL; every strip has its own random generator and writes only its own rows,
+  so the threads share no mutable Python state.
+  """
+  process_shared = False
+
+  def _start_workers(self, seeds: List[np.random.SeedSequence]) -> None:
+    self.tiles = [Tile(self.cfg, self.flock, seed) for seed in seeds]
+    # a pool even for one strip, so the dogs are updated while it runs
+    self.pool = ThreadPoolExecutor(len(seeds), thread_name_prefix="tile")
+    self._futures = []
+    self._finalizer = weakref.finalize(self, self.pool.shutdown)
+
+  def _submit(self, jobs: List[tuple]) -> None:
+    self._futures = [self.pool.submit(tile.step, *job) for tile, job in zip(self.tiles, jobs)]
+
+  def _collect(self) -> List[dict]:
+    return [f.result() for f in self._futures]
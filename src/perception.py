@@ -0,0 +1,100 @@
+import math
+from typing import List, Optional
+
+import numpy as np
+
+from agents import Agent
+from spatial import GridIndex
+
+
+class Perception:
+  """
+  Limited senses: an agent perceives another agent only if it is closer than `radius` and
+  inside the view cone, |agent.viewing_angle_to(other)| <= half_angle. radius None means
+  unlimited range, half_angle >= pi all-around vision. An agent at rest has no heading and
+  senses all around.
+
+  Range-limited queries take their candidates from a GridIndex with cell size ~ radius, so an
+  agent only examines the agents of nearby cells instead of the whole flock.
+  """
+
+  def __init__(self, radius: float | None = None, half_angle: float = math.pi):
+    if radius is not None and radius <= 0:
+      raise ValueError("vision radius must be positive")
+    self.radius = radius
+    self.half_angle = half_angle
+    self.cos_half_angle = math.cos(min(half_angle, math.pi))
+
+  @property
+  def limited_cone(self) -> bool:
+    return self.half_angle < math.pi
+
+  def make_index(self, positions: np.ndarray) -> GridIndex | None:
+    """Index over `positions` for visible(); None without a range limit."""
+    if self.radius is None:
+      return None
+    return GridIndex(positions, self.radius)
+
+  # ---------- object engines ----------
+
+  def sees(self, agent: Agent, other: Agent) -> bool:
+    if self.radius is not None and math.hypot(other.x - agent.x, other.y - agent.y) >= self.radius:
+      return False
+    if not self.limited_cone or agent.speed == 0.0:
+      return True
+    return abs(agent.viewing_angle_to(other)) <= self.half_angle
+
+  def candidate_lists(self, positions: np.ndarray, margin: float = 0.0) -> List[List[int]] | None:
+    """
+    For every point of `positions`, the indices of the other points within radius + margin
+    (ascending), found with one vectorized pair search. None without a range limit.
+    """
+    if self.radius is None:
+      return None
+    n = len(positions)
+    i, j, _ = GridIndex(positions, self.radius + margin).pairs_within(self.radius + margin)
+    order = np.lexsort((j, i))
+    bounds = np.cumsum(np.bincount(i, minlength=n))[:-1]
+    return [part.tolist() for part in np.split(j[order], bounds)]
+
+  def visible(self, agent: Agent, others: List[Agent], index: GridIndex | None = None,
+              margin: float = 0.0, exclude: Optional[Agent] = None,
+              candidates: List[int] | None = None) -> List[Agent]:
+    """
+    The agents of `others` that `agent` perceives, in list order. Candidates are the indices
+    `candidates` if given, else the result of querying `index` (built over the positions of
+    `others`), else all of `others`. `margin` widens the index query by how far the agents may
+    have moved since it was built; the exact test always uses the current positions.
+    """
+    if candidates is not None:
+      pool = [others[k] for k in candidates]
+    elif index is not None:
+      found = index.query_radius((agent.x, agent.y), self.radius + margin)
+      pool = [others[k] for k in np.sort(found).tolist()]
+    else:
+      pool = others
+    return [o for o in pool if o is not exclude and self.sees(agent, o)]
+
+  # ---------- array engines ----------
+
+  def mask(self, direction: np.ndarray, rel: np.ndarray, dist: np.ndarray) -> np.ndarray:
+    """
+    Vectorized sees(): row m tests an observer with unit heading direction[m] (zero = at rest)
+    against an agent at offset rel[m] and distance dist[m].
+    """
+    keep = np.ones(len(dist), dtype=bool)
+    if self.radius is not None:
+      keep &= dist < self.radius
+    if self.limited_cone:
+      # angle(direction, rel) <= half_angle  <=>  direction . rel >= cos(half_angle) |rel|
+      dot = np.einsum("ij,ij->i", direction, rel)
+      at_rest = ~direction.any(axis=1)
+      keep &= at_rest | (dot >= self.cos_half_angle * dist)
+    return keep
+
+
+def make_perception(radius: float | None, half_angle: float) -> Perception | None:
+  """Perception for the config values, or None when they do not limit anything."""
+  if radius is None and half_angle >= math.pi:
+    return None
+  return Perception(radius, half_angle)
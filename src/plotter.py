@@ -1,10 +1,13 @@
 import os
 from typing import Sequence, List, Tuple, Optional
 import math
-import matplotlib.pyplot as plt
 
+from lazy import lazy_import
 from simulation_state import SimulationState
 
+# matplotlib is only imported when the first plot is drawn
+plt = lazy_import("matplotlib.pyplot")
+
 
 
 # ---------- 1) Cohesion ----------
@@ -289,4 +292,43 @@ def plot_all_metrics(
 
     # 5) Dog rear distance
     plot_dog_rear_distance_time(states, path("dog_rear_distance_time"))
-    plot_dog_rear_distance_hist(states, path("dog_rear_distance_hist"))
\ No newline at end of file
+    plot_dog_rear_distance_hist(states, path("dog_rear_distance_hist"))
+
+# ---------- Time to target (time_to_target.py) ----------
+
+def plot_time_to_target(rows: Sequence[dict], out_path: Optional[str] = None) -> None:
+    """
+    Grouped bars of the restricted mean time to target per flock size, one bar per number of
+    dogs, with bootstrap CIs and the fraction of trials that arrived above each bar.
+    """
+    if not rows:
+        return
+
+    sheep_counts = sorted({r["num_sheep"] for r in rows})
+    dog_counts = sorted({r["num_shepherds"] for r in rows})
+    width = 0.8 / len(dog_counts)
+
+    plt.figure()
+    for k, dogs in enumerate(dog_counts):
+        cells = {r["num_sheep"]: r for r in rows if r["num_shepherds"] == dogs}
+        xs = [i + (k - (len(dog_counts) - 1) / 2) * width for i in range(len(sheep_counts))]
+        mean = [cells[n]["restricted_mean"] for n in sheep_counts]
+        err = [[m - cells[n]["restricted_mean_lo"] for n, m in zip(sheep_counts, mean)],
+               [cells[n]["restricted_mean_hi"] - m for n, m in zip(sheep_counts, mean)]]
+        plt.bar(xs, mean, width, yerr=err, capsize=3,
+                label=f"{dogs} shepherd" + ("s" if dogs != 1 else ""))
+        for x, n, m in zip(xs, sheep_counts, mean):
+            plt.text(x, m, f"{cells[n]['arrived']}/{cells[n]['trials']}", ha="center", va="bottom", fontsize=7)
+
+    plt.xticks(range(len(sheep_counts)), [str(n) for n in sheep_counts])
+    plt.xlabel("Number of sheep")
+    plt.ylabel("Restricted mean time to target [ticks]")
+    plt.title("Time to target (95% bootstrap CI, arrived/trials)")
+    plt.legend()
+    plt.grid(True, axis="y", alpha=0.3)
+    plt.tight_layout()
+    if out_path is None:
+        plt.show()
+    else:
+        plt.savefig(out_path, dpi=300)
+    plt.close()
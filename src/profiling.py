@@ -0,0 +1,116 @@
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+# Phases of Simulation.update / Simulation.steps in the order they run.
+PHASES = ("activity", "neighbors", "social", "dog_repulsion", "dog", "noise", "move", "metrics")
+
+
+@dataclass
+class TickProfile:
+  tick: int
+  times: Dict[str, float] = field(default_factory=dict)     # seconds spent per phase
+  counters: Dict[str, int] = field(default_factory=dict)    # e.g. neighbor_candidates, repulsion_hits
+
+  @property
+  def total(self) -> float:
+    return sum(self.times.values())
+
+
+class SimulationProfiler:
+  """
+  Collects per-phase wall-clock timers and event counters for a Simulation.
+
+  Attach with Simulation(cfg, profiler=SimulationProfiler()) or sim.profiler = ...
+  Hooks registered with add_hook() are called with the finished TickProfile
+  at the end of every tick; summary()/report() aggregate over the whole run.
+  """
+
+  def __init__(self, keep_ticks: bool = True, clock: Callable[[], float] = time.perf_counter):
+    self.clock = clock
+    self.keep_ticks = keep_ticks
+    self.hooks: List[Callable[[TickProfile], None]] = []
+
+    self.ticks: List[TickProfile] = []
+    self.totals: Dict[str, float] = {}
+    self.counters: Dict[str, int] = {}
+    self.num_ticks = 0
+    self.current: Optional[TickProfile] = None
+
+  def add_hook(self, hook: Callable[[TickProfile], None]) -> None:
+    self.hooks.append(hook)
+
+  def remove_hook(self, hook: Callable[[TickProfile], None]) -> None:
+    self.hooks.remove(hook)
+
+  def reset(self) -> None:
+    self.ticks = []
+    self.totals = {}
+    self.counters = {}
+    self.num_ticks = 0
+    self.current = None
+
+  # --- recording (called by the simulation) ---
+
+  def begin_tick(self, tick: int) -> None:
+    self.current = TickProfile(tick=tick)
+
+  def add_time(self, phase: str, seconds: float) -> None:
+    times = self.current.times
+    times[phase] = times.get(phase, 0.0) + seconds
+
+  def count(self, name: str, n: int = 1) -> None:
+    counters = self.current.counters
+    counters[name] = counters.get(name, 0) + n
+
+  def end_tick(self) -> TickProfile:
+    profile = self.current
+    self.current = None
+    self.num_ticks += 1
+    for phase, seconds in profile.times.items():
+      self.totals[phase] = self.totals.get(phase, 0.0) + seconds
+    for name, n in profile.counters.items():
+      self.counters[name] = self.counters.get(name, 0) + n
+    if self.keep_ticks:
+      self.ticks.append(profile)
+    for hook in self.hooks:
+      hook(profile)
+    return profile
+
+  # --- reporting ---
+
+  def summary(self) -> dict:
+    total = sum(self.totals.values())
+    ticks = max(self.num_ticks, 1)
+    phases = {}
+    for phase in self._ordered_phases():
+      seconds = self.totals[phase]
+      phases[phase] = {
+        "total_s": seconds,
+        "per_tick_ms": 1000.0 * seconds / ticks,
+        "share": seconds / total if total > 0 else 0.0,
+      }
+    return {
+      "ticks": self.num_ticks,
+      "total_s": total,
+      "phases": phases,
+      "counters": dict(self.counters),
+      "counters_per_tick": {k: v / ticks for k, v in self.counters.items()},
+    }
+
+  def report(self) -> str:
+    s = self.summary()
+    lines = [f"Profile over {s['ticks']} ticks, {s['total_s']:.3f} s instrumented"]
+    lines.append(f"  {'phase':<16}{'total [s]':>12}{'ms/tick':>12}{'share':>9}")
+    for phase, p in s["phases"].items():
+      lines.append(f"  {phase:<16}{p['total_s']:>12.4f}{p['per_tick_ms']:>12.3f}{p['share'] * 100:>8.1f}%")
+    if s["counters"]:
+      lines.append(f"  {'counter':<28}{'total':>12}{'per tick':>12}")
+      for name in sorted(s["counters"]):
+        lines.append(f"  {name:<28}{s['counters'][name]:>12}{s['counters_per_tick'][name]:>12.1f}")
+    return "\n".join(lines)
+
+  def _ordered_phases(self) -> List[str]:
+    known = [p for p in PHASES if p in self.totals]
+    extra = sorted(p for p in self.totals if p not in PHASES)
+    return known + extra
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Tuple
+
+from config_io import RunOptions, config_to_dict
+from engines import ENGINE_VERSION
+from simulation import SimulationConfig
+
+# Content-addressed store of finished runs. A run with a fixed seed is fully determined by its
+# config, run options and the engine version, so the canonical hash of those identifies it:
+#   <root>/<key[:2]>/<key>/key.json        the hashed document (for inspection)
+#   <root>/<key[:2]>/<key>/summary.json    runner.run() summary
+#   <root>/<key[:2]>/<key>/trajectory/     optional trajectory store (trajectory_store.py)
+# Entries are written to a temporary directory and renamed into place, so concurrent sweep
+# workers never see half-written entries. The least recently used entries are evicted once
+# the store grows beyond max_bytes.
+
+DEFAULT_ROOT = os.path.join(os.path.expanduser("~"), ".cache", "sheep-herding", "runs")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+def run_key_document(cfg: SimulationConfig, opts: RunOptions, extra: dict | None = None) -> dict:
+  """`extra` distinguishes results of other drivers over the same run (e.g. a study's stop rule)."""
+  doc = {
+    "config": config_to_dict(cfg),
+    "seed": opts.seed,
+    "steps": opts.steps,
+    "dt": opts.dt,
+    "collect_metrics": opts.collect_metrics,
+    "engine_version": ENGINE_VERSION,
+  }
+  if extra:
+    doc["extra"] = extra
+  return doc
+
+
+def run_key(cfg: SimulationConfig, opts: RunOptions, extra: dict | None = None) -> str:
+  """sha256 of the canonical JSON of the config, run options and engine version."""
+  doc = json.dumps(run_key_document(cfg, opts, extra), sort_keys=True, separators=(",", ":"))
+  return hashlib.sha256(doc.encode("utf-8")).hexdigest()
+
+
+def _tree_size(path: str) -> int:
+  total = 0
+  for root, _, files in os.walk(path):
+    for name in files:
+      total += os.path.getsize(os.path.join(root, name))
+  return total
+
+
+class RunCache:
+  def __init__(self, root: str | None = None, max_bytes: int = DEFAULT_MAX_BYTES):
+    self.root = root or os.environ.get("SHEEP_RUN_CACHE", DEFAULT_ROOT)
+    self.max_bytes = max_bytes
+    os.makedirs(self.root, exist_ok=True)
+
+  def entry_dir(self, key: str) -> str:
+    return os.path.join(self.root, key[:2], key)
+
+  def trajectory_dir(self, key: str) -> str | None:
+    path = os.path.join(self.entry_dir(key), "trajectory")
+    return path if os.path.isdir(path) else None
+
+  def get(self, cfg: SimulationConfig, opts: RunOptions, need_trajectory: bool = False,
+          extra: dict | None = None) -> Tuple[str, Dict | None]:
+    """(key, cached summary or None); a hit marks the entry as recently used."""
+    key = run_key(cfg, opts, extra)
+    path = os.path.join(self.entry_dir(key), "summary.json")
+    if not os.path.exists(path) or (need_trajectory and self.trajectory_dir(key) is None):
+      return key, None
+    try:
+      with open(path) as f:
+        summary = json.load(f)
+    except (OSError, ValueError):
+      return key, None
+    os.utime(path)  # LRU clock
+    return key, summary
+
+  def staging_dir(self) -> str:
+    """Empty directory to build an entry in, before put()."""
+    return tempfile.mkdtemp(prefix=".staging-", dir=self.root)
+
+  def put(self, cfg: SimulationConfig, opts: RunOptions, summary: Dict, staging: str | None = None,
+          extra: dict | None = None) -> str:
+    """Stores `summary` (and whatever was written to `staging`, e.g. trajectory/); returns the key."""
+    key = run_key(cfg, opts, extra)
+    staging = staging or self.staging_dir()
+    with open(os.path.join(staging, "key.json"), "w") as f:
+      json.dump(run_key_document(cfg, opts, extra), f, indent=2, sort_keys=True)
+    with open(os.path.join(staging, "summary.json"), "w") as f:
+      json.dump(summary, f, indent=2)
+    target = self.entry_dir(key)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.exists(target):
+      # an identical run finished first (or an entry without trajectory is upgraded)
+      shutil.rmtree(target, ignore_errors=True)
+    try:
+      os.replace(staging, target)
+    except OSError:
+      shutil.rmtree(staging, ignore_errors=True)
+    self.evict(keep=target)
+    return key
+
+  def entries(self) -> List[Tuple[float, int, str]]:
+    """(last use, size in bytes, directory) of every entry."""
+    out = []
+    for prefix in os.listdir(self.root):
+      prefix_dir = os.path.join(self.root, prefix)
+      if prefix.startswith(".") or not os.path.isdir(prefix_dir):
+        continue
+      for key in os.listdir(prefix_dir):
+        entry = os.path.join(prefix_dir, key)
+        summary = os.path.join(entry, "summary.json")
+        if os.path.exists(summary):
+          out.append((os.path.getmtime(summary), _tree_size(entry), entry))
+    return out
+
+  def size(self) -> int:
+    return sum(size for _, size, _ in self.entries())
+
+  def evict(self, keep: str | None = None) -> int:
+    """Removes least recently used entries (except `keep`) until the store fits max_bytes; returns how many."""
+    entries = sorted(self.entries())
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, entry in entries:
+      if total <= self.max_bytes:
+        break
+      if entry == keep:
+        continue
+      shutil.rmtree(entry, ignore_errors=True)
+      total -= size
+      removed += 1
+    return removed
+
+  def clear(self) -> None:
+    shutil.rmtree(self.root, ignore_errors=True)
+    os.makedirs(self.root, exist_ok=True)
+
+
+def cached_run(cfg: SimulationConfig, opts: RunOptions, cache: RunCache | None = None,
+               trajectory: bool = False) -> Tuple[Dict, str | None]:
+  """
+  runner.run() through the cache: returns (summary, trajectory directory or None). A miss runs
+  the simulation (storing the trajectory too if asked) and adds it to the cache.
+  """
+  import runner
+  from sinks import TrajectorySink
+
+  cache = cache or RunCache()
+  key, summary = cache.get(cfg, opts, need_trajectory=trajectory)
+  if summary is not None:
+    return summary, cache.trajectory_dir(key)
+
+  staging = cache.staging_dir()
+  sinks = []
+  if trajectory:
+    meta = {"config": config_to_dict(cfg), "seed": opts.seed, "dt": opts.dt, "steps": opts.steps}
+    sinks.append(TrajectorySink(os.path.join(staging, "trajectory"), meta=meta, dtype=cfg.precision))
+  try:
+    summary = runner.run(cfg, opts, sinks)
+  except BaseException:
+    shutil.rmtree(staging, ignore_errors=True)
+    raise
+  key = cache.put(cfg, opts, summary, staging)
+  return summary, cache.trajectory_dir(key)
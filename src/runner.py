@@ -0,0 +1,74 @@
+import dataclasses
+import itertools
+import math
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from simulation import SimulationConfig
+from engines import make_simulation
+from config_io import RunOptions
+from sinks import Sink
+
+
+def run(cfg: SimulationConfig, opts: RunOptions, sinks: Sequence[Sink] = (), profiler=None) -> Dict[str, float]:
+  """Runs one simulation, streams every state into `sinks` and returns summary statistics."""
+  sim = make_simulation(cfg, collect_metrics=opts.collect_metrics, seed=opts.seed, profiler=profiler)
+  for sink in sinks:
+    sink.attach(sim)
+  sums = {"cohesion": 0.0, "polarization": 0.0, "elongation": 0.0}
+  count = 0
+  start = time.perf_counter()
+  try:
+    for state in sim.steps(opts.steps, dt=opts.dt):
+      for sink in sinks:
+        sink.write(state)
+      if opts.collect_metrics:
+        count += 1
+        for name in sums:
+          sums[name] += getattr(state, name)
+  finally:
+    for sink in sinks:
+      sink.close()
+  elapsed = time.perf_counter() - start
+
+  summary = {
+    "seed": opts.seed,
+    "steps": opts.steps,
+    "seconds": elapsed,
+    "seconds_per_tick": elapsed / max(opts.steps, 1),
+  }
+  for name, total in sums.items():
+    summary[f"mean_{name}"] = total / count if count else math.nan
+  return summary
+
+
+def sweep_points(cfg: SimulationConfig, opts: RunOptions, sweep: Dict[str, list]) -> List[Tuple[SimulationConfig, RunOptions, dict]]:
+  """Cartesian product of the sweep values; `seed` sweeps the run seed, any other key a config field."""
+  names = list(sweep)
+  points = []
+  for values in itertools.product(*(sweep[n] for n in names)):
+    params = dict(zip(names, values))
+    point_opts = dataclasses.replace(opts, seed=params.get("seed", opts.seed))
+    cfg_values = {k: v for k, v in params.items() if k != "seed"}
+    for name in ("field_size", "goal_pos"):
+      if isinstance(cfg_values.get(name), list):
+        cfg_values[name] = tuple(cfg_values[name])
+    points.append((dataclasses.replace(cfg, **cfg_values), point_opts, params))
+  return points
+
+
+def run_sweep_point(point: Tuple[SimulationConfig, RunOptions, dict]) -> dict:
+  """Worker entry point for sweeps (module level so it can be pickled)."""
+  cfg, opts, params = point
+  row = dict(params)
+  row.update(run(cfg, opts))
+  return row
+
+
+def run_sweep_point_cached(point: Tuple[SimulationConfig, RunOptions, dict]) -> dict:
+  """run_sweep_point through the run cache (root from $SHEEP_RUN_CACHE or the default)."""
+  from run_cache import cached_run
+  cfg, opts, params = point
+  row = dict(params)
+  row.update(cached_run(cfg, opts)[0])
+  return row
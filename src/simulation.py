@@ -1,11 +1,29 @@
 import dataclasses
 import random
-import time
 import math
-import os
 from typing import *
 from agents import *
 from simulation_state import SimulationState
+from profiling import SimulationProfiler
+from integrators import make_integrator
+from activity import ActivityTracker
+from flock_stats import FlockStats
+from extremal import ExtremalQuery, VECTORIZE_MIN_SHEEP
+from perception import make_perception
+
+
+class _Others(Sequence):
+  """The sheep of `sheep` but the i-th, in order, without copying the list (random.sample picks the same ones)."""
+
+  def __init__(self, sheep: List[Sheep], i: int):
+    self.sheep = sheep
+    self.i = i
+
+  def __len__(self) -> int:
+    return len(self.sheep) - 1
+
+  def __getitem__(self, k: int) -> Sheep:
+    return self.sheep[k if k < self.i else k + 1]
 
 
 @dataclasses.dataclass
@@ -41,11 +59,52 @@ class SimulationConfig:
   pc: float  # collecting offset (pc)
   pd: float  # driving offset (pd)
 
+  # time integration of the sheep (see integrators.py): "euler", "substep" or "multirate"
+  integrator: str = "euler"
+  substeps: int = 4  # sub-steps per tick for "substep" / interacting sheep in "multirate"
+  substep_budget: int | None = None  # max extra sub-steps per tick for "multirate" (None = unbounded)
+
+  # quiescent-sheep optimisation (see activity.py); None disables it
+  sleep_tolerance: float | None = None  # max change of the social force for a sheep to fall asleep
+  sleep_interval: int = 10  # sleeping sheep are fully re-evaluated every sleep_interval ticks
+  sleep_wake_radius: float | None = None  # awake sheep within this distance wake a sleeper (default 2 * d_rep)
+
+  # engine (see engines.py): "object" = agents.py reference, "array" = vectorized engine.py,
+  # "parallel" / "threaded" = engine.py rules split over worker processes / threads (parallel_engine.py)
+  engine: str = "object"
+  # dtype of the array engine state and of stored trajectory snapshots: "float64" or "float32"
+  precision: str = "float64"
+  # array engines only: order of the updates within a tick. "synchronous" (the default) = all
+  # forces and dog decisions from the start-of-tick state, "sequential" = the object engine's
+  # (sheep one after another, every dog updated once per sheep; array engine only, several
+  # times slower, see engine.py); None = "synchronous"
+  ordering: str | None = None
+  # synchronous ordering only: dog updates per tick
+  dog_substeps: int = 1
+
+  # perception (see perception.py): vision radius (None = unlimited) and half-angle of the view
+  # cone in radians (pi = all around). Sheep always feel the dog repulsion within d_dog.
+  sheep_vision_radius: float | None = None
+  sheep_view_angle: float = math.pi
+  dog_vision_radius: float | None = None
+  dog_view_angle: float = math.pi
+
+  # engine = "parallel" / "threaded" (see parallel_engine.py): worker processes / threads, each
+  # owning one strip of the field (None = one per CPU)
+  workers: int | None = None
+
+  # array engine kernels (see kernels.py): "numpy", or "numba" for compiled rule kernels (falls
+  # back to numpy when numba is not installed)
+  kernels: str = "numpy"
 
 
 class Simulation:
-  def __init__(self, simCfg: SimulationConfig, collect_metrics=True, seed: int = 42):
+  def __init__(self, simCfg: SimulationConfig, collect_metrics=True, seed: int = 42,
+               profiler: Optional[SimulationProfiler] = None):
     self.collect_metrics = collect_metrics
+    # optional SimulationProfiler; None keeps update() free of timing overhead
+    self.profiler = profiler
+    self.integrator = make_integrator(simCfg.integrator, simCfg.substeps, simCfg.substep_budget)
     random.seed(seed)
 
     self.cfg = simCfg
@@ -53,144 +112,283 @@ class Simulation:
     self.shepherds = [Dog(random.uniform(0, simCfg.field_size[0]), random.uniform(0, simCfg.field_size[1])) for _ in
                       range(simCfg.num_shepherds)]
 
+    # running centroid / mean velocity / polarization shared by the dogs, metrics and stop conditions
+    self.stats = FlockStats(self.sheep)
+    # farthest / nearest / projection extremes shared by the dogs and the metrics
+    self.extremal = ExtremalQuery(self.sheep)
+
+    self.activity = None
+    if simCfg.sleep_tolerance is not None:
+      wake_radius = simCfg.sleep_wake_radius if simCfg.sleep_wake_radius is not None else 2.0 * simCfg.d_rep
+      self.activity = ActivityTracker(simCfg.num_sheep, simCfg.sleep_tolerance, simCfg.sleep_interval, wake_radius)
+
+    # None = the agents sense the whole flock
+    self.sheep_perception = make_perception(simCfg.sheep_vision_radius, simCfg.sheep_view_angle)
+    self.dog_perception = make_perception(simCfg.dog_vision_radius, simCfg.dog_view_angle)
+
+    # EventRecorder told about every dog decision (events.py); None = not recorded
+    self.dog_events = None
+
+    # terminal renderer of draw(), created on first use
+    self._renderer = None
+
   def run(self, steps: int = 100, dt: float = 1.0, delay: float = 0.1):
+    """Runs in the terminal, one frame every `delay` seconds of wall-clock time (terminal_renderer.py)."""
+    from terminal_renderer import run_in_terminal
     print("Starting simulation...")
-    for step in range(steps):
-      self.update(dt)
-      self.draw()
-      print(f"Step {step + 1}")
-      time.sleep(delay)
+    run_in_terminal(self, steps, dt, frame_time=delay)
     print("Simulation finished.")
 
-  def steps(self, steps=100, dt=1.0):
+  def steps(self, steps=100, dt=1.0, stop_when: Optional[Callable[['Simulation'], bool]] = None):
+    """
+    Yields one SimulationState per tick. If `stop_when(sim)` is true at the start of a tick
+    (e.g. `lambda sim: sim.goal_reached()`), that state is the last one yielded.
+    """
     accum = 0.0
-    for step in range(steps):
-      state = SimulationState(
-        tick=step,
-        time=accum,
-
-        bounds=self.cfg.field_size,
-
-        sheep=self.sheep,
-        dogs=self.shepherds,
-        barycenter=None,
-        velocity=None,
-        direction=None,
-        perp_direction=None,
-        cohesion=None,
-        polarization=None,
-        elongation=None,
-        dog_offsets=None,
-        dog_rear_distance=None,
-      )
-
-      if self.collect_metrics:
-        state.barycenter = self.calculate_barycenter()
-        state.velocity = self.calculate_group_velocity()
-        state.direction = self.calculate_group_direction()
-        state.perp_direction = self.calculate_group_perp_direction()
-        state.cohesion = self.calculate_group_cohesion()
-        state.polarization = self.calculate_group_polarization()
-        state.elongation = self.calculate_group_elongation()
-        state.dog_offsets = self.calculate_dog_offsets()
-        state.dog_rear_distance = self.calculate_dog_rear_distance()
-
-      accum += dt
-      self.update(dt)
-
-      yield state
+    prof = self.profiler
+    try:
+      for step in range(steps):
+        state = SimulationState(
+          tick=step,
+          time=accum,
+
+          bounds=self.cfg.field_size,
+
+          sheep=self.sheep,
+          dogs=self.shepherds,
+          barycenter=None,
+          velocity=None,
+          direction=None,
+          perp_direction=None,
+          cohesion=None,
+          polarization=None,
+          elongation=None,
+          dog_offsets=None,
+          dog_rear_distance=None,
+        )
+
+        if prof is not None:
+          prof.begin_tick(step)
+          t0 = prof.clock()
+
+        if self.collect_metrics:
+          state.barycenter = self.calculate_barycenter()
+          state.velocity = self.calculate_group_velocity()
+          state.direction = self.calculate_group_direction()
+          state.perp_direction = self.calculate_group_perp_direction()
+          state.cohesion = self.calculate_group_cohesion()
+          state.polarization = self.calculate_group_polarization()
+          state.elongation = self.calculate_group_elongation()
+          state.dog_offsets = self.calculate_dog_offsets()
+          state.dog_rear_distance = self.calculate_dog_rear_distance()
+
+        if prof is not None:
+          prof.add_time("metrics", prof.clock() - t0)
+
+        # yield before updating, so positions and metrics of the state describe the same instant
+        yield state
+
+        if stop_when is not None and stop_when(self):
+          return
+
+        accum += dt
+        self.update(dt)
+
+        if prof is not None:
+          prof.end_tick()
+    finally:
+      # a consumer that stops iterating early (or a stop_when return) leaves the tick open
+      if prof is not None and prof.current is not None:
+        prof.end_tick()
 
   def update(self, dt: float) -> None:
-    for sheep in self.sheep:
-      neighbors = [s for s in self.sheep if s != sheep]
-
-      sheep.update_social(
-        neighbors,
-        wAtt=self.cfg.w_att,
-        wAli=self.cfg.w_ali,
-        wRep=self.cfg.w_rep,
-        nAtt=self.cfg.n_att,
-        nAli=self.cfg.n_ali,
-        dRep=self.cfg.d_rep,
-      )
+    prof = self.profiler
+    if prof is not None:
+      # update() called outside of steps() profiles as its own tick
+      own_tick = prof.current is None
+      if own_tick:
+        prof.begin_tick(prof.num_ticks)
+      clock = prof.clock
+      t0 = clock()
+
+    stats = self.stats
+    extremal = self.extremal
+    dog_extremal = extremal if len(self.sheep) >= VECTORIZE_MIN_SHEEP else None
+    integrator = self.integrator
+    integrator.begin_tick(self)
+
+    # perception indices over the positions at the start of the tick; sheep move at most
+    # speed_const * dt during the tick, so queries are widened by that margin
+    sheep_perception = self.sheep_perception
+    dog_perception = self.dog_perception
+    dog_index = None
+    if sheep_perception is not None or dog_perception is not None:
+      positions = [(s.x, s.y) for s in self.sheep]
+      margin = dt * max((s.speed_const for s in self.sheep), default=0.0)
+      sheep_candidates = sheep_perception.candidate_lists(positions, margin) if sheep_perception is not None else None
+      dog_index = dog_perception.make_index(positions) if dog_perception is not None else None
+
+    activity = self.activity
+    if activity is not None:
+      activity.begin_tick(self, dt)
+      awake_mask = activity.awake
+      # repulsion candidates from the activity index (start-of-tick positions; two sheep close
+      # in by at most twice one tick of motion)
+      rep_radius = self.cfg.d_rep + 2.0 * dt * max((s.speed_const for s in self.sheep), default=0.0)
+      # dog decisions owed by the sheep since the last dog update (see below)
+      owed = 0
+      if prof is not None:
+        prof.count("sleeping", len(self.sheep) - activity.num_awake)
+        t1 = clock()
+        prof.add_time("activity", t1 - t0)
+        t0 = t1
+
+    for i, sheep in enumerate(self.sheep):
+      # sleeping sheep keep their cached social forces
+      awake = activity is None or awake_mask[i]
+      rep_hits = 0
+      if awake:
+        rep_candidates = None
+        if sheep_perception is None and activity is not None:
+          # attraction samples from all the others without building the list, repulsion from the index
+          neighbors = _Others(self.sheep, i)
+          rep_candidates = [self.sheep[k] for k in activity.nearby(i, rep_radius).tolist() if k != i]
+          candidates = len(rep_candidates)
+        elif sheep_perception is None:
+          neighbors = [s for s in self.sheep if s != sheep]
+          candidates = len(self.sheep) - 1
+        else:
+          own = sheep_candidates[i] if sheep_candidates is not None else None
+          neighbors = sheep_perception.visible(sheep, self.sheep, exclude=sheep, candidates=own)
+          candidates = len(own) if own is not None else len(self.sheep) - 1
+        if prof is not None:
+          t1 = clock()
+          prof.add_time("neighbors", t1 - t0)
+          prof.count("neighbor_candidates", candidates)
+
+        rep_hits = sheep.update_social(
+          neighbors,
+          wAtt=self.cfg.w_att,
+          wAli=self.cfg.w_ali,
+          wRep=self.cfg.w_rep,
+          nAtt=self.cfg.n_att,
+          nAli=self.cfg.n_ali,
+          dRep=self.cfg.d_rep,
+          rep_neighbors=rep_candidates,
+        )
+        if prof is not None:
+          t0 = clock()
+          prof.add_time("social", t0 - t1)
+          prof.count("repulsion_hits", rep_hits)
+
       # only use first dog for now
       if self.shepherds:
         sheep.update_repulsion(self.shepherds[0], self.cfg.w_dog, self.cfg.d_dog)
       else:
-        sheep.dog_repulsion = (0.0, 0.0)
-
-      # update dog (using "previous" sheep state)
+        sheep.dog_x = sheep.dog_y = 0.0
+      if activity is not None and awake:
+        activity.record(i, sheep, rep_hits)
+      if prof is not None:
+        t1 = clock()
+        prof.add_time("dog_repulsion", t1 - t0)
+
+      # update dog (using "previous" sheep state); with sleeping sheep the dog decides only at
+      # awake sheep (and once at the end of the tick), taking the steps owed since its last
+      # decision in one move, so its distance per tick is unchanged
       if self.shepherds:
-        for dog in self.shepherds:
-          dog.update(
-            self.sheep,
-            dt=dt,
-            speed_dog=self.cfg.v_dog,
-            rad_rep_s=self.cfg.d_rep,
-            f_n=self.cfg.f_n,
-            pc=self.cfg.pc,
-            pd=self.cfg.pd,
-            noise_strength=self.cfg.e,
-            #goal_x=self.cfg.goal_pos[0],
-            #goal_y=self.cfg.goal_pos[1],
-          )
+        if activity is None:
+          self.update_dogs(dt, dog_extremal, dog_index, margin if dog_perception is not None else 0.0)
+        else:
+          owed += 1
+          if awake:
+            self.update_dogs(dt, dog_extremal, dog_index, margin if dog_perception is not None else 0.0, owed)
+            owed = 0
+      if prof is not None:
+        t0 = clock()
+        prof.add_time("dog", t0 - t1)
 
       sheep.update_noise()
-      sheep.move(dt)
+      if prof is not None:
+        t1 = clock()
+        prof.add_time("noise", t1 - t0)
+
+      old_x, old_y, old_vx, old_vy = sheep.x, sheep.y, sheep.vx, sheep.vy
+      old_direction = sheep.direction
+      k = integrator.substeps(sheep, rep_hits) if awake else 1
+      if k == 1:
+        sheep.move(dt)
+      else:
+        # sub-step: only the short-range repulsion is re-evaluated between sub-steps
+        h = dt / k
+        sheep.move(h)
+        for _ in range(k - 1):
+          sheep.update_social_repulsion(neighbors if rep_candidates is None else rep_candidates,
+                                        self.cfg.w_rep, self.cfg.d_rep)
+          if self.shepherds:
+            sheep.update_repulsion(self.shepherds[0], self.cfg.w_dog, self.cfg.d_dog)
+          sheep.move(h)
+      stats.moved(sheep, old_x, old_y, old_vx, old_vy, old_direction)
+      extremal.set(i, sheep.x, sheep.y)
+      if prof is not None:
+        t0 = clock()
+        prof.add_time("move", t0 - t1)
+        prof.count("substeps", k)
+
+    if activity is not None and self.shepherds and owed:
+      self.update_dogs(dt, dog_extremal, dog_index, margin if dog_perception is not None else 0.0, owed)
+
+    stats.end_tick()
+
+    if prof is not None and own_tick:
+      prof.end_tick()
+
+  def update_dogs(self, dt: float, dog_extremal, dog_index, margin: float, steps: int = 1) -> None:
+    """One Dog.update of every dog against the current flock, moving it `steps` steps of dt."""
+    prof = self.profiler
+    dog_perception = self.dog_perception
+    events = self.dog_events
+    for k, dog in enumerate(self.shepherds):
+      if dog_perception is None:
+        seen, centre, dog_query = self.sheep, self.stats.centroid, dog_extremal
+      else:
+        # the dog only works with the sheep it sees (no shared whole-flock summaries)
+        seen, centre, dog_query = dog_perception.visible(dog, self.sheep, dog_index, margin), None, None
+      dog.update(
+        seen,
+        dt=steps * dt,
+        speed_dog=self.cfg.v_dog,
+        rad_rep_s=self.cfg.d_rep,
+        f_n=self.cfg.f_n,
+        pc=self.cfg.pc,
+        pd=self.cfg.pd,
+        noise_strength=self.cfg.e,
+        centre=centre,
+        extremal=dog_query,
+        #goal_x=self.cfg.goal_pos[0],
+        #goal_y=self.cfg.goal_pos[1],
+      )
+      if prof is not None and dog.mode is not None:
+        prof.count(f"dog_{dog.mode}")
+      if events is not None and seen:
+        events.decided(k, dog.mode, steps)
 
   def draw(self, width=40, height=20):
-    """Draw sheep (blue) and dogs (red) as square-ish blocks in terminal."""
-    # ANSI codes for colors
-    BLUE = '\033[44m'  # blue background
-    RED = '\033[41m'  # red background
-    RESET = '\033[0m'  # reset color
-
-    # Clear terminal
-    os.system('cls' if os.name == 'nt' else 'clear')
-
-    # Create empty grid
-    grid = [[' ' for _ in range(width)] for _ in range(height)]
-    color_grid = [[RESET for _ in range(width)] for _ in range(height)]
-
-    # Helper to convert world coordinates to grid indices
-    def to_grid(x, y):
-      gx = int(x / self.cfg.field_size[0] * (width - 1))
-      gy = int(y / self.cfg.field_size[1] * (height - 1))
-      gx = max(0, min(width - 1, gx))
-      gy = max(0, min(height - 1, gy))
-      return gx, gy
-
-    # Draw sheep (blue)
-    for s in self.sheep:
-      gx, gy = to_grid(s.x, s.y)
-      grid[gy][gx] = '  '  # double-width
-      color_grid[gy][gx] = BLUE
-
-    # Draw dogs (red, overwrite if overlapping)
-    for d in self.shepherds:
-      gx, gy = to_grid(d.x, d.y)
-      grid[gy][gx] = '  '
-      color_grid[gy][gx] = RED
-
-    # Print grid row by row (top row = y=0)
-    for row_idx in reversed(range(height)):
-      row = ''.join(f"{color_grid[row_idx][col]}{grid[row_idx][col]}{RESET}" for col in range(width))
-      print(row)
+    """Draw sheep (blue) and dogs (red) as square-ish blocks in terminal, rewriting only the cells that changed."""
+    from terminal_renderer import TerminalRenderer, agent_positions
+    renderer = self._renderer
+    if renderer is None or (renderer.width, renderer.height) != (width, height):
+      renderer = self._renderer = TerminalRenderer(self.cfg.field_size, width, height)
+    renderer.draw(*agent_positions(self))
 
   def calculate_barycenter(self) -> Tuple[float, float]:
     if not self.sheep:
       raise ValueError("Cannot calculate barycenter: no sheep in simulation")
-    avg_x = sum(a.x for a in self.sheep) / len(self.sheep)
-    avg_y = sum(a.y for a in self.sheep) / len(self.sheep)
-    return (avg_x, avg_y)
+    return self.stats.centroid
 
   def calculate_group_velocity(self) -> Tuple[float, float]:
     if not self.sheep:
       raise ValueError("Cannot calculate barycenter: no sheep in simulation")
-
-    avg_x = sum(a.vx for a in self.sheep) / len(self.sheep)
-    avg_y = sum(a.vx for a in self.sheep) / len(self.sheep)
-    return (avg_x, avg_y)
+    return self.stats.mean_velocity
 
   def calculate_group_direction(self, vel=None) -> Tuple[float, float]:
     if not self.sheep:
@@ -230,9 +428,7 @@ class Simulation:
   def calculate_group_polarization(self) -> float:
     if not self.sheep:
       raise ValueError("Cannot calculate group polarization: no sheep in simulation")
-    avg_dx = sum(a.direction[0] for a in self.sheep) / len(self.sheep)
-    avg_dy = sum(a.direction[1] for a in self.sheep) / len(self.sheep)
-    return math.hypot(avg_dx, avg_dy)
+    return self.stats.polarization
 
 
   def calculate_group_elongation(self) -> float:
@@ -249,33 +445,8 @@ class Simulation:
     dir_x, dir_y = self.calculate_group_direction()
     perp_x, perp_y = self.calculate_group_perp_direction()
 
-    # projections of sheep positions onto longitudinal and lateral axes
-    first = True
-    y_min = y_max = 0.0
-    x_min = x_max = 0.0
-
-    for s in self.sheep:
-      rx = s.x - bx
-      ry = s.y - by
-
-      # along direction of motion
-      y_along = rx * dir_x + ry * dir_y
-      # across direction of motion
-      x_across = rx * perp_x + ry * perp_y
-
-      if first:
-        y_min = y_max = y_along
-        x_min = x_max = x_across
-        first = False
-      else:
-        if y_along < y_min:
-          y_min = y_along
-        if y_along > y_max:
-          y_max = y_along
-        if x_across < x_min:
-          x_min = x_across
-        if x_across > x_max:
-          x_max = x_across
+    # extremes of the projections onto the longitudinal and lateral axes
+    y_min, y_max, x_min, x_max = self.extremal.frame_extents(bx, by, dir_x, dir_y, perp_x, perp_y)
 
     length = y_max - y_min
     width = x_max - x_min
@@ -318,15 +489,10 @@ class Simulation:
 
     bx, by = self.calculate_barycenter()
     dir_x, dir_y = self.calculate_group_direction()
+    perp_x, perp_y = self.calculate_group_perp_direction()
 
-    # project sheep onto direction axis to find rear-most
-    y_min = None
-    for s in self.sheep:
-      rx = s.x - bx
-      ry = s.y - by
-      y_along = rx * dir_x + ry * dir_y
-      if y_min is None or y_along < y_min:
-        y_min = y_along
+    # rear-most sheep along the direction axis (same pass as the elongation extremes)
+    y_min, _, _, _ = self.extremal.frame_extents(bx, by, dir_x, dir_y, perp_x, perp_y)
 
     dog = self.shepherds[0]
     rx_d = dog.x - bx
@@ -339,9 +505,14 @@ class Simulation:
   def calculate_barycenter_velocity(self) -> Tuple[float, float]:
     if not self.sheep:
       raise ValueError("Cannot calculate group barycenter velocity: no sheep in simulation")
-    avg_vx = sum(s.vx for s in self.sheep) / len(self.sheep)
-    avg_vy = sum(s.vy for s in self.sheep) / len(self.sheep)
-    return avg_vx, avg_vy
+    return self.stats.mean_velocity
+
+  def goal_reached(self, tolerance: float = 40.0) -> bool:
+    """True when the flock barycenter is within `tolerance` of cfg.goal_pos."""
+    if self.cfg.goal_pos is None or not self.sheep:
+      return False
+    bx, by = self.stats.centroid
+    return math.hypot(bx - self.cfg.goal_pos[0], by - self.cfg.goal_pos[1]) < tolerance
 
 
 def flock_metrics(self):
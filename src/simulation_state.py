@@ -1,6 +1,6 @@
 import math
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import Any, List, Tuple
 
 from agents import Sheep, Dog
 
@@ -26,3 +26,5 @@ class SimulationState:
   dog_offsets: Tuple[float, float] | None
   dog_rear_distance: Tuple[float, float] | None
 
+  # array engines: the FlockArrays behind sheep/dogs (lets sinks snapshot without per-agent loops)
+  arrays: Any = None
@@ -0,0 +1,239 @@
+import csv
+import math
+import os
+from typing import Dict, List, Tuple
+
+from simulation_state import SimulationState
+
+# Flat metric columns written by the metrics sinks (tuple-valued metrics are split into _x/_y).
+METRIC_COLUMNS = (
+  "tick", "time",
+  "barycenter_x", "barycenter_y",
+  "velocity_x", "velocity_y",
+  "direction_x", "direction_y",
+  "perp_direction_x", "perp_direction_y",
+  "cohesion", "polarization", "elongation",
+  "dog_offset_x", "dog_offset_y",
+  "dog_rear_distance",
+)
+
+
+def metric_row(state: SimulationState) -> Dict[str, float]:
+  def pair(value) -> Tuple[float, float]:
+    return (math.nan, math.nan) if value is None else value
+
+  def scalar(value) -> float:
+    return math.nan if value is None else value
+
+  row = {"tick": state.tick, "time": state.time}
+  for name, value in (("barycenter", state.barycenter), ("velocity", state.velocity),
+                      ("direction", state.direction), ("perp_direction", state.perp_direction),
+                      ("dog_offset", state.dog_offsets)):
+    row[f"{name}_x"], row[f"{name}_y"] = pair(value)
+  row["cohesion"] = scalar(state.cohesion)
+  row["polarization"] = scalar(state.polarization)
+  row["elongation"] = scalar(state.elongation)
+  row["dog_rear_distance"] = scalar(state.dog_rear_distance)
+  return row
+
+
+class Sink:
+  """Consumer of the states yielded by Simulation.steps()."""
+
+  def attach(self, sim) -> None:
+    """Called with the simulation before its first state (hooks into the engine)."""
+
+  def write(self, state: SimulationState) -> None:
+    raise NotImplementedError
+
+  def close(self) -> None:
+    pass
+
+
+class TrajectorySink(Sink):
+  def __init__(self, run_dir: str, meta: dict | None = None, chunk_size: int = 256, dtype="float64", log=None):
+    from trajectory_store import TrajectoryWriter
+    self.writer = TrajectoryWriter(run_dir, meta=meta, chunk_size=chunk_size, dtype=dtype)
+    self.log = log  # EventLog receiving a checkpoint event per chunk written
+    self._tick = 0
+
+  def write(self, state: SimulationState) -> None:
+    self._tick = state.tick
+    chunks = self.writer.num_chunks
+    self.writer.append(state)
+    self._log_checkpoint(chunks)
+
+  def close(self) -> None:
+    chunks = self.writer.num_chunks
+    self.writer.close()
+    self._log_checkpoint(chunks)
+
+  def _log_checkpoint(self, chunks: int) -> None:
+    if self.log is not None and self.writer.num_chunks != chunks:
+      from events import CHECKPOINT
+      self.log.emit(self._tick, CHECKPOINT, chunks, self.writer.num_ticks)
+
+
+class MetricsCsvSink(Sink):
+  def __init__(self, path: str):
+    self.file = open(path, "w", newline="")
+    self.writer = csv.DictWriter(self.file, fieldnames=METRIC_COLUMNS)
+    self.writer.writeheader()
+
+  def write(self, state: SimulationState) -> None:
+    self.writer.writerow(metric_row(state))
+
+  def close(self) -> None:
+    self.file.close()
+
+
+class MetricsColumnarSink(Sink):
+  """Metrics stored column-wise, one array per metric, in a single .npz file."""
+
+  def __init__(self, path: str):
+    self.path = path
+    self.columns: Dict[str, List[float]] = {name: [] for name in METRIC_COLUMNS}
+
+  def write(self, state: SimulationState) -> None:
+    for name, value in metric_row(state).items():
+      self.columns[name].append(value)
+
+  def close(self) -> None:
+    import numpy as np
+    arrays = {name: np.asarray(values, dtype=np.int64 if name == "tick" else np.float64)
+              for name, values in self.columns.items()}
+    np.savez(self.path, **arrays)
+
+
+class GifSink(Sink):
+  def __init__(self, path: str, field_size: Tuple[int, int], fps: int = 10, max_pixels: int = 800):
+    from visulizer import SimulationRecorder
+    self.path = path
+    self.fps = fps
+    # keep frames around max_pixels wide, every frame is held in memory until close()
+    cell_size = max(1, min(SimulationRecorder.CELL_SIZE, max_pixels // max(field_size)))
+    self.recorder = SimulationRecorder(*field_size, cell_size=cell_size)
+
+  def write(self, state: SimulationState) -> None:
+    self.recorder.add_frame(state)
+
+  def close(self) -> None:
+    self.recorder.save(self.path, fps=self.fps)
+
+
+class StreamSink(Sink):
+  """Publishes every state to the clients of a local StreamServer (see stream.py)."""
+
+  def __init__(self, host: str = "127.0.0.1", port: int = 8765, max_fps: float = 30.0,
+               keyframe_interval: int = 100):
+    from stream import StreamServer
+    self.server = StreamServer(host, port, max_fps=max_fps, keyframe_interval=keyframe_interval)
+
+  def write(self, state: SimulationState) -> None:
+    self.server.publish_state(state)
+
+  def close(self) -> None:
+    self.server.close()
+
+
+class ClusterSink(Sink):
+  """Per-tick cluster count, largest cluster share and size histogram (.npz) plus the cluster events (.csv), see clusters.py."""
+
+  def __init__(self, metrics_path: str, events_path: str, link_radius: float, persistence: int = 10, log=None):
+    from clusters import ClusterTracker
+    self.metrics_path = metrics_path
+    self.events_path = events_path
+    self.log = log  # EventLog receiving the breakaway / rejoin events
+    self.tracker = ClusterTracker(link_radius, persistence)
+    self.events = []
+    self.columns: Dict[str, list] = {"tick": [], "num_clusters": [], "largest_cluster_fraction": [],
+                                     "cluster_size_hist": []}
+
+  def write(self, state: SimulationState) -> None:
+    from clusters import size_histogram
+    from stream import state_positions
+    sheep, _ = state_positions(state)
+    events = self.tracker.update(state.tick, sheep)
+    self.events.extend(events)
+    if self.log is not None:
+      from events import BREAKAWAY, REJOIN
+      for e in events:
+        if e.kind in ("breakaway", "rejoin"):
+          self.log.emit(e.tick, BREAKAWAY if e.kind == "breakaway" else REJOIN, e.cluster, e.other, e.size)
+    sizes = self.tracker.sizes
+    self.columns["tick"].append(state.tick)
+    self.columns["num_clusters"].append(len(sizes))
+    self.columns["largest_cluster_fraction"].append(sizes[0] / len(sheep) if len(sizes) else math.nan)
+    self.columns["cluster_size_hist"].append(size_histogram(sizes))
+
+  def close(self) -> None:
+    import numpy as np
+    from clusters import write_events
+    np.savez(self.metrics_path, **{name: np.asarray(values) for name, values in self.columns.items()})
+    write_events(self.events_path, self.events)
+
+
+class EventSink(Sink):
+  """
+  Dog mode switches and slow-step runs of every dog decision and the goal arrival, in a compact
+  event log (events.py); attach() makes the recorder the simulation's `dog_events` hook. Other
+  sinks given `sink.log` add their own events (checkpoints, breakaways); add this sink after them
+  so the log is flushed last.
+  """
+
+  def __init__(self, path: str, goal_pos: Tuple[float, float] | None = None, tolerance: float = 40.0,
+               capacity: int = 4096, meta: dict | None = None):
+    from events import EventLog, EventRecorder
+    self.log = EventLog(path, capacity, meta)
+    self.recorder = EventRecorder(self.log, goal_pos, tolerance)
+
+  def attach(self, sim) -> None:
+    sim.dog_events = self.recorder
+
+  def write(self, state: SimulationState) -> None:
+    self.recorder.observe(state)
+
+  def close(self) -> None:
+    self.recorder.finish()
+    self.log.close()
+
+
+def read_metrics(path: str) -> Dict[str, list]:
+  """Reads the columns written by MetricsCsvSink (.csv) or MetricsColumnarSink (.npz)."""
+  if os.path.splitext(path)[1].lower() == ".npz":
+    import numpy as np
+    with np.load(path) as data:
+      return {name: data[name].tolist() for name in data.files}
+  with open(path, newline="") as f:
+    rows = list(csv.DictReader(f))
+  return {name: [int(r[name]) if name == "tick" else float(r[name]) for r in rows] for name in METRIC_COLUMNS}
+
+
+def metric_states(columns: Dict[str, list]) -> list:
+  """Turns metric columns back into state-like rows that the plotter functions accept."""
+  from types import SimpleNamespace
+
+  def pair(name, i):
+    x, y = columns[f"{name}_x"][i], columns[f"{name}_y"][i]
+    return None if math.isnan(x) else (x, y)
+
+  def scalar(name, i):
+    v = columns[name][i]
+    return None if math.isnan(v) else v
+
+  rows = []
+  for i in range(len(columns["tick"])):
+    rows.append(SimpleNamespace(
+      tick=columns["tick"][i],
+      time=columns["time"][i],
+      barycenter=pair("barycenter", i),
+      velocity=pair("velocity", i),
+      direction=pair("direction", i),
+      perp_direction=pair("perp_direction", i),
+      cohesion=scalar("cohesion", i),
+      polarization=scalar("polarization", i),
+      elongation=scalar("elongation", i),
+      dog_offsets=pair("dog_offset", i),
+      dog_rear_distance=scalar("dog_rear_distance", i),
+    ))
+  return rows
@@ -0,0 +1,283 @@
+import socket
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from simulation_state import SimulationState
+
+# Live state stream over TCP, for watching a run from another machine (through an ssh tunnel)
+# without a display stack on the compute node.
+#
+# Every message is a little-endian uint32 length followed by one frame:
+#   header   HEADER: kind, flags, tick, num_sheep, num_dogs, time, field size (2 x float32),
+#            quantization box (x0, y0, width, height as float32)
+#   payload  (num_sheep + num_dogs, 2) grid coordinates of the sheep then the dogs, q in 0..65535
+#            with position = box origin + q / 65535 * box size:
+#              KEYFRAME  the coordinates as uint16
+#              DELTA     the change since the client's previous frame, int8 (FLAG_INT8) or int16
+#            zlib-compressed if FLAG_ZLIB.
+# Deltas are exact on the grid, so clients never drift. A keyframe (with a new, padded box) is
+# sent to new clients, every keyframe_interval frames, and whenever an agent leaves the box or a
+# delta does not fit in int16.
+#
+# Every client has its own sender thread and rate limit (the lower of the server's max_fps and
+# the one the client asks for when connecting): the simulation only replaces the latest
+# snapshot, and a client that is behind skips to it, so slow clients never slow the run down.
+
+HEADER = struct.Struct("<BBIIHd2f4f")
+LENGTH = struct.Struct("<I")
+HELLO = struct.Struct("<f")  # client -> server on connect: max frames per second (0 = server's)
+
+KEYFRAME, DELTA = 0, 1
+FLAG_ZLIB, FLAG_INT8 = 1, 2
+GRID = 65535
+
+DEFAULT_PORT = 8765
+
+
+@dataclass
+class StreamFrame:
+  tick: int
+  time: float
+  bounds: Tuple[float, float]
+  sheep: np.ndarray  # (N, 2) float32 positions
+  dogs: np.ndarray   # (D, 2)
+  keyframe: bool
+  size: int          # bytes on the wire
+
+
+def state_positions(state: SimulationState) -> Tuple[np.ndarray, np.ndarray]:
+  """(sheep, dog) positions of a state of any engine."""
+  if state.arrays is not None:
+    return state.arrays.pos, state.arrays.dog_pos
+  sheep = np.array([(s.x, s.y) for s in state.sheep], dtype=np.float64).reshape(-1, 2)
+  dogs = np.array([(d.x, d.y) for d in state.dogs], dtype=np.float64).reshape(-1, 2)
+  return sheep, dogs
+
+
+class FrameEncoder:
+  """Encodes one client's frames; deltas are relative to the last frame it was sent."""
+
+  def __init__(self, keyframe_interval: int = 100, margin: float = 0.25, compress: bool = True):
+    self.keyframe_interval = keyframe_interval
+    self.margin = margin
+    self.compress = compress
+    self._q: np.ndarray | None = None
+    self._box: np.ndarray | None = None
+    self._since_key = 0
+
+  def _new_box(self, points: np.ndarray) -> np.ndarray:
+    if len(points) == 0:
+      return np.array([0.0, 0.0, 1.0, 1.0], dtype=np.float32)
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    pad = self.margin * (hi - lo) + 1.0
+    return np.concatenate([lo - pad, hi - lo + 2 * pad]).astype(np.float32)
+
+  def _quantize(self, points: np.ndarray, box: np.ndarray) -> np.ndarray:
+    return np.rint((points - box[:2]) / box[2:] * GRID).astype(np.int32)
+
+  def encode(self, tick: int, t: float, bounds: Tuple[float, float], sheep: np.ndarray, dogs: np.ndarray) -> bytes:
+    points = np.concatenate([np.asarray(sheep, dtype=np.float64).reshape(-1, 2),
+                             np.asarray(dogs, dtype=np.float64).reshape(-1, 2)])
+    kind, flags = DELTA, 0
+    if self._q is None or self._since_key >= self.keyframe_interval or len(points) != len(self._q):
+      kind = KEYFRAME
+    else:
+      q = self._quantize(points, self._box)
+      delta = q - self._q
+      if ((q < 0) | (q > GRID)).any() or np.abs(delta).max(initial=0) > 32767:
+        kind = KEYFRAME
+    if kind == KEYFRAME:
+      self._box = self._new_box(points)
+      q = self._quantize(points, self._box)
+      raw = q.astype("<u2").tobytes()
+      self._since_key = 0
+    else:
+      if np.abs(delta).max(initial=0) <= 127:
+        flags |= FLAG_INT8
+        raw = delta.astype("i1").tobytes()
+      else:
+        raw = delta.astype("<i2").tobytes()
+    self._q = q
+    self._since_key += 1
+
+    if self.compress:
+      packed = zlib.compress(raw, 1)
+      if len(packed) < len(raw):
+        raw = packed
+        flags |= FLAG_ZLIB
+    header = HEADER.pack(kind, flags, tick, len(sheep), len(dogs), t, bounds[0], bounds[1], *self._box)
+    return header + raw
+
+
+class FrameDecoder:
+  def __init__(self):
+    self._q: np.ndarray | None = None
+
+  def decode(self, data: bytes) -> StreamFrame:
+    kind, flags, tick, n, d, t, bw, bh, x0, y0, w, h = HEADER.unpack_from(data)
+    raw = data[HEADER.size:]
+    if flags & FLAG_ZLIB:
+      raw = zlib.decompress(raw)
+    if kind == KEYFRAME:
+      q = np.frombuffer(raw, dtype="<u2").astype(np.int32).reshape(n + d, 2)
+    else:
+      if self._q is None:
+        raise ValueError("delta frame before the first keyframe")
+      delta = np.frombuffer(raw, dtype="i1" if flags & FLAG_INT8 else "<i2").reshape(n + d, 2)
+      q = self._q + delta
+    self._q = q
+    points = (np.array([x0, y0], dtype=np.float32)
+              + q.astype(np.float32) / GRID * np.array([w, h], dtype=np.float32))
+    return StreamFrame(tick, t, (bw, bh), points[:n], points[n:], kind == KEYFRAME, LENGTH.size + len(data))
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes | None:
+  buf = bytearray()
+  while len(buf) < size:
+    chunk = sock.recv(size - len(buf))
+    if not chunk:
+      return None
+    buf += chunk
+  return bytes(buf)
+
+
+class StreamServer:
+  """Serves the latest published state to every connected client (see the top of this module)."""
+
+  def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, max_fps: float = 30.0,
+               keyframe_interval: int = 100, compress: bool = True):
+    self.max_fps = max_fps
+    self.keyframe_interval = keyframe_interval
+    self.compress = compress
+    self.sock = socket.create_server((host, port))
+    self.address = self.sock.getsockname()[:2]
+    self._cond = threading.Condition()
+    self._latest: tuple | None = None
+    self._seq = 0
+    self._clients = 0
+    self._closed = False
+    threading.Thread(target=self._accept, name="stream-accept", daemon=True).start()
+
+  @property
+  def num_clients(self) -> int:
+    return self._clients
+
+  def wait_for_client(self, timeout: float | None = None) -> bool:
+    with self._cond:
+      return self._cond.wait_for(lambda: self._clients > 0 or self._closed, timeout)
+
+  def publish(self, tick: int, t: float, bounds: Tuple[float, float], sheep: np.ndarray, dogs: np.ndarray) -> None:
+    """Replaces the latest snapshot (copied, the engines reuse their arrays)."""
+    snapshot = (tick, t, tuple(bounds), np.array(sheep, dtype=np.float64), np.array(dogs, dtype=np.float64))
+    with self._cond:
+      self._latest = snapshot
+      self._seq += 1
+      self._cond.notify_all()
+
+  def publish_state(self, state: SimulationState) -> None:
+    if self._clients:
+      self.publish(state.tick, state.time, state.bounds, *state_positions(state))
+
+  def close(self) -> None:
+    with self._cond:
+      self._closed = True
+      self._cond.notify_all()
+    self.sock.close()
+
+  def _accept(self) -> None:
+    while not self._closed:
+      try:
+        conn, _ = self.sock.accept()
+      except OSError:
+        break
+      threading.Thread(target=self._serve_client, args=(conn,), name="stream-client", daemon=True).start()
+
+  def _serve_client(self, conn: socket.socket) -> None:
+    conn.settimeout(1.0)
+    try:
+      hello = _recv_exact(conn, HELLO.size)
+    except OSError:
+      hello = None
+    requested = HELLO.unpack(hello)[0] if hello else 0.0
+    fps = min(f for f in (self.max_fps, requested) if f > 0) if max(self.max_fps, requested) > 0 else 0.0
+    interval = 1.0 / fps if fps > 0 else 0.0
+    conn.settimeout(None)
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    encoder = FrameEncoder(self.keyframe_interval, compress=self.compress)
+    seen = 0
+    with self._cond:
+      self._clients += 1
+      self._cond.notify_all()
+    try:
+      while True:
+        with self._cond:
+          self._cond.wait_for(lambda: self._closed or (self._seq != seen and self._latest is not None))
+          if self._closed:
+            break
+          snapshot, seen = self._latest, self._seq
+        data = encoder.encode(*snapshot)
+        sent = time.monotonic()
+        conn.sendall(LENGTH.pack(len(data)) + data)
+        # per-client rate limit: frames published meanwhile are skipped, the next one is the latest
+        wait = interval - (time.monotonic() - sent)
+        if wait > 0:
+          time.sleep(wait)
+    except OSError:
+      pass
+    finally:
+      with self._cond:
+        self._clients -= 1
+      conn.close()
+
+
+class StreamClient:
+  """Receives the frames of a StreamServer: iterate frames(), or follow() and read latest."""
+
+  def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, max_fps: float = 0.0,
+               timeout: float | None = 10.0):
+    self.sock = socket.create_connection((host, port), timeout=timeout)
+    self.sock.sendall(HELLO.pack(max_fps))
+    self.sock.settimeout(None)
+    self.decoder = FrameDecoder()
+    self.latest: Optional[StreamFrame] = None
+    self.frames_received = 0
+    self.bytes_received = 0
+
+  def frames(self) -> Iterator[StreamFrame]:
+    """Decoded frames until the server closes the stream."""
+    while True:
+      head = _recv_exact(self.sock, LENGTH.size)
+      if head is None:
+        return
+      data = _recv_exact(self.sock, LENGTH.unpack(head)[0])
+      if data is None:
+        return
+      frame = self.decoder.decode(data)
+      self.frames_received += 1
+      self.bytes_received += frame.size
+      yield frame
+
+  def follow(self) -> threading.Thread:
+    """Receives in a background thread, keeping only the latest frame in self.latest."""
+    def receive():
+      try:
+        for frame in self.frames():
+          self.latest = frame
+      except OSError:
+        pass
+    thread = threading.Thread(target=receive, name="stream-receive", daemon=True)
+    thread.start()
+    return thread
+
+  def close(self) -> None:
+    try:
+      self.sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+      pass
+    self.sock.close()
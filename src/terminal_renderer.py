@@ -0,0 +1,109 @@
+import sys
+import time
+from typing import IO, Tuple
+
+import numpy as np
+
+# ANSI escape sequences
+BLUE = "\033[44m"  # blue background (sheep)
+RED = "\033[41m"   # red background (dogs)
+RESET = "\033[0m"
+CLEAR = "\033[2J"
+HIDE_CURSOR = "\033[?25l"
+SHOW_CURSOR = "\033[?25h"
+CLEAR_LINE = "\033[K"
+
+EMPTY, SHEEP, DOG = 0, 1, 2
+CELL = {EMPTY: RESET + "  ", SHEEP: BLUE + "  " + RESET, DOG: RED + "  " + RESET}
+
+
+def _move(row: int, col: int) -> str:
+  return f"\033[{row + 1};{col + 1}H"
+
+
+def agent_positions(sim) -> Tuple[np.ndarray, np.ndarray]:
+  """(sheep, dog) position arrays of any engine, without copying the array engine's state."""
+  arrays = getattr(sim, "arrays", None)
+  if arrays is not None:
+    return arrays.pos, arrays.dog_pos
+  extremal = getattr(sim, "extremal", None)
+  sheep = extremal.pos if extremal is not None else np.array([(s.x, s.y) for s in sim.sheep]).reshape(-1, 2)
+  return sheep, np.array([(d.x, d.y) for d in sim.shepherds]).reshape(-1, 2)
+
+
+class TerminalRenderer:
+  """
+  Flicker-free ANSI view of the field: agents are binned into a width x height grid of
+  two-character cells in one vectorized pass, and each frame only rewrites the cells that
+  changed since the previous one (cursor positioning, no screen clear), as a single write.
+  """
+
+  def __init__(self, field_size: Tuple[float, float], width: int = 40, height: int = 20, out: IO[str] | None = None):
+    self.field_size = field_size
+    self.width = width
+    self.height = height
+    self.out = out or sys.stdout
+    self._prev: np.ndarray | None = None
+
+  def bin(self, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Screen (row, col) of every position; row 0 is the top of the field (largest y)."""
+    p = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    gx = np.clip((p[:, 0] / self.field_size[0] * (self.width - 1)).astype(np.int64), 0, self.width - 1)
+    gy = np.clip((p[:, 1] / self.field_size[1] * (self.height - 1)).astype(np.int64), 0, self.height - 1)
+    return self.height - 1 - gy, gx
+
+  def cells(self, sheep_pos: np.ndarray, dog_pos: np.ndarray) -> np.ndarray:
+    grid = np.full((self.height, self.width), EMPTY, dtype=np.int8)
+    grid[self.bin(sheep_pos)] = SHEEP
+    grid[self.bin(dog_pos)] = DOG  # dogs drawn over sheep
+    return grid
+
+  def frame(self, sheep_pos: np.ndarray, dog_pos: np.ndarray, status: str = "") -> str:
+    """ANSI text turning the previous frame into the current one."""
+    grid = self.cells(sheep_pos, dog_pos)
+    parts = []
+    if self._prev is None:
+      parts.append(HIDE_CURSOR + CLEAR + _move(0, 0))
+      for row in grid:
+        parts.append("".join(CELL[c] for c in row.tolist()) + RESET + "\n")
+    else:
+      rows, cols = np.nonzero(grid != self._prev)
+      for r, c in zip(rows.tolist(), cols.tolist()):
+        parts.append(_move(r, 2 * c) + CELL[int(grid[r, c])])
+    parts.append(_move(self.height, 0) + RESET + status + CLEAR_LINE)
+    self._prev = grid
+    return "".join(parts)
+
+  def draw(self, sheep_pos: np.ndarray, dog_pos: np.ndarray, status: str = "") -> None:
+    self.out.write(self.frame(sheep_pos, dog_pos, status))
+    self.out.flush()
+
+  def close(self) -> None:
+    """Leaves the cursor below the field."""
+    if self._prev is not None:
+      self.out.write(_move(self.height + 1, 0) + SHOW_CURSOR)
+      self.out.flush()
+    self._prev = None
+
+
+def run_in_terminal(sim, steps: int = 100, dt: float = 1.0, frame_time: float = 0.1,
+                    width: int = 40, height: int = 20, out: IO[str] | None = None) -> None:
+  """
+  Steps `sim` and draws it every tick, paced against the wall clock: tick k is shown at
+  start + k * frame_time, so slow ticks shorten the wait instead of adding to it. Frames are
+  dropped (the simulation keeps going) while more than one frame behind.
+  """
+  renderer = TerminalRenderer(sim.cfg.field_size, width, height, out)
+  start = time.perf_counter()
+  try:
+    for step in range(steps):
+      sim.update(dt)
+      due = start + (step + 1) * frame_time
+      now = time.perf_counter()
+      if now - due > frame_time and step < steps - 1:
+        continue
+      renderer.draw(*agent_positions(sim), status=f"Step {step + 1}/{steps}")
+      if due > now:
+        time.sleep(due - now)
+  finally:
+    renderer.close()
@@ -0,0 +1,118 @@
+import dataclasses
+import math
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from config_io import RunOptions
+from engines import make_simulation
+from simulation import SimulationConfig
+
+# Time-to-target study: many seeds per (num_sheep, num_shepherds) cell. A trial stops as soon as
+# the flock barycenter is within `tolerance` of cfg.goal_pos (Simulation.goal_reached); a flock
+# that has not arrived after `steps` ticks is right-censored at `steps`, never counted as 0.
+#
+# All trials of a cell share the censoring time, so the Kaplan-Meier survival curve is the
+# empirical fraction not yet arrived. The median arrival tick is finite when more than half of
+# the trials arrive (inf = beyond the horizon); the restricted mean, the mean of
+# min(arrival, steps) (the area under the survival curve), is always defined. Both get
+# percentile bootstrap confidence intervals.
+
+STUDY_COLUMNS = (
+  "num_sheep", "num_shepherds", "trials", "arrived", "arrival_rate",
+  "median", "median_lo", "median_hi",
+  "restricted_mean", "restricted_mean_lo", "restricted_mean_hi",
+)
+
+
+@dataclasses.dataclass
+class Trial:
+  cfg: SimulationConfig
+  seed: int
+  steps: int
+  dt: float = 1.0
+  tolerance: float = 40.0
+  use_cache: bool = False
+
+
+def arrival_tick(cfg: SimulationConfig, seed: int, steps: int, dt: float = 1.0, tolerance: float = 40.0) -> int | None:
+  """First tick at which the goal is reached, or None if it is not within `steps` ticks."""
+  sim = make_simulation(cfg, collect_metrics=False, seed=seed)
+  for state in sim.steps(steps, dt=dt, stop_when=lambda s: s.goal_reached(tolerance)):
+    if sim.goal_reached(tolerance):
+      return state.tick
+  return None
+
+
+def run_trial(trial: Trial) -> Tuple[int, int, int, int | None]:
+  """Pool entry point: (num_sheep, num_shepherds, seed, arrival tick or None)."""
+  cfg = trial.cfg
+  key = (cfg.num_sheep, cfg.num_shepherds, trial.seed)
+  if not trial.use_cache:
+    return key + (arrival_tick(cfg, trial.seed, trial.steps, trial.dt, trial.tolerance),)
+
+  from run_cache import RunCache
+  cache = RunCache()
+  opts = RunOptions(steps=trial.steps, seed=trial.seed, dt=trial.dt, collect_metrics=False)
+  extra = {"study": "time_to_target", "tolerance": trial.tolerance}
+  _, summary = cache.get(cfg, opts, extra=extra)
+  if summary is None:
+    summary = {"arrival_tick": arrival_tick(cfg, trial.seed, trial.steps, trial.dt, trial.tolerance)}
+    cache.put(cfg, opts, summary, extra=extra)
+  return key + (summary["arrival_tick"],)
+
+
+def censored_summary(arrivals: Sequence[int | None], horizon: int, n_boot: int = 2000,
+                     confidence: float = 0.95, seed: int = 0) -> Dict[str, float]:
+  """Median and restricted mean arrival tick of right-censored trials, with bootstrap CIs."""
+  times = np.array([math.inf if a is None else a for a in arrivals], dtype=np.float64)
+  n = len(times)
+  out = {"trials": n, "arrived": int(np.isfinite(times).sum())}
+  out["arrival_rate"] = out["arrived"] / n if n else math.nan
+  if n == 0:
+    for name in STUDY_COLUMNS[5:]:
+      out[name] = math.nan
+    return out
+
+  def median(t: np.ndarray) -> np.ndarray:
+    # censored trials sort last (inf): the median is inf when fewer than half arrived
+    return np.median(t, axis=-1)
+
+  def restricted_mean(t: np.ndarray) -> np.ndarray:
+    return np.minimum(t, horizon).mean(axis=-1)
+
+  rng = np.random.default_rng(seed)
+  boot = times[rng.integers(0, n, size=(n_boot, n))]
+  alpha = (1.0 - confidence) / 2.0
+  for name, stat in (("median", median), ("restricted_mean", restricted_mean)):
+    out[name] = float(stat(times))
+    values = stat(boot)
+    # no interpolation, so an infinite (beyond the horizon) bound stays inf
+    out[f"{name}_lo"] = float(np.quantile(values, alpha, method="lower"))
+    out[f"{name}_hi"] = float(np.quantile(values, 1.0 - alpha, method="higher"))
+  return out
+
+
+def time_to_target_study(cfg: SimulationConfig, sheep_counts: Sequence[int], shepherd_counts: Sequence[int],
+                         seeds: Sequence[int], steps: int = 500, dt: float = 1.0, tolerance: float = 40.0,
+                         workers: int = 1, use_cache: bool = False, n_boot: int = 2000) -> List[Dict[str, float]]:
+  """One summary row (STUDY_COLUMNS) per (num_sheep, num_shepherds) cell."""
+  trials = [Trial(dataclasses.replace(cfg, num_sheep=n, num_shepherds=d), seed, steps, dt, tolerance, use_cache)
+            for n in sheep_counts for d in shepherd_counts for seed in seeds]
+  if workers > 1:
+    from multiprocessing import Pool
+    with Pool(workers) as pool:
+      results = list(pool.imap_unordered(run_trial, trials, chunksize=max(1, len(trials) // (4 * workers))))
+  else:
+    results = [run_trial(t) for t in trials]
+
+  arrivals: Dict[Tuple[int, int], List[int | None]] = {}
+  for n, d, _, tick in results:
+    arrivals.setdefault((n, d), []).append(tick)
+  rows = []
+  for n in sheep_counts:
+    for d in shepherd_counts:
+      row = {"num_sheep": n, "num_shepherds": d}
+      row.update(censored_summary(arrivals.get((n, d), []), steps, n_boot=n_boot))
+      rows.append(row)
+  return rows
@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from simulation_state import SimulationState
+
+# On-disk layout of a stored run:
+#   <run_dir>/meta.json            config, seed, dt, chunk size, number of ticks
+#   <run_dir>/chunk_00000.npz      tick (T,), time (T,), sheep_pos/sheep_vel (T, N, 2), dog_pos/dog_vel (T, D, 2)
+#   <run_dir>/chunk_00001.npz      ...
+#   <run_dir>/analysis/            metric columns cached by analysis.py (removed when the run is rewritten)
+META_FILE = "meta.json"
+CHUNK_FILE = "chunk_{:05d}.npz"
+ANALYSIS_DIR = "analysis"
+FIELDS = ("tick", "time", "sheep_pos", "sheep_vel", "dog_pos", "dog_vel")
+
+
+class TrajectoryWriter:
+  """Streams SimulationStates into a chunked trajectory store."""
+
+  def __init__(self, run_dir: str, meta: dict | None = None, chunk_size: int = 256, dtype="float64"):
+    self.run_dir = run_dir
+    self.meta = dict(meta or {})
+    self.chunk_size = chunk_size
+    self.dtype = np.dtype(dtype)
+
+    self.num_ticks = 0
+    self.num_chunks = 0
+    self._buffer = {name: [] for name in FIELDS}
+    os.makedirs(run_dir, exist_ok=True)
+    # columns cached from an earlier run recorded into this directory describe other positions
+    shutil.rmtree(os.path.join(run_dir, ANALYSIS_DIR), ignore_errors=True)
+
+  def append(self, state: SimulationState) -> None:
+    buf = self._buffer
+    buf["tick"].append(state.tick)
+    buf["time"].append(state.time)
+    if state.arrays is not None:
+      # array engines: copy the rows straight from the engine arrays
+      a = state.arrays
+      buf["sheep_pos"].append(a.pos.astype(self.dtype))
+      buf["sheep_vel"].append(a.vel.astype(self.dtype))
+      buf["dog_pos"].append(a.dog_pos.astype(self.dtype))
+      buf["dog_vel"].append(a.dog_vel.astype(self.dtype))
+    else:
+      buf["sheep_pos"].append([(s.x, s.y) for s in state.sheep])
+      buf["sheep_vel"].append([(s.vx, s.vy) for s in state.sheep])
+      buf["dog_pos"].append([(d.x, d.y) for d in state.dogs])
+      buf["dog_vel"].append([(d.vx, d.vy) for d in state.dogs])
+    self.num_ticks += 1
+    if len(buf["tick"]) >= self.chunk_size:
+      self._flush_chunk()
+
+  def close(self) -> None:
+    if self._buffer["tick"]:
+      self._flush_chunk()
+    meta = dict(self.meta)
+    meta.update(num_ticks=self.num_ticks, num_chunks=self.num_chunks,
+                chunk_size=self.chunk_size, dtype=self.dtype.name)
+    with open(os.path.join(self.run_dir, META_FILE), "w") as f:
+      json.dump(meta, f, indent=2)
+
+  def _flush_chunk(self) -> None:
+    buf = self._buffer
+    arrays = {
+      "tick": np.asarray(buf["tick"], dtype=np.int64),
+      "time": np.asarray(buf["time"], dtype=np.float64),
+    }
+    for name in ("sheep_pos", "sheep_vel", "dog_pos", "dog_vel"):
+      arr = np.asarray(buf[name], dtype=self.dtype)
+      arrays[name] = arr.reshape(len(buf["tick"]), -1, 2)
+    np.savez(os.path.join(self.run_dir, CHUNK_FILE.format(self.num_chunks)), **arrays)
+    self.num_chunks += 1
+    self._buffer = {name: [] for name in FIELDS}
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+
+class TrajectoryReader:
+  """Lazy, chunk-by-chunk access to a stored run."""
+
+  def __init__(self, run_dir: str):
+    self.run_dir = run_dir
+    with open(os.path.join(run_dir, META_FILE)) as f:
+      self.meta = json.load(f)
+    self.num_ticks = self.meta["num_ticks"]
+    self.num_chunks = self.meta["num_chunks"]
+    self.chunk_size = self.meta["chunk_size"]
+
+  def chunk_path(self, index: int) -> str:
+    return os.path.join(self.run_dir, CHUNK_FILE.format(index))
+
+  def load_chunk(self, index: int, fields: Tuple[str, ...] | None = None) -> dict:
+    """Arrays of chunk `index`; only `fields` are read from disk if given."""
+    with np.load(self.chunk_path(index)) as data:
+      return {name: data[name] for name in (data.files if fields is None else fields)}
+
+  def chunk_ranges(self) -> List[Tuple[int, int]]:
+    """[start, stop) row ranges of every chunk."""
+    return [(i * self.chunk_size, min((i + 1) * self.chunk_size, self.num_ticks)) for i in range(self.num_chunks)]
+
+  def chunks(self, start: int = 0, stop: int | None = None) -> Iterator[dict]:
+    """Yields chunks (trimmed to [start, stop)) without loading the whole run."""
+    stop = self.num_ticks if stop is None else min(stop, self.num_ticks)
+    for i, (c_start, c_stop) in enumerate(self.chunk_ranges()):
+      if c_stop <= start or c_start >= stop:
+        continue
+      chunk = self.load_chunk(i)
+      lo = max(start, c_start) - c_start
+      hi = min(stop, c_stop) - c_start
+      yield {name: arr[lo:hi] for name, arr in chunk.items()}
+
+  def read(self, start: int = 0, stop: int | None = None) -> dict:
+    parts = list(self.chunks(start, stop))
+    if not parts:
+      return {}
+    return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
@@ -1,9 +1,8 @@
-import time
+import os
 
-import numpy as np
-from matplotlib import pyplot as plt
-
-from simulation import Simulation, SimulationConfig
+from plotter import plot_time_to_target
+from simulation import SimulationConfig
+from time_to_target import time_to_target_study
 
 
 def main():
@@ -45,52 +44,13 @@ def main():
     pd=2.0 * (14 ** 0.5),  # pd = rad_rep_s * sqrt(no_shp)
   )
 
-  sim = Simulation(cfg, seed=10)
-
   def plot_time_to_goal():
-    sheep_counts = [16, 32, 64]
-    time_1dog = []
-    time_2dogs = []
-
-    def dst(a, b):
-      return ((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) ** 0.5
-
-    def find_time_to_target(ticks, tolerance = 40.0):
-      for i, t in enumerate(ticks):
-        #print(t.barycenter)
-        if dst(t.barycenter,  cfg.goal_pos) < tolerance:
-          return i
-      return 0
-
-    N_STEPS = 500
-
-    for n_sheep in sheep_counts:
-      cfg.num_sheep = n_sheep
-
-      cfg.num_shepherds = 1
-      sim = Simulation(cfg, seed=n_sheep)
-      time_1dog.append(find_time_to_target(sim.steps(N_STEPS)))
-
-      cfg.num_shepherds = 2
-      sim = Simulation(cfg, seed=n_sheep)
-      time_2dogs.append(find_time_to_target(sim.steps(N_STEPS)))
-
-    x = np.arange(len(sheep_counts))  # group positions
-    width = 0.35  # width of each bar
-
-    fig, ax = plt.subplots()
-
-    ax.bar(x - width / 2, time_1dog, width, label="1 Shephard")
-    ax.bar(x + width / 2, time_2dogs, width, label="2 Shepherds")
-
-    ax.set_xlabel("Number of sheep")
-    ax.set_ylabel("Time to target")
-    ax.set_xticks(x)
-    ax.set_xticklabels(np.asarray(sheep_counts))
-    ax.legend()
-
-    plt.tight_layout()
-    plt.show()
+    # many seeds per cell on all cores; flocks that never arrive are censored, not counted as 0
+    rows = time_to_target_study(cfg, sheep_counts=[16, 32, 64], shepherd_counts=[1, 2], seeds=range(20),
+                                steps=500, workers=os.cpu_count() or 1, use_cache=True)
+    for row in rows:
+      print(row)
+    plot_time_to_target(rows)
 
 
   plot_time_to_goal()
@@ -0,0 +1,189 @@
+import math
+from typing import Dict, Tuple
+
+import numpy as np
+
+from engine import SPEED_CONST, PRECISIONS, repulsion_forces, sample_others, steer, unit_vectors
+from perception import make_perception
+from simulation import SimulationConfig
+from spatial import GridIndex
+
+# Batched environments for learning dog controllers (docs/upgrade-ideas.md, "reinforcement learning
+# for the sheepdog").
+#
+# B copies of the flock are stored as (B, N, 2) arrays and stepped together with the sheep rules
+# of the array engine (engine.py, ordering = "synchronous": sampled attraction / alignment,
+# repulsion from the pairs closer than d_rep, repulsion from the first dog). The dogs are not
+# driven by Dog.update: the action sets every dog's velocity. No step loops over environments in Python:
+#   - attraction samples of all B * N sheep are drawn in one sample_others call;
+#   - repulsion pairs of all environments come from one GridIndex, the environments laid out
+#     side by side along x with more than d_rep between them, so no pair crosses two of them.
+#
+# The API follows the Gymnasium vector environments (reset / step with terminated, truncated and
+# auto-reset, the last observation of a finished episode in info["final_observation"]) without
+# depending on gymnasium.
+
+# layout of one observation row; world units, float32
+OBS_FIELDS = (
+  "centroid_to_goal_x", "centroid_to_goal_y",   # flock barycenter - goal_pos
+  "farthest_x", "farthest_y",                   # sheep farthest from the barycenter - barycenter
+  "cohesion",                                   # mean distance of the sheep to the barycenter
+)
+DOG_OBS_FIELDS = ("dog_x", "dog_y", "dog_vx", "dog_vy")  # per dog: position - barycenter, velocity
+
+
+class VecHerdingEnv:
+  """
+  num_envs herding environments stepped at once. step() takes the dog velocities as a
+  (num_envs, num_shepherds, 2) array (rescaled to at most v_dog) and returns
+  (observations, rewards, terminated, truncated, info) as arrays over the environments.
+
+  reward = -(goal_weight * distance of the barycenter to goal_pos + cohesion_weight * cohesion)
+  / field diagonal per tick, plus goal_bonus when the barycenter gets within goal_radius of
+  goal_pos (terminated). Episodes are truncated after max_steps ticks.
+  """
+
+  def __init__(self, cfg: SimulationConfig, num_envs: int, seed: int = 0, dt: float = 1.0,
+               max_steps: int = 2000, goal_radius: float = 40.0, goal_weight: float = 1.0,
+               cohesion_weight: float = 0.1, goal_bonus: float = 10.0):
+    if cfg.goal_pos is None:
+      raise ValueError("VecHerdingEnv needs a goal_pos")
+    if cfg.precision not in PRECISIONS:
+      raise ValueError(f"Unknown precision '{cfg.precision}' (choose from {', '.join(PRECISIONS)})")
+    if cfg.integrator != "euler":
+      raise ValueError("VecHerdingEnv only supports the euler integrator")
+    if make_perception(cfg.sheep_vision_radius, cfg.sheep_view_angle) is not None:
+      raise ValueError("VecHerdingEnv does not support limited sheep perception")
+    if cfg.num_sheep < 1 or cfg.num_shepherds < 1:
+      raise ValueError("VecHerdingEnv needs at least one sheep and one dog")
+    self.cfg = cfg
+    self.num_envs = num_envs
+    self.dt = dt
+    self.max_steps = max_steps
+    self.goal_radius = goal_radius
+    self.goal_weight = goal_weight
+    self.cohesion_weight = cohesion_weight
+    self.goal_bonus = goal_bonus
+    self.dtype = np.dtype(cfg.precision)
+    self.rng = np.random.default_rng(seed)
+
+    b, n, d = num_envs, cfg.num_sheep, cfg.num_shepherds
+    self.pos = np.zeros((b, n, 2), dtype=self.dtype)
+    self.direction = np.zeros((b, n, 2), dtype=self.dtype)  # unit velocity of the sheep
+    self.dog_pos = np.zeros((b, d, 2), dtype=self.dtype)
+    self.dog_vel = np.zeros((b, d, 2), dtype=self.dtype)
+    self.ticks = np.zeros(b, dtype=np.int64)
+    self.goal = np.asarray(cfg.goal_pos, dtype=np.float64)
+    self.scale = 1.0 / math.hypot(*cfg.field_size)
+
+    self.obs_fields = OBS_FIELDS + tuple(f"{name}_{k}" for k in range(d) for name in DOG_OBS_FIELDS)
+    self.obs_dim = len(self.obs_fields)
+    self.action_shape = (b, d, 2)
+
+  # ---------- episodes ----------
+
+  def _place(self, envs: np.ndarray) -> None:
+    """New episodes in the environments `envs`: uniform placement as in ArraySimulation, at rest."""
+    w, h = self.cfg.field_size
+    m = len(envs)
+    self.pos[envs] = self.rng.uniform((0.0, 0.0), (w, h), size=(m, self.cfg.num_sheep, 2))
+    self.dog_pos[envs] = self.rng.uniform((0.0, 0.0), (w, h), size=(m, self.cfg.num_shepherds, 2))
+    self.direction[envs] = 0.0
+    self.dog_vel[envs] = 0.0
+    self.ticks[envs] = 0
+
+  def reset(self, seed: int | None = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    if seed is not None:
+      self.rng = np.random.default_rng(seed)
+    self._place(np.arange(self.num_envs))
+    obs, distance, cohesion = self._observe()
+    return obs, {"distance": distance, "cohesion": cohesion}
+
+  # ---------- stepping ----------
+
+  def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+    actions = np.asarray(actions, dtype=np.float64)
+    if actions.shape != self.action_shape:
+      raise ValueError(f"actions must have shape {self.action_shape}, got {actions.shape}")
+    cfg = self.cfg
+    b, n = self.num_envs, cfg.num_sheep
+
+    # sheep forces from the state at the start of the tick
+    att, ali = self._social()
+    rep = self._repulsion()
+    unit, dist = unit_vectors(self.pos - self.dog_pos[:, :1, :])
+    inside = (dist < cfg.d_dog) & (dist > 0)
+    dog_rep = np.where(inside[..., None], cfg.w_dog * unit, 0.0)
+
+    # dogs: the requested velocities, no faster than v_dog
+    speed = np.sqrt(np.einsum("bdi,bdi->bd", actions, actions))
+    limit = np.divide(cfg.v_dog, speed, out=np.ones_like(speed), where=speed > cfg.v_dog)
+    self.dog_vel[:] = actions * limit[..., None]
+    self.dog_pos += self.dog_vel * self.dt
+
+    # sheep move (Sheep.move, constant speed)
+    noise = self.rng.random((b, n, 2))
+    self.direction[:] = steer(self.direction, att, ali, rep, dog_rep, noise)
+    self.pos += self.direction * (SPEED_CONST * self.dt)
+    self.ticks += 1
+
+    obs, distance, cohesion = self._observe()
+    terminated = distance < self.goal_radius
+    truncated = ~terminated & (self.ticks >= self.max_steps)
+    rewards = (-(self.goal_weight * distance + self.cohesion_weight * cohesion) * self.scale
+               + self.goal_bonus * terminated)
+    info = {"distance": distance, "cohesion": cohesion}
+
+    done = np.flatnonzero(terminated | truncated)
+    if len(done):
+      info["final_observation"] = obs.copy()
+      self._place(done)
+      obs[done] = self._observe(done)[0]
+    return obs, rewards.astype(np.float32), terminated, truncated, info
+
+  def _social(self) -> Tuple[np.ndarray, np.ndarray]:
+    """Sheep.update_social (attraction + alignment) of every sheep of every environment."""
+    cfg = self.cfg
+    b, n = self.num_envs, cfg.num_sheep
+    n_att = min(cfg.n_att, n - 1)
+    if n_att <= 0:
+      return np.zeros_like(self.pos), np.zeros_like(self.pos)
+    # one draw for all environments: row e * n + s holds the sample of sheep s of environment e
+    idx = sample_others(self.rng, n, n_att, np.tile(np.arange(n), b)).reshape(b, n, n_att)
+    env = np.arange(b)[:, None, None]
+    rel, _ = unit_vectors(self.pos[env, idx] - self.pos[:, :, None, :])
+    att = cfg.w_att * rel.sum(axis=2) / n_att
+    n_ali = min(cfg.n_ali, n_att)
+    ali = cfg.w_ali * self.direction[env, idx[:, :, :n_ali]].sum(axis=2) / n_ali
+    return att, ali
+
+  def _repulsion(self) -> np.ndarray:
+    """Social repulsion of every sheep, from one index over all environments side by side."""
+    cfg = self.cfg
+    b, n = self.num_envs, cfg.num_sheep
+    local = self.pos.astype(np.float64) - self.pos.min(axis=1, keepdims=True)
+    stride = float(local[..., 0].max()) + 2.0 * cfg.d_rep
+    local[..., 0] += stride * np.arange(b)[:, None]
+    flat = local.reshape(b * n, 2)
+    i, j, d = GridIndex(flat, cfg.d_rep).pairs_within(cfg.d_rep)
+    rep, _ = repulsion_forces(cfg.w_rep, flat, i, j, d, b * n)
+    return rep.reshape(b, n, 2).astype(self.dtype, copy=False)
+
+  # ---------- observations ----------
+
+  def _observe(self, envs: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(observations, barycenter distance to the goal, cohesion) of `envs` (default all)."""
+    pos = self.pos if envs is None else self.pos[envs]
+    dog_pos = self.dog_pos if envs is None else self.dog_pos[envs]
+    dog_vel = self.dog_vel if envs is None else self.dog_vel[envs]
+    center = pos.mean(axis=1, dtype=np.float64)
+    r = pos - center[:, None, :]
+    d2 = np.einsum("bni,bni->bn", r, r)
+    far = np.take_along_axis(r, d2.argmax(axis=1)[:, None, None], axis=1)[:, 0]
+    cohesion = np.sqrt(d2).mean(axis=1)
+    to_goal = center - self.goal
+    distance = np.sqrt(np.einsum("bi,bi->b", to_goal, to_goal))
+
+    dogs = np.concatenate([dog_pos - center[:, None, :], dog_vel], axis=2)
+    obs = np.concatenate([to_goal, far, cohesion[:, None], dogs.reshape(len(pos), -1)], axis=1)
+    return obs.astype(np.float32), distance, cohesion
@@ -1,15 +1,18 @@
 import os
 from dataclasses import dataclass
 
-import pygame
-import pygame_gui
 import time
-from typing import Tuple, Generator, Iterator
-
-from PIL import Image
+from typing import Tuple, Generator, Iterable, Iterator
 
+from lazy import lazy_import
 from simulation_state import SimulationState
 
+# pygame, pygame_gui and PIL are loaded on first use so that importing this module stays cheap
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+pygame = lazy_import("pygame")
+pygame_gui = lazy_import("pygame_gui")
+Image = lazy_import("PIL.Image")
+
 BACKGROUND_COLOR = (200, 200, 200)
 GRID_COLOR = (160, 160, 160)
 PREDATOR_COLOR = (255, 0, 0)
@@ -43,7 +46,10 @@ class SimulationVisualizer:
   CELL_SIZE = 10
 
   def __init__(self, sim = None, world_width: int = 100, world_height: int = 100, headless=False):
-    pygame.init()
+    # only the subsystems we use; pygame.init() would also bring up audio, joystick, ...
+    pygame.font.init()
+    if not headless:
+      pygame.display.init()
     self.world_width = world_width
     self.world_height = world_height
 
@@ -167,20 +173,23 @@ class SimulationVisualizer:
       pygame.draw.line(self.screen, GRID_COLOR, start, end)
 
   def draw_frame(self, state: SimulationState):
+    self.draw_points(state.tick, ((s.x, s.y) for s in state.sheep), ((d.x, d.y) for d in state.dogs))
+
+  def draw_points(self, tick: int, sheep: Iterable[Tuple[float, float]], dogs: Iterable[Tuple[float, float]]):
     self.screen.fill(BACKGROUND_COLOR)
     self.draw_grid()
 
     self.draw_cell(self.goal_pos, FOOD_COLOR)
 
     # Draw entities
-    for prey in state.sheep:
-      self.draw_cell((prey.x, prey.y), PREY_COLOR)
+    for pos in sheep:
+      self.draw_cell(pos, PREY_COLOR)
 
-    for predator in state.dogs:
-      self.draw_cell((predator.x, predator.y), PREDATOR_COLOR)
+    for pos in dogs:
+      self.draw_cell(pos, PREDATOR_COLOR)
 
     # Draw tick number
-    tick_text = self.font.render(f"Tick: {state.tick}", True, TEXT_COLOR)
+    tick_text = self.font.render(f"Tick: {tick}", True, TEXT_COLOR)
     self.screen.blit(tick_text, (10, 10))
 
   def update(self) -> bool:
@@ -215,14 +224,40 @@ class SimulationVisualizer:
 
     pygame.quit()
 
+  def run_stream(self, client):
+    """Client mode: renders the latest frame of a stream.StreamClient (pause freezes the view)."""
+    client.follow()
+    running = True
+    clock = pygame.time.Clock()
+    frame = None
+
+    while running:
+      running = self.handle_events()
+      self.ui_manager.update(clock.get_time() / 1000.0)
+      if not self.paused and client.latest is not None:
+        if frame is None:
+          self.world_width, self.world_height = (int(v) for v in client.latest.bounds)
+        frame = client.latest
+      if frame is not None:
+        self.draw_points(frame.tick, frame.sheep.tolist(), frame.dogs.tolist())
+      else:
+        self.screen.fill(BACKGROUND_COLOR)
+      self.ui_manager.draw_ui(self.screen)
+      pygame.display.flip()
+      clock.tick(60)
+
+    client.close()
+    pygame.quit()
+
 
 class SimulationRecorder(SimulationVisualizer):
   CELL_SIZE = 10
 
-  def __init__(self, world_width: int = 100, world_height: int = 100):
+  def __init__(self, world_width: int = 100, world_height: int = 100, cell_size: int = CELL_SIZE):
     os.environ['SDL_VIDEODRIVER'] = 'dummy'
 
-    super().__init__(world_width, world_height, headless=True)
+    super().__init__(None, world_width, world_height, headless=True)
+    self.CELL_SIZE = cell_size
 
     margin = 40  # For text
     self.screen_width = world_width * self.CELL_SIZE + margin * 2
@@ -241,11 +276,11 @@ class SimulationRecorder(SimulationVisualizer):
     string_image = pygame.image.tobytes(self.screen, 'RGB')
     return Image.frombytes('RGB', (self.screen_width, self.screen_height), string_image)
 
-  def record(self, steps: Iterator[SimulationState], output_path: str, fps: int = 10):
-    for state in steps:
-      self.draw_frame(state)
-      self.frames_list.append(self.capture_frame())
+  def add_frame(self, state: SimulationState):
+    self.draw_frame(state)
+    self.frames_list.append(self.capture_frame())
 
+  def save(self, output_path: str, fps: int = 10):
     print("Saving GIF...")
     self.frames_list[0].save(
       output_path,
@@ -255,3 +290,8 @@ class SimulationRecorder(SimulationVisualizer):
       loop=0
     )
     print(f"Saved GIF to {output_path}")
+
+  def record(self, steps: Iterator[SimulationState], output_path: str, fps: int = 10):
+    for state in steps:
+      self.add_frame(state)
+    self.save(output_path, fps)